@@ -3,6 +3,8 @@ from tkinter import ttk, messagebox
 import time
 import keyboard
 import mouse
+from color_match import TOLERANCE_MODES
+from sound_trigger import DEFAULT_BAND_RATIO, DEFAULT_CLIP_SCORE
 
 def _get_event_obj(event):
     return event[1]['obj']
@@ -128,7 +130,7 @@ class ActionEditorWindow(tk.Toplevel):
             key_entry.select_range(0, 'end')
             return True
 
-        elif action_type in ['wait_color', 'wait_sound']:
+        elif action_type in ['wait_color', 'wait_sound', 'wait_image', 'click_image', 'wait_region_change', 'wait_region_stable']:
             # Timeout
             ttk.Label(parent_frame, text="Timeout (s):").grid(row=0, column=0, sticky="w", padx=5, pady=2)
             timeout_var = tk.StringVar(value=str(self.action.details.get('timeout', 10)))
@@ -151,16 +153,60 @@ class ActionEditorWindow(tk.Toplevel):
                     canvas.grid(row=2, column=1, sticky="w", padx=5, pady=2)
                 except:
                     pass
+                self._add_tolerance_widgets(parent_frame, 3)
             elif action_type == 'wait_sound':
-                ttk.Label(parent_frame, text="Threshold (0.0-1.0):").grid(row=2, column=0, sticky="w", padx=5, pady=2)
+                trigger = self.action.details.get('trigger', 'level')
+                label = "Threshold (0.0-1.0):" if trigger == 'level' else "Min Level (0.0-1.0):"
+                ttk.Label(parent_frame, text=label).grid(row=2, column=0, sticky="w", padx=5, pady=2)
                 threshold_var = tk.StringVar(value=str(self.action.details.get('threshold', 0.1)))
                 self.edit_params['threshold'] = threshold_var
                 ttk.Entry(parent_frame, textvariable=threshold_var, width=10).grid(row=2, column=1, sticky="w", padx=5, pady=2)
+                if trigger == 'band':
+                    low, high = self.action.details.get('band') or (0, 0)
+                    for row, (key, text, value) in enumerate([('band_low', "Band Low (Hz):", low), ('band_high', "Band High (Hz):", high),
+                                                              ('band_ratio', "Band Share (0.0-1.0):", self.action.details.get('band_ratio', DEFAULT_BAND_RATIO))], 3):
+                        ttk.Label(parent_frame, text=text).grid(row=row, column=0, sticky="w", padx=5, pady=2)
+                        var = tk.StringVar(value=str(value))
+                        self.edit_params[key] = var
+                        ttk.Entry(parent_frame, textvariable=var, width=10).grid(row=row, column=1, sticky="w", padx=5, pady=2)
+                elif trigger == 'clip':
+                    ttk.Label(parent_frame, text="Match Score (0.0-1.0):").grid(row=3, column=0, sticky="w", padx=5, pady=2)
+                    score_var = tk.StringVar(value=str(self.action.details.get('score', DEFAULT_CLIP_SCORE)))
+                    self.edit_params['score'] = score_var
+                    ttk.Entry(parent_frame, textvariable=score_var, width=10).grid(row=3, column=1, sticky="w", padx=5, pady=2)
+                    ttk.Label(parent_frame, text=f"Clip: {self.action.details.get('clip_path')}").grid(row=4, column=0, columnspan=2, sticky="w", padx=5, pady=2)
+            elif action_type == 'wait_region_stable':
+                ttk.Label(parent_frame, text="Stable Samples:").grid(row=2, column=0, sticky="w", padx=5, pady=2)
+                stable_var = tk.StringVar(value=str(self.action.details.get('stable_samples', 5)))
+                self.edit_params['stable_samples'] = stable_var
+                ttk.Entry(parent_frame, textvariable=stable_var, width=10).grid(row=2, column=1, sticky="w", padx=5, pady=2)
+            elif action_type in ['wait_image', 'click_image']:
+                ttk.Label(parent_frame, text="Match Score (0.0-1.0):").grid(row=2, column=0, sticky="w", padx=5, pady=2)
+                threshold_var = tk.StringVar(value=str(self.action.details.get('threshold', 0.9)))
+                self.edit_params['threshold'] = threshold_var
+                ttk.Entry(parent_frame, textvariable=threshold_var, width=10).grid(row=2, column=1, sticky="w", padx=5, pady=2)
+                ttk.Label(parent_frame, text=f"Image: {self.action.details.get('template_path')}").grid(row=3, column=0, columnspan=2, sticky="w", padx=5, pady=2)
             
             return True
 
+        elif action_type == 'if_color_match':
+            ttk.Label(parent_frame, text=f"Target Color: {self.action.details.get('target_hex')}").grid(row=0, column=0, sticky="w", padx=5, pady=2)
+            self._add_tolerance_widgets(parent_frame, 1)
+            return True
+
         return False
 
+    def _add_tolerance_widgets(self, parent_frame, row):
+        ttk.Label(parent_frame, text="Color Tolerance:").grid(row=row, column=0, sticky="w", padx=5, pady=2)
+        tolerance_var = tk.StringVar(value=str(self.action.details.get('tolerance', 0)))
+        self.edit_params['tolerance'] = tolerance_var
+        ttk.Entry(parent_frame, textvariable=tolerance_var, width=10).grid(row=row, column=1, sticky="w", padx=5, pady=2)
+
+        ttk.Label(parent_frame, text="Tolerance Mode:").grid(row=row + 1, column=0, sticky="w", padx=5, pady=2)
+        mode_var = tk.StringVar(value=self.action.details.get('tolerance_mode', TOLERANCE_MODES[0]))
+        self.edit_params['tolerance_mode'] = mode_var
+        ttk.Combobox(parent_frame, textvariable=mode_var, values=TOLERANCE_MODES, state="readonly", width=10).grid(row=row + 1, column=1, sticky="w", padx=5, pady=2)
+
     def _on_ok(self):
         self._apply_remarks_edit()
         self._apply_action_edit()
@@ -255,8 +301,11 @@ class ActionEditorWindow(tk.Toplevel):
             self._apply_mouse_edit()
         elif action_type in ['key_press', 'raw_key']:
             self._apply_key_edit()
-        elif action_type in ['wait_color', 'wait_sound']:
+        elif action_type in ['wait_color', 'wait_sound', 'wait_image', 'click_image', 'wait_region_change', 'wait_region_stable']:
             self._apply_wait_edit()
+        elif action_type == 'if_color_match':
+            if self._apply_tolerance_edit():
+                self._store_logic_details()
 
         self.on_complete()
 
@@ -401,8 +450,59 @@ class ActionEditorWindow(tk.Toplevel):
                 messagebox.showerror("Invalid Input", "Threshold must be between 0.0 and 1.0.", parent=self)
                 return
 
-        # Update the actual event data in macro_data
-        # Logic actions are stored as single events
+        if 'stable_samples' in self.edit_params:
+            try:
+                stable_samples = int(self.edit_params['stable_samples'].get())
+                if stable_samples < 1: raise ValueError
+                self.action.details['stable_samples'] = stable_samples
+            except ValueError:
+                messagebox.showerror("Invalid Input", "Stable Samples must be a whole number of at least 1.", parent=self)
+                return
+
+        if 'band_low' in self.edit_params:
+            try:
+                low = float(self.edit_params['band_low'].get())
+                high = float(self.edit_params['band_high'].get())
+                ratio = float(self.edit_params['band_ratio'].get())
+                if not (0 <= low < high) or not (0 < ratio <= 1): raise ValueError
+            except ValueError:
+                messagebox.showerror("Invalid Input", "The band needs 0 <= Low < High (Hz) and a Band Share between 0.0 and 1.0.", parent=self)
+                return
+            self.action.details['band'] = [low, high]
+            self.action.details['band_ratio'] = ratio
+
+        if 'score' in self.edit_params:
+            try:
+                score = float(self.edit_params['score'].get())
+                if not (0 < score <= 1): raise ValueError
+                self.action.details['score'] = score
+            except ValueError:
+                messagebox.showerror("Invalid Input", "Match Score must be between 0.0 and 1.0.", parent=self)
+                return
+
+        if 'tolerance' in self.edit_params and not self._apply_tolerance_edit():
+            return
+
+        self._store_logic_details()
+
+    def _apply_tolerance_edit(self):
+        mode = self.edit_params['tolerance_mode'].get()
+        # Per channel a color can differ by 255 at most; the RGB distance reaches sqrt(3) * 255 = 441.7
+        limit = 442 if mode == 'euclidean' else 255
+        try:
+            tolerance = int(self.edit_params['tolerance'].get())
+            if not (0 <= tolerance <= limit): raise ValueError
+        except ValueError:
+            messagebox.showerror("Invalid Input", f"Color Tolerance must be a whole number between 0 and {limit} in '{mode}' mode.", parent=self)
+            return False
+        self.action.details['tolerance'] = tolerance
+        self.action.details['tolerance_mode'] = mode
+        # Color signatures: the same tolerance for every point
+        for point in self.action.details.get('points') or []:
+            point['tolerance'] = tolerance
+        return True
+
+    def _store_logic_details(self):
         # Update the actual event data in macro_data
         # Logic actions are stored as single events
         if self.action.indices:
@@ -1,21 +1,42 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, Menu, filedialog, messagebox
 import json
+import os
 import time
 import keyboard
 import mouse
+import numpy as np
 from event_recorder import Recorder
 from event_player import Player
 from hotkey_manager import HotkeyManager
+from input_dispatcher import get_dispatcher
 import event_grouper
 from event_grouper import GroupedAction
 import event_utils
+import color_match
+import image_search
+import region_watch
+import sound_trigger
+import audio_capture
+import screen_provider
+import macro_file
+import path_simplify
+from event_store import EventStore
+from virtual_tree import VirtualTreeview
+from ui_pump import UIPump
+import log_writer
+from log_writer import LogWriter
+from log_view import LogView
 from action_editor import ActionEditorWindow
 from key_mapper_manager import KeyMapperManager
 from key_mapper_gui import KeyMapperWindow
 from import_dialog import ImportDialog
 from help_gui import HelpWindow
 
+MACRO_FILETYPES = [("Macro Files", "*.json *" + macro_file.BINARY_EXTENSION), ("JSON Macro Files", "*.json"),
+                   ("Binary Macro Files", "*" + macro_file.BINARY_EXTENSION), ("All Files", "*.*")]
+CLIP_RECORD_SECONDS = 3  # Length of a recorded reference clip before trimming
+
 def _get_event_obj(event):
     """Helper to extract the event object from a macro data entry."""
     return event[1]['obj']
@@ -25,82 +46,14 @@ def _is_modifier_or_hotkey(key_name):
     key_name = key_name.lower()
     return key_name in ['f5', 'f6', 'f7', 'ctrl', 'alt', 'shift']
 
-# --- Event Serialization/Deserialization Helpers ---
-def _serialize_event(event_data):
-    event_time, data_dict = event_data
-    
-    # Handle Logic Events (Loop, Wait, etc.)
-    if 'logic_type' in data_dict:
-        event_dict = {'time': event_time}
-        event_dict.update(data_dict)
-        return event_dict
-
-    event = data_dict['obj']
-    pos = data_dict.get('pos')
-
-    event_dict = {'time': event_time}
-    # Add all other keys from the data_dict, like 'remarks' in the future
-    for key, value in data_dict.items():
-        if key not in ['obj', 'pos']:
-            event_dict[key] = value
-
-    if isinstance(event, keyboard.KeyboardEvent):
-        event_dict['type'] = 'keyboard'
-        event_dict['event_type'] = event.event_type
-        event_dict['name'] = event.name
-        event_dict['scan_code'] = event.scan_code
-    elif isinstance(event, mouse.MoveEvent):
-        event_dict['type'] = 'mouse_move'
-        event_dict['x'] = event.x
-        event_dict['y'] = event.y
-    elif isinstance(event, mouse.ButtonEvent):
-        event_dict['type'] = 'mouse_button'
-        event_dict['event_type'] = event.event_type
-        event_dict['button'] = event.button
-        if pos: event_dict['pos'] = pos
-    elif isinstance(event, mouse.WheelEvent):
-        event_dict['type'] = 'mouse_wheel'
-        event_dict['delta'] = event.delta
-    else:
-        return None
-    return event_dict
-
-def _deserialize_event(event_dict):
-    event_time = event_dict['time']
-    data_dict = {}
-    
-    # Handle Logic Events
-    if 'logic_type' in event_dict:
-        data_dict = event_dict.copy()
-        del data_dict['time']
-        return (event_time, data_dict)
-
-    event_type = event_dict.get('type')
-    event = None
-
-    if event_type == 'keyboard':
-        event = keyboard.KeyboardEvent(event_type=event_dict['event_type'], name=event_dict['name'], scan_code=event_dict['scan_code'])
-    elif event_type == 'mouse_move':
-        event = mouse.MoveEvent(event_dict['x'], event_dict['y'], event_dict['time'])
-    elif event_type == 'mouse_button':
-        event = mouse.ButtonEvent(event_type=event_dict['event_type'], button=event_dict['button'], time=event_dict['time'])
-        if 'pos' in event_dict:
-            data_dict['pos'] = event_dict['pos']
-    elif event_type == 'mouse_wheel':
-        event = mouse.WheelEvent(event_dict['delta'])
-    
-    if event:
-        data_dict['obj'] = event
-        # Restore any other metadata
-        for key, value in event_dict.items():
-            if key not in ['time', 'type', 'event_type', 'name', 'scan_code', 'x', 'y', 'button', 'pos', 'delta']:
-                data_dict[key] = value
-        return (event_time, data_dict)
-    return None
-
 class AppGUI:
     def __init__(self, root):
         self.root = root
+        # Player/recorder threads post UI updates here; the Tk thread applies them at a fixed frame rate
+        self.ui_pump = UIPump(root, line_sink=self._append_log_lines)
+        # Log records are written to disk by a background thread; callers never block on I/O
+        self.log_file = "macro_log.txt"
+        self.log_writer = LogWriter(self.log_file, error_callback=self._on_log_write_error)
         self.root.title("Advanced Macro Editor v6.2.1")
         self.root.geometry("700x750")
 
@@ -108,20 +61,26 @@ class AppGUI:
         self.is_playing = False
         self.macro_data = {}
         self.visible_actions = []
+        self._row_events = None  # EventStore the editor rows read times and remarks from
 
+        # The one keyboard/mouse hook; hotkeys, pickers and the recorder subscribe to it, and their errors land in the log
+        self.input_dispatcher = get_dispatcher(log_callback=lambda message: self.add_log_message(message, log_writer.ERROR))
+        self.pick_key_subscriptions = []
         self.quick_slots = {}
         self.load_quick_slots_config()
         self.register_quick_slot_hotkeys()
         self.key_mapper_manager = KeyMapperManager()
         self.playback_idx_offset = 0
-        self.recorder = Recorder(log_callback=self.add_log_message, mapper_manager=self.key_mapper_manager)
+        self.recorder = Recorder(log_callback=self.add_log_message, mapper_manager=self.key_mapper_manager, on_actions_callback=self._on_recorded_actions)
         self.player = Player(
             on_finish_callback=self.on_playback_finished, 
             log_callback=self.add_log_message, 
+            debug_log_callback=self._debug_log_callback(),
             on_action_highlight_callback=self.highlight_playing_action,
             mapper_manager=self.key_mapper_manager
         )
-        self.hotkey_manager = HotkeyManager(on_record_hotkey=self.toggle_recording, on_play_hotkey=self.start_playing, on_stop_hotkey=self.stop_playing)
+        self.hotkey_manager = HotkeyManager(on_record_hotkey=self.toggle_recording, on_play_hotkey=self.start_playing, on_stop_hotkey=self.stop_playing,
+                                            dispatcher=self.input_dispatcher)
         self.coord_var = tk.StringVar(value="absolute")
 
         menubar = Menu(self.root)
@@ -146,6 +105,8 @@ class AppGUI:
         option_menu.add_separator()
         self.dark_mode_var = tk.BooleanVar(value=False)
         option_menu.add_checkbutton(label="Dark Mode / 다크 모드", variable=self.dark_mode_var, command=self.toggle_dark_mode)
+        self.debug_log_var = tk.BooleanVar(value=False)
+        option_menu.add_checkbutton(label="Debug Log / 디버그 로그", variable=self.debug_log_var, command=self.toggle_debug_log)
 
         tools_menu = Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Tools", menu=tools_menu)
@@ -173,6 +134,8 @@ class AppGUI:
         self.play_button.pack(side="left", padx=5, pady=5)
         self.stop_button = ttk.Button(controls_frame, text="Stop (Ctrl+Alt+F7)", command=self.stop_playing)
         self.stop_button.pack(side="left", padx=5, pady=5)
+        self.pause_button = ttk.Button(controls_frame, text="Pause", command=self.toggle_pause)
+        self.pause_button.pack(side="left", padx=5, pady=5)
 
         options_frame = ttk.LabelFrame(top_frame, text="Options")
         options_frame.grid(row=1, column=0, padx=5, pady=5, sticky="ew")
@@ -186,6 +149,16 @@ class AppGUI:
         self.speed_spinbox.pack(side="left", padx=5)
         self.speed_spinbox.set(1.0)
 
+        ttk.Label(options_frame, text="Move Hz:").pack(side="left", padx=(10, 0))
+        self.move_rate_spinbox = ttk.Spinbox(options_frame, from_=0, to=240, increment=30, width=5)
+        self.move_rate_spinbox.pack(side="left", padx=5)
+        self.move_rate_spinbox.set(0)  # 0 = play every recorded mouse move
+
+        ttk.Label(options_frame, text="Pixel Hz:").pack(side="left", padx=(10, 0))
+        self.pixel_rate_spinbox = ttk.Spinbox(options_frame, from_=0, to=240, increment=30, width=5)
+        self.pixel_rate_spinbox.pack(side="left", padx=5)
+        self.pixel_rate_spinbox.set(60)  # 0 = read each color condition's pixel directly
+
         self.always_on_top_var = tk.BooleanVar()
         ttk.Checkbutton(options_frame, text="Always on Top", variable=self.always_on_top_var, command=self.toggle_always_on_top).pack(side="left", padx=(10,0))
         self.stop_on_sound_var = tk.BooleanVar()
@@ -235,6 +208,16 @@ class AppGUI:
         self.auto_wait_timeout_var = tk.StringVar(value="5.0")
         self.auto_wait_timeout_entry = ttk.Entry(auto_wait_frame, textvariable=self.auto_wait_timeout_var, width=4, state="disabled")
         self.auto_wait_timeout_entry.pack(side="left", padx=2)
+
+        # Simplify Moves while recording
+        simplify_frame = ttk.LabelFrame(bottom_controls_frame, text="Simplify Moves")
+        simplify_frame.pack(side="left", fill="both", expand=True, padx=(5, 0))
+
+        self.simplify_moves_var = tk.BooleanVar()
+        ttk.Checkbutton(simplify_frame, text="Enable", variable=self.simplify_moves_var).pack(side="left", padx=5, pady=5)
+        ttk.Label(simplify_frame, text="Tol (px):").pack(side="left", padx=2)
+        self.simplify_tolerance_var = tk.StringVar(value="2.0")
+        ttk.Entry(simplify_frame, textvariable=self.simplify_tolerance_var, width=4).pack(side="left", padx=2)
         
         # Right Click → Color Check 기능
         self.right_click_color_check_var = tk.BooleanVar()
@@ -250,7 +233,9 @@ class AppGUI:
         self.notebook.add(self.quick_slots_frame, text="Quick Slots")
         self._setup_quick_slots_tab()
 
-        self.tree = ttk.Treeview(editor_frame, columns=("No", "Time", "Action", "Remarks"), show="headings")
+        # Only the rows around the visible area are materialized; row i has iid str(i)
+        self.action_list = VirtualTreeview(editor_frame, self._action_row_values, columns=("No", "Time", "Action", "Remarks"), show="headings")
+        self.tree = self.action_list.tree
         self.tree.heading("No", text="No.")
         self.tree.heading("Time", text="Time (s)")
         self.tree.heading("Action", text="Action")
@@ -259,9 +244,7 @@ class AppGUI:
         self.tree.column("Time", width=60, anchor="center")
         self.tree.column("Action", width=120)
         self.tree.column("Remarks", width=150)
-        tree_scrollbar = ttk.Scrollbar(editor_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=tree_scrollbar.set)
-        tree_scrollbar.pack(side="right", fill="y")
+        self.action_list.scrollbar.pack(side="right", fill="y")
         self.tree.pack(side="left", fill="both", expand=True)
         self.tree.bind("<Double-1>", self.open_action_editor)
 
@@ -271,14 +254,22 @@ class AppGUI:
         self.delete_button.pack(pady=5)
         self.bulk_delete_moves_button = ttk.Button(editor_button_frame, text="Delete All Moves", command=self.bulk_delete_mouse_moves)
         self.bulk_delete_moves_button.pack(pady=5)
+        self.simplify_moves_button = ttk.Button(editor_button_frame, text="Simplify Moves", command=self.simplify_mouse_moves)
+        self.simplify_moves_button.pack(pady=5)
         self.bulk_edit_btn = ttk.Button(editor_button_frame, text="Bulk Edit Interval", command=self.bulk_edit_interval)
         self.bulk_edit_btn.pack(pady=5)
         self.insert_loop_btn = ttk.Button(editor_button_frame, text="Insert Loop", command=self.insert_loop)
         self.insert_loop_btn.pack(pady=5)
         self.insert_color_btn = ttk.Button(editor_button_frame, text="Insert Color Wait", command=self.insert_color_wait)
         self.insert_color_btn.pack(pady=5)
-        self.insert_sound_btn = ttk.Button(editor_button_frame, text="Insert Sound Wait", command=self.insert_sound_wait)
-        self.insert_sound_btn.pack(pady=5)
+        self.sound_menubutton = ttk.Menubutton(editor_button_frame, text="Insert Sound Wait ▼")
+        self.sound_menu = Menu(self.sound_menubutton, tearoff=0)
+        self.sound_menubutton["menu"] = self.sound_menu
+        self.sound_menu.add_command(label="Any Sound (Volume)", command=self.insert_sound_wait)
+        self.sound_menu.add_command(label="Frequency Band...", command=lambda: self.insert_sound_trigger('band'))
+        self.sound_menu.add_command(label="Reference Clip (WAV File)...", command=lambda: self.insert_sound_trigger('clip'))
+        self.sound_menu.add_command(label="Reference Clip (Record)...", command=self.record_sound_clip)
+        self.sound_menubutton.pack(pady=5, fill='x')
         
         # IF Color with submenu
         self.if_color_menubutton = ttk.Menubutton(editor_button_frame, text="Insert IF Color ▼")
@@ -290,6 +281,27 @@ class AppGUI:
         self.if_color_menu.add_command(label="ELSE Only", command=self.insert_else_only)
         self.if_color_menu.add_command(label="END IF Only", command=self.insert_end_if_only)
         self.if_color_menubutton.pack(pady=5, fill='x')
+
+        self.signature_menubutton = ttk.Menubutton(editor_button_frame, text="Insert Color Signature ▼")
+        self.signature_menu = Menu(self.signature_menubutton, tearoff=0)
+        self.signature_menubutton["menu"] = self.signature_menu
+        self.signature_menu.add_command(label="Wait Signature", command=lambda: self.insert_color_signature('wait_color'))
+        self.signature_menu.add_command(label="IF Signature", command=lambda: self.insert_color_signature('if_color_match'))
+        self.signature_menubutton.pack(pady=5, fill='x')
+
+        self.image_menubutton = ttk.Menubutton(editor_button_frame, text="Insert Image ▼")
+        self.image_menu = Menu(self.image_menubutton, tearoff=0)
+        self.image_menubutton["menu"] = self.image_menu
+        self.image_menu.add_command(label="Wait Image", command=lambda: self.insert_image_search('wait_image'))
+        self.image_menu.add_command(label="Click Image", command=lambda: self.insert_image_search('click_image'))
+        self.image_menubutton.pack(pady=5, fill='x')
+
+        self.region_menubutton = ttk.Menubutton(editor_button_frame, text="Insert Region Wait ▼")
+        self.region_menu = Menu(self.region_menubutton, tearoff=0)
+        self.region_menubutton["menu"] = self.region_menu
+        self.region_menu.add_command(label="Wait Until Changed", command=lambda: self.insert_region_wait('wait_region_change'))
+        self.region_menu.add_command(label="Wait Until Stable", command=lambda: self.insert_region_wait('wait_region_stable'))
+        self.region_menubutton.pack(pady=5, fill='x')
         
         self.insert_call_btn = ttk.Button(editor_button_frame, text="Insert Call Macro", command=self.insert_call_macro)
         self.insert_call_btn.pack(pady=5)
@@ -298,8 +310,8 @@ class AppGUI:
         main_pane.add(log_frame, weight=0)
         self.log_text = scrolledtext.ScrolledText(log_frame, wrap=tk.WORD, state='disabled', height=5)
         self.log_text.pack(fill="both", expand=True, padx=5, pady=5)
-
-        self.log_file = "macro_log.txt"
+        # Keeps the last 5000 lines; the log file has the full history
+        self.log_view = LogView(self.log_text)
 
         # Status Bar
         self.status_var = tk.StringVar(value="Ready / 준비")
@@ -308,6 +320,7 @@ class AppGUI:
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
 
         self.update_button_states()
+        self.ui_pump.start()
         self.hotkey_manager.start()
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
@@ -324,40 +337,57 @@ class AppGUI:
         if 'grouped_actions' in self.macro_data:
             del self.macro_data['grouped_actions']
 
+    def _regroup_edit(self, start, old_stop, new_stop, actions=None):
+        """
+        Updates the grouped actions after events[start:old_stop] were replaced by
+        events[start:new_stop]. Only the actions around the edit are regrouped.
+        """
+        if actions is None:
+            actions = self.visible_actions
+        if not actions:
+            self._invalidate_grouped_actions()
+            return
+        self.visible_actions = event_grouper.regroup_window(
+            self.macro_data['events'], actions, start, old_stop, new_stop,
+            log_callback=self._debug_log_callback()
+        )
+        self.macro_data['grouped_actions'] = self.visible_actions
+
+    def _action_row_values(self, i):
+        action = self.visible_actions[i]
+        if self._row_events is None:
+            # Live recording: the events are still owned by the recorder
+            return (i + 1, f"{action.start_time:.2f}", action.display_text, "")
+        start_time = self._row_events.time[action.start_index]
+        # Check for remarks in the first event of the action
+        details = self._row_events.get_extra(action.start_index, 'remarks', "")
+        return (i + 1, f"{start_time:.2f}", action.display_text, details)
+
     def _populate_treeview(self):
-        self.tree.delete(*self.tree.get_children())
-        
         try:
             # Use loaded grouped actions if available (perfect compatibility)
             # Otherwise re-group from raw events
             if self.macro_data.get('grouped_actions'):
                 self.visible_actions = self.macro_data['grouped_actions']
-                self.add_log_message("Using pre-grouped actions from file.")
             else:
                 self.visible_actions = event_grouper.group_events(
                     self.macro_data.get('events', []),
-                    log_callback=self.add_log_message
+                    log_callback=self._debug_log_callback()
                 )
-            for i, action in enumerate(self.visible_actions):
-                start_time = self.macro_data['events'][action.start_index][0]
-                
-                # Check for remarks in the first event of the action
-                first_event_data = self.macro_data['events'][action.start_index][1]
-                details = first_event_data.get('remarks', "")
-
-                self.tree.insert("", "end", iid=i, values=(i + 1, f"{start_time:.2f}", action.display_text, details))
+            self._row_events = EventStore.coerce(self.macro_data.get('events'))
+            self.action_list.set_count(len(self.visible_actions))
         except Exception as e:
             self.add_log_message(f"Error populating editor: {e}")
             messagebox.showerror("Error", f"Failed to display macro actions. The data might be inconsistent.\n\nDetails: {e}")
 
 
     def bulk_edit_interval(self):
-        selected_items = self.tree.selection()
+        selected_items = self.action_list.selected_indices()
         if not selected_items:
             messagebox.showwarning("No Selection", "Please select actions to edit.")
             return
         
-        indices = sorted([self.tree.index(item) for item in selected_items])
+        indices = selected_items
         start_idx = indices[0]
         end_idx = indices[-1]
         
@@ -374,13 +404,11 @@ class AppGUI:
             messagebox.showerror("Invalid Input", "Please enter a valid non-negative number.")
             return
             
-        self._invalidate_grouped_actions()
         self._apply_bulk_interval(start_idx, end_idx, new_interval)
         self._populate_treeview()
         self.add_log_message(f"Bulk edited interval for actions {start_idx+1}-{end_idx+1} to {new_interval}s")
 
     def _apply_bulk_interval(self, start_idx, end_idx, new_interval):
-        self._invalidate_grouped_actions()
         events = self.macro_data['events']
         if not self.visible_actions: return
     
@@ -406,7 +434,7 @@ class AppGUI:
             
             new_start_times.append(new_start)
                 
-        rebuilt_events = []
+        shifts = np.full(len(events), np.nan)
         for i, action in enumerate(self.visible_actions):
             new_start = new_start_times[i]
             original_start = action.start_time
@@ -414,26 +442,17 @@ class AppGUI:
             
             action.start_time = new_start
             action.end_time += shift
+            shifts[action.indices] = shift
 
-            if action.indices:
-                for idx in action.indices:
-                    t, data = events[idx]
-                    import copy
-                    new_data = copy.deepcopy(data)
-                    new_t = t + shift
-                    
-                    if 'time' in new_data:
-                        new_data['time'] = new_t
-                    
-                    if 'obj' in new_data:
-                        try:
-                            new_data['obj'].time = new_t
-                        except:
-                            pass
-                        
-                    rebuilt_events.append((new_t, new_data))
-                
-        self.macro_data['events'] = rebuilt_events
+        # Events outside any action move with the event before them, then every timestamp is shifted in place
+        filled = np.where(np.isnan(shifts), 0, np.arange(len(shifts)))
+        shifts = np.nan_to_num(shifts[np.maximum.accumulate(filled)])
+        events.time[:] += shifts
+
+        # Everything after the range moved by the same amount, so only the range itself is regrouped
+        window_start = self.visible_actions[start_idx].start_index
+        window_stop = self.visible_actions[end_idx].end_index + 1
+        self._regroup_edit(window_start, window_stop, window_stop)
 
     def bulk_delete_mouse_moves(self):
         if not self.macro_data.get('events'):
@@ -446,7 +465,7 @@ class AppGUI:
         # We need to get a fresh grouping to ensure we have the right actions
         grouped_actions = event_grouper.group_events(
             self.macro_data.get('events', []),
-            log_callback=self.add_log_message
+            log_callback=self._debug_log_callback()
         )
         
         indices_to_delete = set()
@@ -458,17 +477,52 @@ class AppGUI:
             messagebox.showinfo("No Moves", "No mouse move actions were found to delete.")
             return
 
-        # Delete from the raw event list in reverse order to avoid index shifting issues
-        for i in sorted(list(indices_to_delete), reverse=True):
-            del self.macro_data['events'][i]
+        self.macro_data['events'].delete_indices(indices_to_delete)
+        self._regroup_edit(min(indices_to_delete), max(indices_to_delete) + 1,
+                           max(indices_to_delete) + 1 - len(indices_to_delete), actions=grouped_actions)
 
         self.add_log_message(f"Bulk deleted {len(indices_to_delete)} raw mouse move event(s).")
-        self._invalidate_grouped_actions()
+        self._populate_treeview()
+        self.update_button_states()
+
+    def simplify_mouse_moves(self):
+        if not self.macro_data.get('events') or not self.visible_actions:
+            messagebox.showwarning("No Macro", "There is no macro data to modify.")
+            return
+
+        import tkinter.simpledialog as simpledialog
+        tolerance = simpledialog.askfloat("Simplify Moves", "Pixel tolerance:", minvalue=0.0, initialvalue=path_simplify.DEFAULT_TOLERANCE_PX)
+        if tolerance is None: return
+        # Kept points may not be further apart than a human pause, or regrouping would split the actions
+        max_interval = simpledialog.askfloat("Simplify Moves",
+                                             f"Timing tolerance (max seconds between kept points, up to {event_grouper.HUMAN_PAUSE_THRESHOLD:g}):",
+                                             minvalue=0.0, maxvalue=event_grouper.HUMAN_PAUSE_THRESHOLD,
+                                             initialvalue=path_simplify.DEFAULT_MAX_INTERVAL)
+        if max_interval is None: return
+
+        # Selected mouse move actions only, or all of them
+        selected = self.action_list.selected_indices() or None
+        events = self.macro_data['events']
+        removed = path_simplify.plan_move_simplification(events, self.visible_actions, selected, tolerance, max_interval)
+        if not len(removed):
+            messagebox.showinfo("Simplify Moves", "The mouse moves are already within the tolerance.")
+            return
+
+        before = len(events)
+        scope = "selected" if selected else "all"
+        if not messagebox.askyesno("Simplify Moves",
+                                   f"Simplify {scope} mouse move actions within {tolerance:g} px and {max_interval:g} s?\n\n"
+                                   f"Events: {before} → {before - len(removed)} ({len(removed)} moves removed)"):
+            return
+
+        self.visible_actions = path_simplify.remove_events(events, self.visible_actions, removed)
+        self.macro_data['grouped_actions'] = self.visible_actions
+        self.add_log_message(f"Simplified mouse moves: {before} → {len(events)} events.")
         self._populate_treeview()
         self.update_button_states()
 
     def delete_selected_event(self):
-        selected_items = self.tree.selection()
+        selected_items = self.action_list.selected_indices()
         if not selected_items:
             messagebox.showwarning("No Selection", "Please select an action to delete.")
             return
@@ -476,7 +530,7 @@ class AppGUI:
         if not messagebox.askyesno("Confirm Delete", "Are you sure you want to delete the selected action(s)?"):
             return
 
-        selected_indices = sorted([int(self.tree.item(item, "values")[0]) - 1 for item in selected_items], reverse=True)
+        selected_indices = sorted(selected_items, reverse=True)
         
         raw_indices_to_delete = set()
         for i in selected_indices:
@@ -484,12 +538,12 @@ class AppGUI:
                 action = self.visible_actions[i]
                 raw_indices_to_delete.update(action.indices)
         
-        # Delete from the raw event list in reverse order
-        for i in sorted(list(raw_indices_to_delete), reverse=True):
-            del self.macro_data['events'][i]
+        if not raw_indices_to_delete: return
+        self.macro_data['events'].delete_indices(raw_indices_to_delete)
+        self._regroup_edit(min(raw_indices_to_delete), max(raw_indices_to_delete) + 1,
+                           max(raw_indices_to_delete) + 1 - len(raw_indices_to_delete))
 
         self.add_log_message(f"Deleted {len(raw_indices_to_delete)} raw event(s).")
-        self._invalidate_grouped_actions()
         self._populate_treeview()
         self.update_button_states()
 
@@ -500,6 +554,9 @@ class AppGUI:
         if self.is_recording:
             self.recorder.stop_recording()
         self.hotkey_manager.stop()
+        self._stop_pick_keys()
+        self.ui_pump.stop()
+        self.log_writer.close()
         self.root.destroy()
 
     def toggle_recording(self, is_continuation=False):
@@ -532,7 +589,18 @@ class AppGUI:
             except ValueError:
                 auto_wait_timeout = 5.0
 
-            self.recorder.start_recording(self.coord_var.get(), existing_events=existing_events, auto_wait=auto_wait, auto_wait_timeout=auto_wait_timeout, right_click_to_color_check=right_click_color_check)
+            if not is_continuation:
+                # Fresh recordings are grouped live; show their actions as they are finalized
+                self.visible_actions = []
+                self._row_events = None
+                self.action_list.set_count(0)
+            try:
+                simplify_tolerance = max(float(self.simplify_tolerance_var.get()), 0.0)
+            except ValueError:
+                simplify_tolerance = 2.0
+
+            self.recorder.start_recording(self.coord_var.get(), existing_events=existing_events, auto_wait=auto_wait, auto_wait_timeout=auto_wait_timeout, right_click_to_color_check=right_click_color_check,
+                                          simplify_moves=self.simplify_moves_var.get(), simplify_tolerance_px=simplify_tolerance)
         else:
             self.is_recording = False
             self.record_button.config(text="Record (Ctrl+Alt+F5)")
@@ -566,16 +634,34 @@ class AppGUI:
                         else:
                             break
                 
-                self.macro_data['events'] = events[start_idx_to_keep:end_idx_to_keep]
+                if start_idx_to_keep > 0 or end_idx_to_keep < len(events):
+                    # Trimming shifts event indices, so the live grouping no longer applies
+                    self._invalidate_grouped_actions()
+                    self.macro_data['events'] = events[start_idx_to_keep:end_idx_to_keep]
 
             # Remove redundant paste events (Win+V fix)
             if self.macro_data.get('events'):
+                event_count = len(self.macro_data['events'])
                 self.macro_data['events'] = event_utils.remove_redundant_paste_events(self.macro_data['events'])
+                if len(self.macro_data['events']) != event_count:
+                    self._invalidate_grouped_actions()
 
             self.add_log_message(f"Recorded {len(self.macro_data.get('events', []))} events.")
             self._populate_treeview()
         self.update_button_states()
 
+    def _on_recorded_actions(self, actions):
+        # Called from the recorder's listener thread while recording (and from stop_recording for the
+        # final flush), never from the input hooks; widgets are still only touched on the Tk thread
+        self.ui_pump.call(self._append_live_actions, actions)
+
+    def _append_live_actions(self, actions):
+        if not self.is_recording:
+            return
+        self.visible_actions.extend(actions)
+        self.action_list.append_rows(len(actions))
+        self.action_list.see(len(self.visible_actions) - 1)
+
     def start_continue_recording(self):
         if not messagebox.askyesno("Continue Recording", "Do you want to continue recording from the end of the current macro?"):
             return
@@ -590,14 +676,16 @@ class AppGUI:
         try:
             repeat_count = int(self.repeat_spinbox.get())
             speed_multiplier = float(self.speed_spinbox.get())
+            move_rate_hz = float(self.move_rate_spinbox.get())
+            pixel_rate_hz = float(self.pixel_rate_spinbox.get())
         except ValueError:
-            self.add_log_message("Invalid repeat count or speed.")
+            self.add_log_message("Invalid repeat count, speed, move rate or pixel rate.")
             return
         self.is_playing = True
         self.playback_idx_offset = 0
         self.update_button_states()
         self.add_log_message(f"Playback started (repeating {repeat_count} times at {speed_multiplier}x speed)...")
-        self.player.play_events(self.macro_data, repeat_count, speed_multiplier, stop_on_sound=self.stop_on_sound_var.get(), prudent_mode=self.prudent_mode_var.get())
+        self.player.play_events(self.macro_data, repeat_count, speed_multiplier, stop_on_sound=self.stop_on_sound_var.get(), prudent_mode=self.prudent_mode_var.get(), move_rate_hz=move_rate_hz, pixel_rate_hz=pixel_rate_hz)
 
 
     def play_partial(self):
@@ -617,16 +705,14 @@ class AppGUI:
                 return
             
             # Create partial events from selected action range
-            partial_events = []
+            partial_indices = []
             for i in range(from_idx, to_idx + 1):
-                action = self.visible_actions[i]
-                for idx in action.indices:
-                    partial_events.append(self.macro_data['events'][idx])
+                partial_indices.extend(self.visible_actions[i].indices)
+            partial_events = self.macro_data['events'].take(partial_indices)
             
             # Adjust timestamps to start from 0
-            if partial_events:
-                first_time = partial_events[0][0]
-                partial_events = [(t - first_time, data) for t, data in partial_events]
+            if len(partial_events):
+                partial_events.shift_times(-partial_events.time[0])
             
             partial_macro = {
                 'mode': self.macro_data['mode'],
@@ -636,12 +722,14 @@ class AppGUI:
             
             repeat_count = int(self.repeat_spinbox.get())
             speed_multiplier = float(self.speed_spinbox.get())
+            move_rate_hz = float(self.move_rate_spinbox.get())
+            pixel_rate_hz = float(self.pixel_rate_spinbox.get())
             
             self.is_playing = True
             self.playback_idx_offset = from_idx
             self.update_button_states()
             self.add_log_message(f"Partial playback started (actions {from_idx+1} to {to_idx+1})...")
-            self.player.play_events(partial_macro, repeat_count, speed_multiplier, stop_on_sound=self.stop_on_sound_var.get(), prudent_mode=self.prudent_mode_var.get())
+            self.player.play_events(partial_macro, repeat_count, speed_multiplier, stop_on_sound=self.stop_on_sound_var.get(), prudent_mode=self.prudent_mode_var.get(), move_rate_hz=move_rate_hz, pixel_rate_hz=pixel_rate_hz)
             
         except ValueError:
             messagebox.showerror("Invalid Input", "Please enter valid numbers.")
@@ -651,7 +739,20 @@ class AppGUI:
             return
         self.player.stop_playing()
 
+    def toggle_pause(self):
+        if not self.is_playing:
+            return
+        if self.player.paused:
+            self.player.resume_playing()
+        else:
+            self.player.pause_playing()
+        self.update_button_states()
+
     def on_playback_finished(self):
+        # Called from the player thread; applied after the last highlight of the same frame
+        self.ui_pump.call(self._finish_playback)
+
+    def _finish_playback(self):
         self.is_playing = False
         self.update_button_states()
         self.add_log_message("Playback finished.")
@@ -664,16 +765,20 @@ class AppGUI:
         continue_state = "disabled" if self.is_recording or self.is_playing or not has_macro else "normal"
         play_state = "disabled" if self.is_recording or self.is_playing or not has_macro else "normal"
         stop_state = "disabled" if not self.is_playing else "normal"
+        is_paused = self.is_playing and self.player.paused
 
         self.record_button.config(state=record_state)
         self.continue_button.config(state=continue_state)
         self.play_button.config(state=play_state)
         self.stop_button.config(state=stop_state)
+        self.pause_button.config(state=stop_state, text="Resume" if is_paused else "Pause")
         self.delete_button.config(state="normal" if can_edit and has_macro else "disabled")
         
         # Update Status Bar
         if self.is_recording:
             self.status_var.set("🔴 Recording... / 녹화 중...")
+        elif is_paused:
+            self.status_var.set("⏸️ Paused / 일시 정지")
         elif self.is_playing:
             self.status_var.set("▶️ Playing... / 재생 중...")
         else:
@@ -718,9 +823,10 @@ class AppGUI:
         Returns (clean_events, clean_actions)
         """
         if not self.visible_actions:
-            return [], []
+            return EventStore(), []
 
-        clean_events = []
+        events = self.macro_data['events']
+        clean_order = []
         clean_actions = []
         
         current_idx = 0
@@ -734,9 +840,8 @@ class AppGUI:
             
             # Extract events for this action
             for old_idx in action.indices:
-                if 0 <= old_idx < len(self.macro_data['events']):
-                    event = self.macro_data['events'][old_idx]
-                    clean_events.append(event)
+                if 0 <= old_idx < len(events):
+                    clean_order.append(old_idx)
                     new_indices.append(current_idx)
                     current_idx += 1
             
@@ -746,26 +851,13 @@ class AppGUI:
                 new_action.end_index = new_indices[-1]
                 clean_actions.append(new_action)
         
+        clean_events = events.take(clean_order)
+
         # Normalization: Shift all events so the first event starts at 0.0
-        if clean_events:
-            start_offset = clean_events[0][0]
+        if len(clean_events):
+            start_offset = float(clean_events.time[0])
             if start_offset > 0:
-                normalized_events = []
-                for t, data in clean_events:
-                    new_t = t - start_offset
-                    # Update logic event time if present
-                    if 'time' in data:
-                        data['time'] = new_t # This might be redundant if data is just a dict, but safe
-                    
-                    # Update object time if possible (for completeness, though serialization uses tuple time)
-                    if 'obj' in data:
-                        try:
-                            data['obj'].time = new_t
-                        except:
-                            pass
-                            
-                    normalized_events.append((new_t, data))
-                clean_events = normalized_events
+                clean_events.shift_times(-start_offset)
                 
                 # We also need to update the start/end times in clean_actions
                 for action in clean_actions:
@@ -786,51 +878,28 @@ class AppGUI:
         self.visible_actions = clean_actions
         self._populate_treeview()
         
-        file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON Macro Files", "*.json"), ("All Files", "*.*")] )
+        file_path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON Macro Files", "*.json"), ("Binary Macro Files", "*" + macro_file.BINARY_EXTENSION), ("All Files", "*.*")] )
         if not file_path:
             return
         try:
-            serializable_events = [_serialize_event(e) for e in self.macro_data['events']]
-            # Serialize grouped actions for perfect compatibility
-            serializable_actions = []
-            if self.visible_actions:
-                for action in self.visible_actions:
-                    action_dict = {
-                        'type': action.type,
-                        'display_text': action.display_text,
-                        'start_time': action.start_time,
-                        'end_time': action.end_time,
-                        'start_index': action.start_index,
-                        'end_index': action.end_index,
-                        'indices': action.indices,
-                        'details': action.details
-                    }
-                    serializable_actions.append(action_dict)
-            
-            serializable_macro_data = {
-                'mode': self.macro_data['mode'],
-                'origin': self.macro_data['origin'],
-                'events': [e for e in serializable_events if e is not None],
-                'grouped_actions': serializable_actions  # NEW: Store grouped actions
-            }
-            with open(file_path, 'w') as f:
-                json.dump(serializable_macro_data, f, indent=4)
+            # The file extension picks the format (.json or binary)
+            macro_file.save_macro(file_path, self.macro_data, self.visible_actions or [])
             self.add_log_message(f"Macro successfully saved to {file_path}")
         except Exception as e:
             self.add_log_message(f"Error saving file: {e}")
 
     def _show_context_menu(self, event):
-        item = self.tree.identify_row(event.y)
-        if item:
-            self.tree.selection_set(item)
+        index = self.action_list.identify_index(event.y)
+        if index is not None:
+            self.action_list.selection_set([index])
             self.context_menu.post(event.x_root, event.y_root)
 
     def import_at_selection(self):
-        selected = self.tree.selection()
+        selected = self.action_list.selected_indices()
         if not selected:
             messagebox.showinfo("Info", "Please select an action to insert after.")
             return
-        idx = self.tree.index(selected[0])
+        idx = selected[0]
         self.load_events(mode='insert', target_index=idx + 1)
 
     def load_events(self, mode='replace', target_index=None):
@@ -840,44 +909,27 @@ class AppGUI:
 
         file_path = filedialog.askopenfilename(
             defaultextension=".json",
-            filetypes=[("JSON Macro Files", "*.json"), ("All Files", "*.* אמיתי")]
+            filetypes=MACRO_FILETYPES
         )
         if not file_path:
             return
 
         try:
-            with open(file_path, 'r') as f:
-                loaded_data = json.load(f)
-            
-            new_events = [_deserialize_event(e) for e in loaded_data.get('events', [])]
-            new_events = [e for e in new_events if e is not None]
+            loaded_data = macro_file.load_macro(file_path)
+            new_events = loaded_data['events']
 
             if not new_events:
                 self.add_log_message("Loaded macro file contains no valid events.")
                 return
 
             # Load grouped actions for the new macro
-            new_groups = []
-            loaded_groups_data = loaded_data.get('grouped_actions')
-            if loaded_groups_data:
-                for action_dict in loaded_groups_data:
-                    action = GroupedAction(
-                        type=action_dict['type'],
-                        display_text=action_dict['display_text'],
-                        start_time=action_dict['start_time'],
-                        end_time=action_dict['end_time'],
-                        start_index=action_dict['start_index'],
-                        end_index=action_dict['end_index'],
-                        indices=action_dict['indices'],
-                        details=action_dict.get('details', {})
-                    )
-                    new_groups.append(action)
-            else:
+            new_groups = loaded_data['grouped_actions']
+            if not new_groups:
                 # If no groups in file, group them now
                 new_groups = event_grouper.group_events(new_events)
 
             # Determine Import Mode
-            current_events = self.macro_data.get('events', [])
+            current_events = EventStore.coerce(self.macro_data.get('events'))
             if not current_events:
                 mode = 'replace'
             
@@ -893,17 +945,10 @@ class AppGUI:
             if mode == 'replace':
                 # Normalize timestamps for backward compatibility
                 if new_events:
-                    start_offset = new_events[0][0]
+                    start_offset = float(new_events.time[0])
                     if start_offset > 0:
                         # Shift events
-                        normalized_events = []
-                        for t, data in new_events:
-                            new_t = t - start_offset
-                            if 'obj' in data and hasattr(data['obj'], 'time'):
-                                try: data['obj'].time = new_t
-                                except: pass
-                            normalized_events.append((new_t, data))
-                        new_events = normalized_events
+                        new_events.shift_times(-start_offset)
                         
                         # Shift groups
                         for g in new_groups:
@@ -952,37 +997,20 @@ class AppGUI:
                 # Start time for new events should be: (end of before) + 1.0
                 start_time_new = 0.0
                 if events_before:
-                    start_time_new = events_before[-1][0] + 1.0
+                    start_time_new = float(events_before.time[-1]) + 1.0
 
                 # Shift new events to start at 0 first (normalize), then add start_time_new
                 if new_events:
-                    first_new_t = new_events[0][0]
-                    shifted_new_events = []
-                    for t, e in new_events:
-                        new_t = (t - first_new_t) + start_time_new
-                        # Update event object time if possible
-                        if 'obj' in e and hasattr(e['obj'], 'time'):
-                            try: e['obj'].time = new_t
-                            except: pass
-                        shifted_new_events.append((new_t, e))
-                    new_events = shifted_new_events
+                    new_events.shift_times(start_time_new - new_events.time[0])
 
                 # 2. Adjust After Events (Shift timestamps)
                 # Start time for after events should be: (end of new) + 1.0
                 start_time_after = start_time_new
                 if new_events:
-                    start_time_after = new_events[-1][0] + 1.0
+                    start_time_after = float(new_events.time[-1]) + 1.0
 
                 if events_after:
-                    first_after_t = events_after[0][0]
-                    shifted_after_events = []
-                    for t, e in events_after:
-                        new_t = (t - first_after_t) + start_time_after
-                        if 'obj' in e and hasattr(e['obj'], 'time'):
-                            try: e['obj'].time = new_t
-                            except: pass
-                        shifted_after_events.append((new_t, e))
-                    events_after = shifted_after_events
+                    events_after.shift_times(start_time_after - events_after.time[0])
 
                 # 3. Merge Events
                 merged_events = events_before + new_events + events_after
@@ -1016,56 +1044,61 @@ class AppGUI:
             self.add_log_message(f"Error: File not found at {file_path}")
         except json.JSONDecodeError:
             self.add_log_message(f"Error: Could not decode JSON. The file may be corrupted.")
+        except ValueError as e:
+            self.add_log_message(f"Error: The macro file is invalid or corrupted: {e}")
         except (KeyError, TypeError) as e:
             self.add_log_message(f"Error: The macro file is invalid or incompatible. Missing key: {e}")
         except Exception as e:
             self.add_log_message(f"An unexpected error occurred: {e}")
-    def add_log_message(self, message):
+    def add_log_message(self, message, level=log_writer.INFO):
+        self.log_writer.log(message, level)
+        # Debug records only go to the log file
+        if level >= log_writer.INFO:
+            timestamp = time.strftime("[%Y-%m-%d %H:%M:%S]")
+            self.ui_pump.post_line(f"{timestamp} {message}")
+
+    def add_debug_message(self, message):
+        self.add_log_message(message, log_writer.DEBUG)
+
+    def _debug_log_callback(self):
+        # Hot paths (grouper, player) get no callback at all while debug logging is off,
+        # so they skip formatting their debug messages
+        return self.add_debug_message if self.log_writer.enabled_for(log_writer.DEBUG) else None
+
+    def toggle_debug_log(self):
+        self.log_writer.level = log_writer.DEBUG if self.debug_log_var.get() else log_writer.INFO
+        self.player.debug_log_callback = self._debug_log_callback()
+
+    def _on_log_write_error(self, message):
+        # Called from the log writer thread
         timestamp = time.strftime("[%Y-%m-%d %H:%M:%S]")
-        log_message = f"{timestamp} {message}"
-        
-        try:
-            with open(self.log_file, 'a', encoding='utf-8') as f:
-                f.write(log_message + "\n")
-        except Exception as e:
-            error_message = f"{timestamp} [ERROR] Could not write to log file: {e}"
-            self.root.after(0, self._update_log_text, error_message)
-
-        if 'Executing high-level' not in message:
-            self.root.after(0, self._update_log_text, log_message)
+        self.ui_pump.post_line(f"{timestamp} [ERROR] {message}")
 
-    def _update_log_text(self, message):
-        self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, message + "\n")
-        self.log_text.config(state='disabled')
-        self.log_text.see(tk.END)
+    def _append_log_lines(self, lines):
+        # One insert per frame, however many lines were logged
+        self.log_view.append(lines)
 
     def highlight_playing_action(self, action_index):
+        # Called from the player thread; only the latest highlight per frame is applied
         real_idx = action_index + self.playback_idx_offset
-        self.root.after(0, self._update_highlight, real_idx)
+        self.ui_pump.post_latest('highlight', self._update_highlight, real_idx)
 
     def _update_highlight(self, action_index):
-        for item in self.tree.selection():
-            self.tree.selection_remove(item)
-        
-        if action_index != -1:
-            try:
-                item_id = self.tree.get_children()[action_index]
-                self.tree.selection_add(item_id)
-                self.tree.see(item_id)
-            except IndexError:
-                pass
+        if action_index == -1:
+            self.action_list.selection_set(())
+        else:
+            self.action_list.selection_set((action_index,))
+            self.action_list.see(action_index)
 
     def open_action_editor(self, event):
         if self.is_recording or self.is_playing:
             return
 
-        selected_items = self.tree.selection()
+        selected_items = self.action_list.selected_indices()
         if not selected_items:
             return
 
-        item_id = selected_items[0]
-        action_index = self.tree.index(item_id)
+        action_index = selected_items[0]
         action = self.visible_actions[action_index]
 
         ActionEditorWindow(
@@ -1119,7 +1152,7 @@ class AppGUI:
     def load_quick_slot_file(self, slot_idx):
         file_path = filedialog.askopenfilename(
             defaultextension=".json",
-            filetypes=[("JSON Macro Files", "*.json"), ("All Files", "*.*")]
+            filetypes=MACRO_FILETYPES
         )
         if file_path:
             self.quick_slots[str(slot_idx)] = file_path
@@ -1153,7 +1186,7 @@ class AppGUI:
         for i in range(1, 10):
             hotkey = f"ctrl+alt+{i}"
             try:
-                keyboard.add_hotkey(hotkey, lambda idx=i: self.root.after(0, self.play_quick_slot, idx))
+                self.input_dispatcher.add_hotkey(hotkey, lambda idx=i: self.root.after(0, self.play_quick_slot, idx))
             except Exception as e:
                 self.add_log_message(f"Failed to register hotkey {hotkey}: {e}")
 
@@ -1171,39 +1204,14 @@ class AppGUI:
         
         # Load and play
         try:
-            with open(file_path, 'r') as f:
-                loaded_data = json.load(f)
-            
-            new_events = [_deserialize_event(e) for e in loaded_data.get('events', [])]
-            new_events = [e for e in new_events if e is not None]
+            loaded_data = macro_file.load_macro(file_path)
             
-            if not new_events:
+            if not loaded_data['events']:
                 self.add_log_message("Macro file contains no valid events.")
                 return
             
-            # Update macro_data (replace mode)
-            self.macro_data = {
-                'mode': loaded_data.get('mode', 'absolute'),
-                'origin': loaded_data.get('origin', (0,0)),
-                'events': new_events
-            }
-            
-            # Load grouped actions if available
-            loaded_groups = loaded_data.get('grouped_actions')
-            if loaded_groups:
-                self.macro_data['grouped_actions'] = []
-                for action_dict in loaded_groups:
-                    action = GroupedAction(
-                        type=action_dict['type'],
-                        display_text=action_dict['display_text'],
-                        start_time=action_dict['start_time'],
-                        end_time=action_dict['end_time'],
-                        start_index=action_dict['start_index'],
-                        end_index=action_dict['end_index'],
-                        indices=action_dict['indices'],
-                        details=action_dict.get('details', {})
-                    )
-                    self.macro_data['grouped_actions'].append(action)
+            # Update macro_data (replace mode); grouped actions are reused if the file has them
+            self.macro_data = loaded_data
             
             self._populate_treeview()
             self.start_playing()
@@ -1212,7 +1220,7 @@ class AppGUI:
             self.add_log_message(f"Error playing quick slot: {e}")
 
     def insert_loop(self):
-        selected_items = self.tree.selection()
+        selected_items = self.action_list.selected_indices()
         if not selected_items:
             messagebox.showwarning("No Selection", "Please select actions to wrap in a loop.")
             return
@@ -1222,7 +1230,7 @@ class AppGUI:
         if count is None: return
         
         # Get indices
-        indices = sorted([self.tree.index(item) for item in selected_items])
+        indices = selected_items
         start_action_idx = indices[0]
         end_action_idx = indices[-1]
         
@@ -1239,9 +1247,10 @@ class AppGUI:
         # Insert into macro_data['events']
         # Insert End first to not mess up Start index
         self.macro_data['events'].insert(raw_end_idx + 1, end_event)
+        self._regroup_edit(raw_end_idx + 1, raw_end_idx + 1, raw_end_idx + 2)
         self.macro_data['events'].insert(raw_start_idx, start_event)
+        self._regroup_edit(raw_start_idx, raw_start_idx, raw_start_idx + 1)
         
-        self._invalidate_grouped_actions()
         self._populate_treeview()
         self.add_log_message(f"Inserted Loop (Count: {count}) around actions {start_action_idx+1}-{end_action_idx+1}")
 
@@ -1249,24 +1258,29 @@ class AppGUI:
         messagebox.showinfo("Color Picker", "Move mouse to target pixel and press 'C' to capture.")
         self.root.withdraw()
         self.picking_color = True
-        self._check_color_pick_key()
+        self._listen_pick_keys(('c',), self._on_color_pick_key)
+
+    def _listen_pick_keys(self, keys, on_key):
+        """Calls on_key(key) on the Tk thread each time one of the keys is pressed, until _stop_pick_keys()."""
+        self._stop_pick_keys()
+        self.pick_key_subscriptions = [self.input_dispatcher.add_hotkey(key, lambda key=key: self.root.after(0, on_key, key))
+                                       for key in keys]
 
-    def _check_color_pick_key(self):
+    def _stop_pick_keys(self):
+        for subscription in self.pick_key_subscriptions:
+            self.input_dispatcher.remove(subscription)
+        self.pick_key_subscriptions = []
+
+    def _on_color_pick_key(self, key):
         if not getattr(self, 'picking_color', False): return
-        
-        if keyboard.is_pressed('c'):
-            self.picking_color = False
-            # Wait for key release to avoid repeated triggers
-            while keyboard.is_pressed('c'):
-                time.sleep(0.05)
-                
-            x, y = mouse.get_position()
-            rgb = event_utils.get_pixel_color(x, y)
-            hex_color = event_utils.rgb_to_hex(rgb)
-            
-            self._finish_color_pick(x, y, hex_color)
-        else:
-            self.root.after(50, self._check_color_pick_key)
+        self.picking_color = False
+        self._stop_pick_keys()
+
+        x, y = mouse.get_position()
+        rgb = event_utils.get_pixel_color(x, y)
+        hex_color = event_utils.rgb_to_hex(rgb)
+
+        self._finish_color_pick(x, y, hex_color)
 
     def _finish_color_pick(self, x, y, hex_color):
         self.root.deiconify()
@@ -1276,9 +1290,9 @@ class AppGUI:
         if timeout is None: return
         
         # Insert Logic Event
-        selected_items = self.tree.selection()
+        selected_items = self.action_list.selected_indices()
         if selected_items:
-            idx = self.tree.index(selected_items[-1])
+            idx = selected_items[-1]
             action = self.visible_actions[idx]
             if action.indices:
                 insert_idx = action.indices[-1] + 1
@@ -1294,10 +1308,10 @@ class AppGUI:
         else:
             new_time = 0.0
 
-        event = (new_time, {'logic_type': 'wait_color', 'x': x, 'y': y, 'target_hex': hex_color, 'timeout': timeout})
+        event = (new_time, {'logic_type': 'wait_color', 'x': x, 'y': y, 'target_hex': hex_color, 'target_color': color_match.hex_to_packed(hex_color), 'timeout': timeout})
         self.macro_data['events'].insert(insert_idx, event)
+        self._regroup_edit(insert_idx, insert_idx, insert_idx + 1)
         
-        self._invalidate_grouped_actions()
         self._populate_treeview()
         self.add_log_message(f"Inserted Wait Color ({hex_color}) at ({x}, {y})")
 
@@ -1317,9 +1331,9 @@ class AppGUI:
         if timeout is None: return
         
         # Insert Logic Event
-        selected_items = self.tree.selection()
+        selected_items = self.action_list.selected_indices()
         if selected_items:
-            idx = self.tree.index(selected_items[-1])
+            idx = selected_items[-1]
             action = self.visible_actions[idx]
             if action.indices:
                 insert_idx = action.indices[-1] + 1
@@ -1337,20 +1351,198 @@ class AppGUI:
 
         event = (new_time, {'logic_type': 'wait_sound', 'threshold': threshold, 'timeout': timeout})
         self.macro_data['events'].insert(insert_idx, event)
+        self._regroup_edit(insert_idx, insert_idx, insert_idx + 1)
         
-        self._invalidate_grouped_actions()
         self._populate_treeview()
         self.add_log_message(f"Inserted Wait Sound (Threshold: {threshold})")
 
+    def insert_sound_trigger(self, trigger, clip_path=None):
+        """Inserts a wait_sound that matches a frequency band or a reference clip instead of any loud sound."""
+        import tkinter.simpledialog as simpledialog
+        details = {'trigger': trigger}
+        if trigger == 'band':
+            low = simpledialog.askfloat("Frequency Band", "Lowest frequency of the sound (Hz):", minvalue=0.0, initialvalue=1900.0)
+            if low is None: return
+            high = simpledialog.askfloat("Frequency Band", "Highest frequency of the sound (Hz):", minvalue=low + 1, initialvalue=max(low + 200.0, 2100.0))
+            if high is None: return
+            details['band'] = [low, high]
+            name = f"Wait Sound ({low:g}-{high:g} Hz)"
+        else:
+            if clip_path is None:
+                clip_path = filedialog.askopenfilename(title="Reference Clip", filetypes=[("WAV files", "*.wav")])
+                if not clip_path: return
+            try:
+                sound_trigger.load_clip(clip_path, audio_capture.DEFAULT_SAMPLERATE)
+            except Exception as e:
+                messagebox.showerror("Reference Clip", f"Can't use this clip: {e}")
+                return
+            details['clip_path'] = clip_path
+            details['score'] = simpledialog.askfloat("Match Score", "Minimum match score (0.0 - 1.0):", minvalue=0.05, maxvalue=1.0,
+                                                     initialvalue=sound_trigger.DEFAULT_CLIP_SCORE)
+            if details['score'] is None: return
+            name = f"Wait Sound (Clip {os.path.basename(clip_path)})"
+
+        threshold = simpledialog.askfloat("Minimum Level", "Quietest the sound may be (RMS level, 0.0 - 1.0):", minvalue=0.0, maxvalue=1.0, initialvalue=0.01)
+        if threshold is None: return
+        timeout = simpledialog.askinteger("Timeout", "Enter timeout in seconds:", minvalue=1, initialvalue=10)
+        if timeout is None: return
+        details.update({'threshold': threshold, 'timeout': timeout, 'post_delay': 0})
+        self._insert_single_logic_event('wait_sound', details, name)
+
+    def record_sound_clip(self):
+        """Records a few seconds from the sound input and keeps the loud part as a reference clip."""
+        if not messagebox.askokcancel("Record Clip", f"Recording starts when you press OK and lasts {CLIP_RECORD_SECONDS} seconds.\n"
+                                      "Play the sound once during that time."):
+            return
+        capture = audio_capture.get_default_capture()
+        try:
+            capture.acquire()
+        except Exception as e:
+            messagebox.showerror("Record Clip", f"Sound capture error: {e}")
+            return
+        start = capture.position
+        self.add_log_message("Recording reference clip...")
+
+        def finish():
+            samples = capture.read(start, capture.position - start)
+            capture.release()
+            try:
+                clip = sound_trigger.trim_clip(samples, capture.samplerate)
+                clip_path = sound_trigger.save_clip(clip, capture.samplerate)
+            except Exception as e:
+                messagebox.showerror("Record Clip", f"Failed to record the clip: {e}")
+                return
+            self.add_log_message(f"Recorded {len(clip) / capture.samplerate:.2f}s clip: {clip_path}")
+            self.insert_sound_trigger('clip', clip_path)
+        self.root.after(int(CLIP_RECORD_SECONDS * 1000), finish)
+
+    def _pick_screen_rect(self, title, what, on_done):
+        """Lets the user mark a screen rectangle with 'C' at two corners, then calls on_done(left, top, width, height)."""
+        messagebox.showinfo(title, f"Move the mouse to the top-left corner of the {what} and press 'C',\nthen to the bottom-right corner and press 'C' again.")
+        self.root.withdraw()
+        self.rect_pick = {'corners': [], 'on_done': on_done}
+        self._listen_pick_keys(('c',), self._on_rect_pick_key)
+
+    def _on_rect_pick_key(self, key):
+        if not getattr(self, 'rect_pick', None): return
+
+        corners = self.rect_pick['corners']
+        corners.append(mouse.get_position())
+        if len(corners) == 2:
+            pick, self.rect_pick = self.rect_pick, None
+            self._stop_pick_keys()
+            self.root.deiconify()
+            (x0, y0), (x1, y1) = corners
+            pick['on_done'](min(x0, x1), min(y0, y1), abs(x1 - x0) + 1, abs(y1 - y0) + 1)
+
+    def insert_image_search(self, logic_type):
+        self._pick_screen_rect("Image Capture", "image", lambda *rect: self._finish_image_pick(logic_type, *rect))
+
+    def _finish_image_pick(self, logic_type, left, top, width, height):
+        if width < 8 or height < 8:
+            messagebox.showerror("Image Capture", "The captured area is too small (at least 8x8 pixels).")
+            return
+        try:
+            rgb = screen_provider.get_default_screen().grab(left, top, width, height)
+            template_path = image_search.save_template(rgb)
+        except Exception as e:
+            messagebox.showerror("Image Capture", f"Failed to capture the image: {e}")
+            return
+
+        import tkinter.simpledialog as simpledialog
+        margin = simpledialog.askinteger("Search Area", f"Captured {width}x{height} at ({left}, {top}).\n"
+                                         "Search margin around it in pixels (0 = whole screen):", minvalue=0, initialvalue=200)
+        if margin is None: return
+        timeout = simpledialog.askinteger("Timeout", "Enter timeout in seconds:", minvalue=1, initialvalue=10)
+        if timeout is None: return
+
+        roi = None
+        if margin:
+            roi_left, roi_top = max(left - margin, 0), max(top - margin, 0)
+            roi = [roi_left, roi_top, left + width + margin - roi_left, top + height + margin - roi_top]
+        details = {'template_path': template_path, 'roi': roi, 'threshold': image_search.DEFAULT_THRESHOLD,
+                   'timeout': timeout, 'post_delay': 0}
+        if logic_type == 'click_image':
+            details['button'] = 'left'
+        self._insert_single_logic_event(logic_type, details, f"{'Click' if logic_type == 'click_image' else 'Wait'} Image ({width}x{height})")
+
+    def insert_color_signature(self, logic_type):
+        messagebox.showinfo("Color Signature", "Move the mouse to each point and press 'C' to add it.\n"
+                            "Press Enter when done (Esc cancels). All colors are read together at the end.")
+        self.root.withdraw()
+        self.signature_pick = {'logic_type': logic_type, 'points': []}
+        self._listen_pick_keys(('c', 'enter', 'esc'), self._on_signature_pick_key)
+
+    def _on_signature_pick_key(self, key):
+        pick = getattr(self, 'signature_pick', None)
+        if not pick: return
+
+        if key == 'c':
+            pick['points'].append(mouse.get_position())
+            self.add_log_message(f"Signature point {len(pick['points'])} at {pick['points'][-1]}")
+            return
+        if key == 'enter' and not pick['points']:
+            return
+        self.signature_pick = None
+        self._stop_pick_keys()
+        self.root.deiconify()
+        if key == 'enter':
+            self._finish_signature_pick(pick['logic_type'], pick['points'])
+
+    def _finish_signature_pick(self, logic_type, points):
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        try:
+            # One read for all points, so the signature is a single moment in time
+            rgb = screen_provider.get_default_screen().get_pixels(xs, ys)
+        except Exception as e:
+            messagebox.showerror("Color Signature", f"Failed to capture the colors: {e}")
+            return
+
+        import tkinter.simpledialog as simpledialog
+        tolerance = simpledialog.askinteger("Color Tolerance", f"Captured {len(points)} points.\nColor tolerance per channel (0 = exact):",
+                                            minvalue=0, maxvalue=255, initialvalue=0)
+        if tolerance is None: return
+        signature = color_match.signature_points(xs, ys, rgb, tolerance)
+        details = {'x': xs[0], 'y': ys[0], 'target_hex': signature[0]['target_hex'], 'target_color': signature[0]['target_color'],
+                   'points': signature, 'tolerance': tolerance}
+        if logic_type == 'wait_color':
+            timeout = simpledialog.askinteger("Timeout", "Enter timeout in seconds:", minvalue=1, initialvalue=10)
+            if timeout is None: return
+            details.update({'timeout': timeout, 'post_delay': 0})
+            name = "Wait Color Signature"
+        else:
+            details['else_jump_idx'] = -1
+            name = "IF Color Signature"
+        self._insert_single_logic_event(logic_type, details, f"{name} ({len(points)} points)")
+
+    def insert_region_wait(self, logic_type):
+        self._pick_screen_rect("Region Wait", "region", lambda *rect: self._finish_region_pick(logic_type, *rect))
+
+    def _finish_region_pick(self, logic_type, left, top, width, height):
+        import tkinter.simpledialog as simpledialog
+        details = {'region': [left, top, width, height]}
+        if logic_type == 'wait_region_stable':
+            stable_samples = simpledialog.askinteger("Stable Samples", f"Region {width}x{height} at ({left}, {top}).\n"
+                                                     f"Identical samples in a row ({region_watch.DEFAULT_INTERVAL * 1000:.0f} ms apart) that count as stable:",
+                                                     minvalue=1, initialvalue=region_watch.DEFAULT_STABLE_SAMPLES)
+            if stable_samples is None: return
+            details['stable_samples'] = stable_samples
+        timeout = simpledialog.askinteger("Timeout", "Enter timeout in seconds:", minvalue=1, initialvalue=10)
+        if timeout is None: return
+        details.update({'timeout': timeout, 'post_delay': 0})
+        kind = 'Change' if logic_type == 'wait_region_change' else 'Stable'
+        self._insert_single_logic_event(logic_type, details, f"Wait Region {kind} ({width}x{height} at {left},{top})")
+
     def insert_if_color_block(self):
         """Insert IF Color block around selected actions (IF + ELSE + END IF)"""
-        selected_items = self.tree.selection()
+        selected_items = self.action_list.selected_indices()
         if not selected_items:
             messagebox.showwarning("No Selection", "Please select actions for IF block (True branch).")
             return
         
         # Get the range of selected actions
-        indices = sorted([self.tree.index(item) for item in selected_items])
+        indices = selected_items
         start_action_idx = indices[0]
         end_action_idx = indices[-1]
         
@@ -1362,24 +1554,19 @@ class AppGUI:
         self.root.withdraw()
         self.if_color_selection = (start_action_idx, end_action_idx)
         self.picking_if_color = True
-        self._check_if_color_pick_key()
+        self._listen_pick_keys(('c',), self._on_if_color_pick_key)
 
-    def _check_if_color_pick_key(self):
+    def _on_if_color_pick_key(self, key):
         if not getattr(self, 'picking_if_color', False): 
             return
-        
-        if keyboard.is_pressed('c'):
-            self.picking_if_color = False
-            while keyboard.is_pressed('c'):
-                time.sleep(0.05)
-            
-            x, y = mouse.get_position()
-            rgb = event_utils.get_pixel_color(x, y)
-            hex_color = event_utils.rgb_to_hex(rgb)
-            
-            self._finish_if_color_pick(x, y, hex_color)
-        else:
-            self.root.after(50, self._check_if_color_pick_key)
+        self.picking_if_color = False
+        self._stop_pick_keys()
+
+        x, y = mouse.get_position()
+        rgb = event_utils.get_pixel_color(x, y)
+        hex_color = event_utils.rgb_to_hex(rgb)
+
+        self._finish_if_color_pick(x, y, hex_color)
 
     def _finish_if_color_pick(self, x, y, hex_color):
         self.root.deiconify()
@@ -1407,6 +1594,7 @@ class AppGUI:
             'logic_type': 'if_color_match',
             'x': x, 'y': y, 
             'target_hex': hex_color,
+            'target_color': color_match.hex_to_packed(hex_color),
             'else_jump_idx': -1  # Will be calculated after regrouping
         })
         
@@ -1424,10 +1612,11 @@ class AppGUI:
         # Insert events (in reverse order to maintain indices)
         self.macro_data['events'].insert(raw_end_idx + 1, if_end_event)
         self.macro_data['events'].insert(raw_end_idx + 1, if_else_event)
+        self._regroup_edit(raw_end_idx + 1, raw_end_idx + 1, raw_end_idx + 3)
         self.macro_data['events'].insert(raw_start_idx, if_match_event)
+        self._regroup_edit(raw_start_idx, raw_start_idx, raw_start_idx + 1)
         
-        # Now we need to regroup and calculate jump indices
-        self._invalidate_grouped_actions()
+        # Now we need to calculate jump indices
         self._populate_treeview()
         
         # Find the IF_MATCH, IF_ELSE, IF_END in grouped actions and set jump indices
@@ -1465,15 +1654,15 @@ class AppGUI:
         file_path = filedialog.askopenfilename(
             title="Select Macro to Call",
             defaultextension=".json",
-            filetypes=[("JSON Macro Files", "*.json"), ("All Files", "*.*")]
+            filetypes=MACRO_FILETYPES
         )
         if not file_path:
             return
         
         # Determine insert position
-        selected_items = self.tree.selection()
+        selected_items = self.action_list.selected_indices()
         if selected_items:
-            idx = self.tree.index(selected_items[-1])
+            idx = selected_items[-1]
             action = self.visible_actions[idx]
             if action.indices:
                 insert_idx = action.indices[-1] + 1
@@ -1496,8 +1685,8 @@ class AppGUI:
             'file_path': file_path
         })
         self.macro_data['events'].insert(insert_idx, event)
+        self._regroup_edit(insert_idx, insert_idx, insert_idx + 1)
         
-        self._invalidate_grouped_actions()
         self._populate_treeview()
         self.add_log_message(f"Inserted Call Macro: {os.path.basename(file_path)}")
 
@@ -1507,27 +1696,22 @@ class AppGUI:
         self.root.withdraw()
         self.if_only_mode = True
         self.picking_simple_if = True
-        self._check_simple_if_pick()
+        self._listen_pick_keys(('c',), self._on_simple_if_pick_key)
 
-    def _check_simple_if_pick(self):
+    def _on_simple_if_pick_key(self, key):
         if not getattr(self, 'picking_simple_if', False):
             return
-        
-        if keyboard.is_pressed('c'):
-            self.picking_simple_if = False
-            while keyboard.is_pressed('c'):
-                time.sleep(0.05)
-            
-            x, y = mouse.get_position()
-            rgb = event_utils.get_pixel_color(x, y)
-            hex_color = event_utils.rgb_to_hex(rgb)
-            
-            self.root.deiconify()
-            self._insert_single_logic_event('if_color_match', {
-                'x': x, 'y': y, 'target_hex': hex_color, 'else_jump_idx': -1
-            }, f"IF Color ({hex_color})")
-        else:
-            self.root.after(50, self._check_simple_if_pick)
+        self.picking_simple_if = False
+        self._stop_pick_keys()
+
+        x, y = mouse.get_position()
+        rgb = event_utils.get_pixel_color(x, y)
+        hex_color = event_utils.rgb_to_hex(rgb)
+
+        self.root.deiconify()
+        self._insert_single_logic_event('if_color_match', {
+            'x': x, 'y': y, **color_match.target_fields(rgb), 'else_jump_idx': -1
+        }, f"IF Color ({hex_color})")
 
     def insert_else_only(self):
         """Insert only ELSE"""
@@ -1539,9 +1723,9 @@ class AppGUI:
 
     def _insert_single_logic_event(self, logic_type, details, display_name):
         """Helper to insert a single logic event at selection point"""
-        selected_items = self.tree.selection()
+        selected_items = self.action_list.selected_indices()
         if selected_items:
-            idx = self.tree.index(selected_items[-1])
+            idx = selected_items[-1]
             action = self.visible_actions[idx]
             if action.indices:
                 insert_idx = action.indices[-1] + 1
@@ -1560,7 +1744,7 @@ class AppGUI:
         event_data.update(details)
         event = (new_time, event_data)
         self.macro_data['events'].insert(insert_idx, event)
+        self._regroup_edit(insert_idx, insert_idx, insert_idx + 1)
         
-        self._invalidate_grouped_actions()
         self._populate_treeview()
         self.add_log_message(f"Inserted {display_name}")
@@ -0,0 +1,270 @@
+"""
+Shared audio capture for the Macro Editor (wait_sound, stop-on-sound and
+the spectral / clip triggers in sound_trigger).
+
+One AudioCapture owns the input stream. The source delivers fixed-size
+mono float32 blocks from its own callback thread, and the capture:
+
+- copies each block into a preallocated ring buffer (no allocation per
+  block; consumers read with position/read()),
+- computes each block's sum of squares and keeps a running sum over the
+  last `window` seconds, so the RMS level costs O(1) per block,
+- records the level of every block (so a waiter that wakes late still
+  sees a short beep), and
+- fires level watches from the callback thread the moment a block crosses
+  their threshold.
+
+Sources are pluggable. SoundDeviceSource uses sounddevice (optional
+dependency, imported on start). SyntheticAudioSource generates blocks in
+real time from mixed-in test signals, so detection latency can be
+measured headless.
+"""
+import threading
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+DEFAULT_SAMPLERATE = 16000
+DEFAULT_BLOCKSIZE = 256        # 16 ms at 16 kHz
+DEFAULT_WINDOW = 0.032         # Seconds of audio in the RMS level
+DEFAULT_CAPACITY = 10.0        # Seconds kept in the ring buffer
+
+
+class AudioSource:
+    """Interface: calls on_block(block) with mono float32 blocks of `blocksize` samples."""
+    samplerate = DEFAULT_SAMPLERATE
+    blocksize = DEFAULT_BLOCKSIZE
+
+    def start(self, on_block: Callable[[np.ndarray], None]):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+
+class SoundDeviceSource(AudioSource):
+    """The default input device via sounddevice. Enable 'Stereo Mix' on Windows to capture system audio."""
+
+    def __init__(self, samplerate: int = DEFAULT_SAMPLERATE, blocksize: int = DEFAULT_BLOCKSIZE, device=None):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.device = device
+        self._stream = None
+
+    def start(self, on_block):
+        import sounddevice as sd
+
+        def callback(indata, frames, time_info, status):
+            on_block(indata[:, 0])
+
+        self._stream = sd.InputStream(samplerate=self.samplerate, blocksize=self.blocksize, channels=1,
+                                      dtype='float32', device=self.device, callback=callback)
+        self._stream.start()
+
+    def stop(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+
+class SyntheticAudioSource(AudioSource):
+    """
+    Emits blocks in real time from a thread: a noise floor plus whatever
+    was queued with play(). `played_at` records when each play() signal
+    started going out, for latency measurements.
+    """
+
+    def __init__(self, samplerate: int = DEFAULT_SAMPLERATE, blocksize: int = DEFAULT_BLOCKSIZE,
+                 noise_level: float = 0.001, seed: int = 0):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.noise_level = noise_level
+        self.played_at = []
+        self._rng = np.random.default_rng(seed)
+        self._pending = []          # Signals (with their read offset) still being mixed in
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def play(self, signal):
+        with self._lock:
+            self._pending.append([np.asarray(signal, dtype=np.float32), 0, None])
+
+    def start(self, on_block):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(on_block,), name="SyntheticAudio", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self, on_block):
+        period = self.blocksize / self.samplerate
+        block = np.empty(self.blocksize, dtype=np.float32)
+        next_time = time.perf_counter() + period
+        while not self._stop.is_set():
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_time += period
+            block[:] = self._rng.standard_normal(self.blocksize) * self.noise_level
+            with self._lock:
+                for entry in self._pending:
+                    signal, offset, _ = entry
+                    if entry[2] is None:
+                        entry[2] = time.perf_counter()
+                        self.played_at.append(entry[2])
+                    chunk = signal[offset:offset + self.blocksize]
+                    block[:len(chunk)] += chunk
+                    entry[1] += len(chunk)
+                self._pending = [entry for entry in self._pending if entry[1] < len(entry[0])]
+            on_block(block)
+
+
+class AudioCapture:
+    def __init__(self, source: Optional[AudioSource] = None, capacity_seconds: float = DEFAULT_CAPACITY,
+                 window: float = DEFAULT_WINDOW):
+        self.source = source if source else SoundDeviceSource()
+        self.samplerate = self.source.samplerate
+        self.blocksize = self.source.blocksize
+        blocks = max(int(capacity_seconds * self.samplerate) // self.blocksize, 1)
+        self.capacity = blocks * self.blocksize
+        self._ring = np.zeros(self.capacity, dtype=np.float32)
+        self._levels = np.zeros(blocks, dtype=np.float64)     # RMS level after each block
+        self._block_energy = np.zeros(blocks, dtype=np.float64)
+        self._window_blocks = max(int(round(window * self.samplerate / self.blocksize)), 1)
+        self._window_energy = 0.0
+        self.position = 0           # Samples written so far
+        self.blocks = 0             # Blocks written so far
+        self.level = 0.0            # Current RMS level
+        self._watches = []          # [threshold, callback]
+        self._cond = threading.Condition()
+        self._users = 0
+        self._start_lock = threading.Lock()
+
+    # --- Lifetime (shared between users) ---
+    def acquire(self):
+        """Starts the source for the first user. Raises if the source can't start."""
+        with self._start_lock:
+            if self._users == 0:
+                self.source.start(self._on_block)
+            self._users += 1
+
+    def release(self):
+        with self._start_lock:
+            self._users = max(self._users - 1, 0)
+            if self._users == 0:
+                self.source.stop()
+
+    # --- Producer (source callback thread) ---
+    def _on_block(self, block: np.ndarray):
+        n = len(block)
+        if n != self.blocksize:
+            # Sources deliver fixed blocks; anything else is padded or cut
+            fixed = np.zeros(self.blocksize, dtype=np.float32)
+            fixed[:min(n, self.blocksize)] = block[:self.blocksize]
+            block = fixed
+        slot = self.blocks % len(self._levels)
+        start = slot * self.blocksize
+        self._ring[start:start + self.blocksize] = block
+
+        energy = float(np.dot(block, block))
+        leaving = self.blocks - self._window_blocks
+        self._window_energy += energy
+        if leaving >= 0:
+            self._window_energy -= self._block_energy[leaving % len(self._block_energy)]
+        self._block_energy[slot] = energy
+        if self.blocks % 4096 == 0:
+            # Re-sum the window now and then so rounding errors can't accumulate
+            window = np.arange(max(self.blocks - self._window_blocks + 1, 0), self.blocks + 1) % len(self._block_energy)
+            self._window_energy = float(self._block_energy[window].sum())
+        level = (max(self._window_energy, 0.0) / (min(self.blocks + 1, self._window_blocks) * self.blocksize)) ** 0.5
+
+        with self._cond:
+            self._levels[slot] = level
+            self.level = level
+            self.blocks += 1
+            self.position += self.blocksize
+            fired = [watch for watch in self._watches if level >= watch[0]]
+            if fired:
+                self._watches = [watch for watch in self._watches if level < watch[0]]
+            self._cond.notify_all()
+        for threshold, callback in fired:
+            callback(level)
+
+    # --- Consumers ---
+    def watch(self, threshold: float, callback: Callable[[float], None]):
+        """Calls callback(level) once, from the audio thread, when a block's level reaches threshold."""
+        watch = [threshold, callback]
+        with self._cond:
+            self._watches.append(watch)
+        return watch
+
+    def unwatch(self, watch):
+        with self._cond:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+    def wait_for_level(self, threshold: float, since_block: int, timeout: float) -> tuple[Optional[float], int]:
+        """
+        Waits up to `timeout` for any block after `since_block` to reach the
+        threshold. Returns (level or None, the block count seen), so the next
+        call can continue where this one stopped.
+        """
+        deadline = time.perf_counter() + timeout
+        with self._cond:
+            while True:
+                blocks = self.blocks
+                first = max(since_block, blocks - len(self._levels))
+                if blocks > first:
+                    slots = np.arange(first, blocks) % len(self._levels)
+                    peak = float(self._levels[slots].max())
+                    if peak >= threshold:
+                        return peak, blocks
+                since_block = blocks
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return None, blocks
+                self._cond.wait(remaining)
+
+    def wait_for_data(self, position: int, timeout: float) -> int:
+        """Waits up to `timeout` for samples past `position`; returns the current position."""
+        deadline = time.perf_counter() + timeout
+        with self._cond:
+            while self.position <= position:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self.position
+
+    def read(self, start: int, count: int) -> np.ndarray:
+        """Copies samples [start, start + count) of the stream (clamped to what the ring still holds)."""
+        with self._cond:
+            end = min(start + count, self.position)
+            # The oldest block may be being overwritten right now
+            start = max(start, self.position - self.capacity + self.blocksize, 0)
+            if end <= start:
+                return np.zeros(0, dtype=np.float32)
+            indices = np.arange(start, end) % self.capacity
+            return self._ring[indices]
+
+
+_default_capture = None
+
+
+def get_default_capture() -> AudioCapture:
+    global _default_capture
+    if _default_capture is None:
+        _default_capture = AudioCapture()
+    return _default_capture
+
+
+def set_default_capture(capture: AudioCapture):
+    global _default_capture
+    _default_capture = capture
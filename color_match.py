@@ -0,0 +1,145 @@
+"""
+Color conditions for the Macro Editor.
+
+Colors are packed into one integer, 0xRRGGBB, and stored in action details
+as 'target_color' next to the human-readable 'target_hex'. A condition
+matches when the screen color is within 'tolerance' of the target:
+
+    'channel'   - every channel differs by at most the tolerance (default)
+    'euclidean' - the RGB distance is at most the tolerance
+
+Everything is integer math on the packed values, so a poll loop never
+builds strings. match_colors() is the NumPy version for checking many
+points at once.
+
+A color signature is a set of such points ('points' in the details, each
+with x, y, target_color and tolerance) that must all match in the same
+read. ColorSignature checks them with one match_colors() call.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+TOLERANCE_MODES = ('channel', 'euclidean')
+
+
+def pack_rgb(rgb) -> int:
+    return (int(rgb[0]) << 16) | (int(rgb[1]) << 8) | int(rgb[2])
+
+
+def unpack_rgb(color: int) -> tuple[int, int, int]:
+    return ((color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF)
+
+
+def hex_to_packed(hex_color: str) -> int:
+    return int(hex_color.lstrip('#'), 16) & 0xFFFFFF
+
+
+def packed_to_hex(color: int) -> str:
+    return f"#{color & 0xFFFFFF:06x}"
+
+
+def pack_rgb_array(rgb: np.ndarray) -> np.ndarray:
+    """(n, 3) uint8 RGB -> (n,) int64 packed colors."""
+    rgb = np.asarray(rgb, dtype=np.int64)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def target_fields(rgb) -> dict:
+    """The details entries describing a captured target color."""
+    color = pack_rgb(rgb)
+    return {'target_hex': packed_to_hex(color), 'target_color': color}
+
+
+class ColorCondition(NamedTuple):
+    color: int              # Packed 0xRRGGBB target
+    tolerance: int = 0
+    euclidean: bool = False
+
+    @property
+    def hex(self) -> str:
+        return packed_to_hex(self.color)
+
+    def matches(self, color: int) -> bool:
+        if color == self.color:
+            return True
+        tolerance = self.tolerance
+        if not tolerance:
+            return False
+        target = self.color
+        dr = ((color >> 16) & 0xFF) - ((target >> 16) & 0xFF)
+        dg = ((color >> 8) & 0xFF) - ((target >> 8) & 0xFF)
+        db = (color & 0xFF) - (target & 0xFF)
+        if self.euclidean:
+            return dr * dr + dg * dg + db * db <= tolerance * tolerance
+        return -tolerance <= dr <= tolerance and -tolerance <= dg <= tolerance and -tolerance <= db <= tolerance
+
+    def describe(self) -> str:
+        if not self.tolerance:
+            return self.hex
+        return f"{self.hex} ±{self.tolerance}{' (euclidean)' if self.euclidean else ''}"
+
+
+class ColorSignature:
+    """Several points that must all match at once."""
+
+    def __init__(self, points, euclidean: bool = False):
+        self.xs = np.array([p[0] for p in points], dtype=np.int64)
+        self.ys = np.array([p[1] for p in points], dtype=np.int64)
+        self.colors = np.array([p[2] for p in points], dtype=np.int64)
+        self.tolerances = np.array([p[3] for p in points], dtype=np.int64)
+        self.euclidean = euclidean
+
+    def __len__(self):
+        return len(self.xs)
+
+    def matches_all(self, colors) -> bool:
+        """colors: the packed colors read at (xs, ys), in order."""
+        return bool(match_colors(colors, self.colors, self.tolerances, self.euclidean).all())
+
+    def mismatches(self, colors) -> int:
+        return int(np.count_nonzero(~match_colors(colors, self.colors, self.tolerances, self.euclidean)))
+
+    def describe(self) -> str:
+        return f"signature of {len(self)} points"
+
+
+def signature_points(xs, ys, rgb, tolerance: int = 0) -> list[dict]:
+    """The 'points' details entry for colors captured together at (xs, ys)."""
+    return [{'x': int(x), 'y': int(y), **target_fields(color), 'tolerance': tolerance}
+            for x, y, color in zip(xs, ys, np.asarray(rgb).tolist())]
+
+
+def condition_from_details(details: dict):
+    """
+    Builds the condition of a wait_color / if_color_match action: a
+    ColorSignature if it has 'points', else a ColorCondition (older macros
+    only have 'target_hex').
+    """
+    euclidean = details.get('tolerance_mode') == 'euclidean'
+    if details.get('points'):
+        default_tolerance = details.get('tolerance', 0) or 0
+        return ColorSignature([(p['x'], p['y'],
+                                p['target_color'] if p.get('target_color') is not None else hex_to_packed(p['target_hex']),
+                                max(int(p.get('tolerance', default_tolerance) or 0), 0))
+                               for p in details['points']], euclidean)
+    color = details.get('target_color')
+    if color is None:
+        color = hex_to_packed(details.get('target_hex') or '#000000')
+    tolerance = max(int(details.get('tolerance', 0) or 0), 0)
+    return ColorCondition(int(color), tolerance, euclidean)
+
+
+def match_colors(colors, targets, tolerances, euclidean) -> np.ndarray:
+    """
+    Vectorized ColorCondition.matches: colors, targets, tolerances and
+    euclidean are equal-length arrays (or scalars). Returns a bool array.
+    """
+    colors = np.asarray(colors, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.int64)
+    tolerances = np.asarray(tolerances, dtype=np.int64)
+    shifts = np.array([16, 8, 0], dtype=np.int64)
+    delta = ((colors[..., None] >> shifts) & 0xFF) - ((targets[..., None] >> shifts) & 0xFF)
+    within_channel = np.abs(delta).max(axis=-1) <= tolerances
+    within_distance = (delta * delta).sum(axis=-1) <= tolerances * tolerances
+    return np.where(np.asarray(euclidean, dtype=bool), within_distance, within_channel)
@@ -1,9 +1,11 @@
 from typing import Callable, Optional
+import bisect
 import time
 from collections import deque
 import keyboard
 import mouse
 
+from event_store import EventStore, EventView
 # Import shared types and constants
 from types_def import (
     GroupedAction,
@@ -18,15 +20,32 @@ from types_def import (
 
 # --- Main Grouper Class ---
 class EventGrouper:
-    def __init__(self, raw_events, log_callback=None):
-        self.raw_events = [(i, evt_time, evt_data) for i, (evt_time, evt_data) in enumerate(raw_events)]
+    """
+    Groups raw events into GroupedActions.
+
+    Batch use: EventGrouper(events).group(). Streaming use: call feed(event)
+    for every event as it is recorded, then flush() at the end. feed() only
+    returns actions that can no longer change: the last click/double click is
+    held back until the double-click window has passed, because a following
+    'double' event or click would turn it into a double/triple click.
+    """
+    def __init__(self, raw_events=None, log_callback=None):
+        self.events = EventStore.coerce(raw_events)
         self.actions = []
         self.processed_indices = set()
-        self.log_callback = log_callback if log_callback else lambda msg: None
+        # Only debug messages are logged; without a callback they are not even formatted
+        self.log_callback = log_callback
         
         self.state = 'IDLE'
         self.buffer = deque()
 
+        # Streaming state
+        self._next_index = 0
+        self._last_time = 0.0
+        self._emitted = 0
+        self._pending_double = None  # (action, button) of a double click waiting for its closing 'up'
+        self._absorbed = []          # Events fed while waiting for that 'up'
+
     def _get_obj(self, event_tuple): return event_tuple[2]['obj']
     def _get_time(self, event_tuple): return event_tuple[1]
     def _get_pos(self, event_tuple):
@@ -44,7 +63,7 @@ class EventGrouper:
                 last_action.details.get('button') == action.details.get('button') and
                 (action.start_time - last_action.end_time) < DOUBLE_CLICK_TIME):
                 
-                self.log_callback(f"GROUPER: Merging click into Triple Click.")
+                if self.log_callback: self.log_callback(f"GROUPER: Merging click into Triple Click.")
                 last_action.type = 'mouse_triple_click'
                 last_action.display_text = f"Mouse Triple Click ({action.details.get('button')})"
                 last_action.end_time = action.end_time
@@ -55,7 +74,7 @@ class EventGrouper:
                 self.state = 'IDLE'
                 return
 
-        self.log_callback(f"GROUPER: Finalized action -> {action.display_text}")
+        if self.log_callback: self.log_callback(f"GROUPER: Finalized action -> {action.display_text}")
         self.actions.append(action)
         self.processed_indices.update(action.indices)
         self.buffer.clear()
@@ -90,13 +109,13 @@ class EventGrouper:
                 # Filter orphaned up/down events and standalone doubles
                 if is_key_up or is_key_down or is_mouse_up or is_mouse_down or is_standalone_double:
                     # Log what we're filtering out for debugging purposes
-                    self.log_callback(f"GROUPER: Filtered orphaned event -> {evt_obj}")
+                    if self.log_callback: self.log_callback(f"GROUPER: Filtered orphaned event -> {evt_obj}")
                     # Mark as processed so we don't visit it again, but don't create an action
                     self.processed_indices.add(event_tuple[0])
                     continue
 
                 # If we reach here, it's truly unprocessed - log it and create action
-                self.log_callback(f"GROUPER: Unprocessed event -> {evt_obj}")
+                if self.log_callback: self.log_callback(f"GROUPER: Unprocessed event -> {evt_obj}")
                 action = GroupedAction(type='raw', display_text=f"Unprocessed: {evt_obj}", start_time=self._get_time(event_tuple), end_time=self._get_time(event_tuple), start_index=event_tuple[0], end_index=event_tuple[0], indices=[event_tuple[0]])
                 self.actions.append(action)
                 self.processed_indices.add(event_tuple[0])
@@ -139,25 +158,10 @@ class EventGrouper:
                 last_action.details.get('button') == evt_obj.button and
                 (self._get_time(current_event) - last_action.end_time) < DOUBLE_CLICK_TIME):
                 
-                self.log_callback(f"GROUPER: Mutating previous click to Double Click.")
+                if self.log_callback: self.log_callback(f"GROUPER: Mutating previous click to Double Click.")
                 last_action.type = 'mouse_double_click'
                 last_action.display_text = f"Mouse Double Click ({evt_obj.button})"
-                
-                final_up_index = -1
-                for j in range(current_event[0] + 1, len(self.raw_events)):
-                    up_cand_tuple = self.raw_events[j]
-                    up_cand_obj = self._get_obj(up_cand_tuple)
-                    if isinstance(up_cand_obj, mouse.ButtonEvent) and up_cand_obj.event_type == 'up' and up_cand_obj.button == evt_obj.button:
-                        final_up_index = up_cand_tuple[0]
-                        break
-                
-                end_index = final_up_index if final_up_index != -1 else current_event[0]
-                last_action.end_time = self._get_time(self.raw_events[end_index])
-                last_action.end_index = end_index
-                
-                new_indices = list(range(last_action.start_index, end_index + 1))
-                self.processed_indices.update(new_indices)
-                last_action.indices = new_indices
+                self._extend_to_closing_up(last_action, current_event, evt_obj.button)
                 return # Event consumed
 
             # Case 2: Double Click -> Triple Click
@@ -165,25 +169,10 @@ class EventGrouper:
                 last_action.details.get('button') == evt_obj.button and
                 (self._get_time(current_event) - last_action.end_time) < DOUBLE_CLICK_TIME):
                 
-                self.log_callback(f"GROUPER: Mutating previous Double Click to Triple Click.")
+                if self.log_callback: self.log_callback(f"GROUPER: Mutating previous Double Click to Triple Click.")
                 last_action.type = 'mouse_triple_click'
                 last_action.display_text = f"Mouse Triple Click ({evt_obj.button})"
-                
-                final_up_index = -1
-                for j in range(current_event[0] + 1, len(self.raw_events)):
-                    up_cand_tuple = self.raw_events[j]
-                    up_cand_obj = self._get_obj(up_cand_tuple)
-                    if isinstance(up_cand_obj, mouse.ButtonEvent) and up_cand_obj.event_type == 'up' and up_cand_obj.button == evt_obj.button:
-                        final_up_index = up_cand_tuple[0]
-                        break
-                
-                end_index = final_up_index if final_up_index != -1 else current_event[0]
-                last_action.end_time = self._get_time(self.raw_events[end_index])
-                last_action.end_index = end_index
-                
-                new_indices = list(range(last_action.start_index, end_index + 1))
-                self.processed_indices.update(new_indices)
-                last_action.indices = new_indices
+                self._extend_to_closing_up(last_action, current_event, evt_obj.button)
                 return # Event consumed
 
         # If not a double click, start a new action
@@ -193,6 +182,30 @@ class EventGrouper:
         elif isinstance(evt_obj, (mouse.MoveEvent, mouse.WheelEvent)): self.state = 'SEQUENCE'
         else: self._flush_buffer()
 
+    def _extend_to_closing_up(self, action, double_event, button):
+        """
+        Extends a mutated click to the 'double' event and then waits for the matching
+        button 'up': every event fed until then is absorbed into the action.
+        """
+        action.end_time = self._get_time(double_event)
+        action.end_index = double_event[0]
+        action.indices = list(range(action.start_index, double_event[0] + 1))
+        self.processed_indices.update(action.indices)
+        self._pending_double = (action, button)
+        self._absorbed = []
+
+    def _absorb(self, current_event):
+        action, button = self._pending_double
+        self._absorbed.append(current_event)
+        evt_obj = current_event[2].get('obj')
+        if isinstance(evt_obj, mouse.ButtonEvent) and evt_obj.event_type == 'up' and evt_obj.button == button:
+            action.end_time = self._get_time(current_event)
+            action.end_index = current_event[0]
+            action.indices = list(range(action.start_index, current_event[0] + 1))
+            self.processed_indices.update(action.indices)
+            self._pending_double = None
+            self._absorbed = []
+
     def _handle_mouse_down(self, current_event):
         self.buffer.append(current_event)
         evt_obj = self._get_obj(current_event)
@@ -230,6 +243,9 @@ class EventGrouper:
                         'post_delay': 0
                     }
                 )
+                for key in ('target_color', 'tolerance', 'tolerance_mode'):
+                    if key in aw_data:
+                        wait_action.details[key] = aw_data[key]
                 self._finalize_action(wait_action)
 
             self._finalize_action(action)
@@ -252,7 +268,7 @@ class EventGrouper:
                         break
                 
                 if has_non_modifier:
-                    self.log_callback(f"GROUPER: Splitting sequence at {evt_obj.name} (multiple non-modifiers)")
+                    if self.log_callback: self.log_callback(f"GROUPER: Splitting sequence at {evt_obj.name} (multiple non-modifiers)")
                     self._flush_buffer()
                     self._handle_idle(current_event)
                     return
@@ -271,7 +287,7 @@ class EventGrouper:
                             break
                     
                     if has_non_modifier:
-                        self.log_callback(f"GROUPER: Splitting sequence at {evt_obj.name} (modifier after non-modifier)")
+                        if self.log_callback: self.log_callback(f"GROUPER: Splitting sequence at {evt_obj.name} (modifier after non-modifier)")
                         self._flush_buffer()
                         self._handle_idle(current_event)
                         return
@@ -288,70 +304,140 @@ class EventGrouper:
             self._flush_buffer()
             self._handle_idle(current_event)
 
-    def group(self):
-        if not self.raw_events: return []
-
-        for i, evt_time, evt_data in self.raw_events:
-            if i in self.processed_indices: continue
-            current_event = (i, evt_time, evt_data)
-            # Check for Logic Event
-            if 'logic_type' in evt_data:
-                self._flush_buffer()
-                
-                display_text = f"Logic: {evt_data['logic_type']}"
-                if evt_data['logic_type'] == 'loop_start':
-                    count = evt_data.get('count', 0)
-                    display_text = f"Loop Start (Count: {count if count > 0 else 'Infinite'})"
-                elif evt_data['logic_type'] == 'loop_end':
-                    display_text = "Loop End"
-                elif evt_data['logic_type'] == 'wait_color':
-                    display_text = f"Wait Color ({evt_data.get('target_hex')} at {evt_data.get('x')},{evt_data.get('y')})"
-                elif evt_data['logic_type'] == 'wait_sound':
-                    display_text = "Wait Sound"
-                elif evt_data['logic_type'] == 'if_color_match':
-                    hex_color = evt_data.get('target_hex', '?')
-                    display_text = f"IF Color ({hex_color})"
-                elif evt_data['logic_type'] == 'if_color_else':
-                    display_text = "ELSE"
-                elif evt_data['logic_type'] == 'if_color_end':
-                    display_text = "END IF"
-                elif evt_data['logic_type'] == 'call_macro':
-                    import os
-                    file_name = os.path.basename(evt_data.get('file_path', 'unknown'))
-                    display_text = f"Call: {file_name}"
-                    
-                action = GroupedAction(
-                    type=evt_data['logic_type'],
-                    display_text=display_text,
-                    start_time=evt_time,
-                    end_time=evt_time,
-                    start_index=i,
-                    end_index=i,
-                    indices=[i],
-                    details=evt_data
-                )
-                self.actions.append(action)
-                self.processed_indices.add(i)
-                continue
-
-            
-            if self.buffer and (evt_time - self._get_time(self.buffer[-1])) > HUMAN_PAUSE_THRESHOLD:
-                self._flush_buffer()
+    def _process(self, current_event):
+        i, evt_time, evt_data = current_event
+        # Check for Logic Event
+        if 'logic_type' in evt_data:
+            self._flush_buffer()
             
-            # If buffer was flushed, it's now empty. current_event needs to start a new action.
-            if not self.buffer:
-                self.state = 'IDLE'
+            display_text = f"Logic: {evt_data['logic_type']}"
+            if evt_data['logic_type'] == 'loop_start':
+                count = evt_data.get('count', 0)
+                display_text = f"Loop Start (Count: {count if count > 0 else 'Infinite'})"
+            elif evt_data['logic_type'] == 'loop_end':
+                display_text = "Loop End"
+            elif evt_data['logic_type'] == 'wait_color' and evt_data.get('points'):
+                display_text = f"Wait Color Signature ({len(evt_data['points'])} points)"
+            elif evt_data['logic_type'] == 'wait_color':
+                display_text = f"Wait Color ({evt_data.get('target_hex')} at {evt_data.get('x')},{evt_data.get('y')})"
+            elif evt_data['logic_type'] == 'wait_sound' and evt_data.get('trigger') == 'band':
+                low, high = evt_data.get('band') or (0, 0)
+                display_text = f"Wait Sound ({low:g}-{high:g} Hz)"
+            elif evt_data['logic_type'] == 'wait_sound' and evt_data.get('trigger') == 'clip':
+                import os
+                display_text = f"Wait Sound (Clip {os.path.basename(evt_data.get('clip_path') or 'unknown')})"
+            elif evt_data['logic_type'] == 'wait_sound':
+                display_text = "Wait Sound"
+            elif evt_data['logic_type'] in ('wait_region_change', 'wait_region_stable'):
+                left, top, width, height = evt_data.get('region') or (0, 0, 0, 0)
+                kind = 'Change' if evt_data['logic_type'] == 'wait_region_change' else 'Stable'
+                display_text = f"Wait Region {kind} ({width}x{height} at {left},{top})"
+            elif evt_data['logic_type'] in ('wait_image', 'click_image'):
+                import os
+                file_name = os.path.basename(evt_data.get('template_path') or 'unknown')
+                display_text = f"{'Click' if evt_data['logic_type'] == 'click_image' else 'Wait'} Image ({file_name})"
+            elif evt_data['logic_type'] == 'if_color_match' and evt_data.get('points'):
+                display_text = f"IF Color Signature ({len(evt_data['points'])} points)"
+            elif evt_data['logic_type'] == 'if_color_match':
+                hex_color = evt_data.get('target_hex', '?')
+                display_text = f"IF Color ({hex_color})"
+            elif evt_data['logic_type'] == 'if_color_else':
+                display_text = "ELSE"
+            elif evt_data['logic_type'] == 'if_color_end':
+                display_text = "END IF"
+            elif evt_data['logic_type'] == 'call_macro':
+                import os
+                file_name = os.path.basename(evt_data.get('file_path', 'unknown'))
+                display_text = f"Call: {file_name}"
+                
+            action = GroupedAction(
+                type=evt_data['logic_type'],
+                display_text=display_text,
+                start_time=evt_time,
+                end_time=evt_time,
+                start_index=i,
+                end_index=i,
+                indices=[i],
+                # The logic payload itself, so edits to the action reach the saved event
+                details=evt_data.extras() if isinstance(evt_data, EventView) else evt_data
+            )
+            self.actions.append(action)
+            self.processed_indices.add(i)
+            return
 
-            if self.state == 'IDLE':
-                self._handle_idle(current_event)
-            elif self.state == 'MOUSE_DOWN':
-                self._handle_mouse_down(current_event)
-            elif self.state == 'KEY_DOWN':
-                self._handle_key_down(current_event)
-            elif self.state == 'SEQUENCE':
-                self._handle_sequence(current_event)
         
+        if self.buffer and (evt_time - self._get_time(self.buffer[-1])) > HUMAN_PAUSE_THRESHOLD:
+            self._flush_buffer()
+        
+        # If buffer was flushed, it's now empty. current_event needs to start a new action.
+        if not self.buffer:
+            self.state = 'IDLE'
+
+        if self.state == 'IDLE':
+            self._handle_idle(current_event)
+        elif self.state == 'MOUSE_DOWN':
+            self._handle_mouse_down(current_event)
+        elif self.state == 'KEY_DOWN':
+            self._handle_key_down(current_event)
+        elif self.state == 'SEQUENCE':
+            self._handle_sequence(current_event)
+
+    def _dispatch(self, current_event):
+        if self._pending_double:
+            self._absorb(current_event)
+        else:
+            self._process(current_event)
+
+    def _is_mutable(self, action) -> bool:
+        """Whether a later event could still turn `action` into a double/triple click."""
+        if self._pending_double and self._pending_double[0] is action:
+            return True
+        if action.type not in ('mouse_click', 'mouse_double_click'):
+            return False
+        # A click being built in the buffer started at its 'down'; any other new event is no earlier than the last one
+        earliest = self._last_time
+        if self.state == 'MOUSE_DOWN' and self.buffer:
+            earliest = self._get_time(self.buffer[0])
+        return earliest - action.end_time < DOUBLE_CLICK_TIME
+
+    def feed(self, event) -> list[GroupedAction]:
+        """
+        Feeds the next raw event, a (time, data) tuple.
+        Returns the actions finalized by it, in order; they will not change any more.
+        """
+        evt_time, evt_data = event
+        current_event = (self._next_index, evt_time, evt_data)
+        self._next_index += 1
+        self._last_time = evt_time
+        self._dispatch(current_event)
+
+        end = len(self.actions)
+        if end > self._emitted and self._is_mutable(self.actions[-1]):
+            end -= 1
+        finalized = self.actions[self._emitted:end]
+        self._emitted = max(self._emitted, end)
+        return finalized
+
+    def flush(self) -> list[GroupedAction]:
+        """Finalizes everything still buffered. Returns the actions not yet returned by feed()."""
+        while self._pending_double:
+            # The closing 'up' never came: the action ends at its 'double' event, the rest is grouped normally
+            absorbed = self._absorbed
+            self._pending_double = None
+            self._absorbed = []
+            for current_event in absorbed:
+                self._dispatch(current_event)
         self._flush_buffer()
+        finalized = self.actions[self._emitted:]
+        self._emitted = len(self.actions)
+        return finalized
+
+    def group(self):
+        if not self.events: return []
+
+        for event in self.events:
+            self.feed(event)
+        self.flush()
         self.actions.sort(key=lambda a: a.start_index)
         return self.actions
 
@@ -359,3 +445,72 @@ def group_events(raw_events: list, log_callback=None) -> list[GroupedAction]:
     if not raw_events: return []
     grouper = EventGrouper(raw_events, log_callback=log_callback)
     return grouper.group()
+
+def _is_cut(events: EventStore, new_pos: int, old_actions: list[GroupedAction], old_pos: int) -> bool:
+    """
+    True if grouping can restart at event `new_pos` without affecting earlier actions:
+    the preceding pause is longer than HUMAN_PAUSE_THRESHOLD (which also exceeds the
+    double-click window) and no existing action spans the cut (old index `old_pos`).
+    """
+    if new_pos <= 0:
+        return True
+    if new_pos < len(events) and events.time[new_pos] - events.time[new_pos - 1] <= HUMAN_PAUSE_THRESHOLD:
+        return False
+    k = bisect.bisect_left(old_actions, old_pos, key=lambda a: a.end_index)
+    return k == len(old_actions) or old_actions[k].start_index >= old_pos
+
+
+def regroup_window(raw_events, actions: list[GroupedAction], start: int, old_stop: int, new_stop: int,
+                   log_callback=None) -> list[GroupedAction]:
+    """
+    Regroups after an edit that replaced the events old[start:old_stop] with
+    raw_events[start:new_stop], given `actions`, the grouping of the old events.
+
+    Only a dirty window around the edit is regrouped. It is widened to the nearest
+    cuts (see _is_cut) on both sides, so the actions before it are kept as they
+    are and the actions after it only have their indices shifted. The cost is
+    proportional to the edited region, not to the macro.
+    """
+    events = EventStore.coerce(raw_events)
+    delta = new_stop - old_stop
+
+    c = start
+    while not _is_cut(events, c, actions, c):
+        c -= 1
+
+    # The actions after the window are reused, so the pause before the end cut must exist in the
+    # old event list too: keep at least one unedited event before it
+    d_old = old_stop
+    while d_old + delta < len(events) and (d_old == old_stop or not _is_cut(events, d_old + delta, actions, d_old)):
+        d_old += 1
+
+    grouper = EventGrouper(log_callback=log_callback)
+    grouper._next_index = c
+    pos = c
+    while True:
+        for i in range(pos, d_old + delta):
+            grouper.feed(events[i])
+        pos = d_old + delta
+        # A double click still waiting for its closing 'up' may absorb events past the cut
+        if not grouper._pending_double or pos >= len(events):
+            break
+        d_old += 1
+        while not _is_cut(events, d_old + delta, actions, d_old):
+            d_old += 1
+    grouper.flush()
+    window_actions = sorted(grouper.actions, key=lambda a: a.start_index)
+
+    before = actions[:bisect.bisect_left(actions, c, key=lambda a: a.end_index)]
+    after = actions[bisect.bisect_left(actions, d_old, key=lambda a: a.start_index):]
+    if delta:
+        for action in after:
+            action.start_index += delta
+            action.end_index += delta
+            action.indices = [i + delta for i in action.indices]
+    # The label of a raw action shows its event, time included, which an edit before it may have moved
+    for action in after:
+        if action.type == 'raw':
+            evt_time, evt_data = events[action.start_index]
+            action.display_text = f"Unprocessed: {evt_data['obj']}"
+            action.start_time = action.end_time = evt_time
+    return before + window_actions + after
@@ -1,23 +1,101 @@
+import os
 import time
 import threading
-import keyboard
-import mouse
 from collections import deque
-from key_mapper_gui import SUGGESTED_TARGET_KEYS
-import event_utils
-import sounddevice as sd
-import numpy as np
+import audio_capture
+import image_search
+import playback_plan
+import region_watch
+import sound_trigger
+import macro_file
+from event_store import EventStore
+from playback_scheduler import NS_PER_S, PlaybackControl, PlaybackScheduler
+from input_backend import get_default_backend
+from input_dispatcher import get_dispatcher
+from color_match import ColorSignature, packed_to_hex
+from screen_provider import get_default_screen
+from screen_sampler import DEFAULT_RATE_HZ, PlaybackScreenSampler
+
+# Returned by a handler to end the current repeat iteration
+_STOP_PC = float('inf')
+IMAGE_POLL_INTERVAL = 0.05  # Seconds between image searches while waiting
+STOP_ON_SOUND_THRESHOLD = 0.02  # RMS level that stops playback when 'Stop on Sound' is on
+SOUND_WAIT_SLICE = 0.05  # Longest wait_sound blocks on the capture before re-checking pause/timeout
+
+
+class _PlaybackContext:
+    """Mutable per-playback state shared by the instruction handlers."""
+    __slots__ = ('scheduler', 'prudent_mode', 'provider', 'screen', 'poll_interval', 'audio', 'repeat_index', 'pos_origin', 'loop_stack', 'learned_colors')
+
+    def __init__(self, scheduler, prudent_mode, provider, screen, poll_interval, audio=None):
+        self.scheduler = scheduler
+        self.prudent_mode = prudent_mode
+        self.provider = provider # The ScreenProvider (region grabs for image search)
+        self.screen = screen # Pixel reads: the playback sampler, or the ScreenProvider itself
+        self.poll_interval = poll_interval # How often wait_color re-checks its pixel
+        self.audio = audio # The started AudioCapture, if the macro listens for sound
+        self.repeat_index = 0
+        self.pos_origin = (0, 0)
+        self.loop_stack = []
+        self.learned_colors = {} # Key: action_idx, Value: packed color
 
 class Player:
-    def __init__(self, on_finish_callback, log_callback=None, on_action_highlight_callback=None, mapper_manager=None):
+    def __init__(self, on_finish_callback, log_callback=None, on_action_highlight_callback=None, mapper_manager=None, backend=None, debug_log_callback=None, screen=None, audio=None):
         self.on_finish_callback = on_finish_callback
         self.log_callback = log_callback if log_callback else lambda msg: None
+        self.debug_log_callback = debug_log_callback  # None while debug logging is off
         self.on_action_highlight_callback = on_action_highlight_callback if on_action_highlight_callback else lambda idx: None
         # mapper_manager is no longer needed by the player
-        self.playing = False
+        self.backend = backend if backend else get_default_backend()
+        self.screen = screen # None: the default screen, resolved at playback
+        self.audio = audio # AudioCapture; None: the shared default capture, started only when needed
+        # Every wait in the player blocks on this, so stop/pause/resume take effect immediately
+        self.control = PlaybackControl()
+        self._playing = False
         self.thread = None
         self.esc_press_times = deque(maxlen=3)  # Track last 3 ESC presses
         self.esc_listener_hook = None
+        self.last_timing_report = None
+        self.last_stop_latency_ms = None
+
+        # Dispatch table indexed by opcode (see playback_plan)
+        handlers = [None] * playback_plan.OPCODE_COUNT
+        handlers[playback_plan.OP_BEGIN] = self._op_begin
+        handlers[playback_plan.OP_LOOP_START] = self._op_loop_start
+        handlers[playback_plan.OP_LOOP_END] = self._op_loop_end
+        handlers[playback_plan.OP_WAIT_COLOR] = self._op_wait_color
+        handlers[playback_plan.OP_WAIT_SOUND] = self._op_wait_sound
+        handlers[playback_plan.OP_WAIT_IMAGE] = self._op_wait_image
+        handlers[playback_plan.OP_WAIT_REGION] = self._op_wait_region
+        handlers[playback_plan.OP_IF_COLOR] = self._op_if_color
+        handlers[playback_plan.OP_ELSE] = self._op_else
+        handlers[playback_plan.OP_CALL_MACRO] = self._op_call_macro
+        handlers[playback_plan.OP_CLICK] = self._op_click
+        handlers[playback_plan.OP_DRAG] = self._op_drag
+        handlers[playback_plan.OP_KEY_PRESS] = self._op_key_press
+        handlers[playback_plan.OP_KEY_RELEASE] = self._op_key_release
+        handlers[playback_plan.OP_KEY_TAP] = self._op_key_tap
+        handlers[playback_plan.OP_MOVE] = self._op_move
+        handlers[playback_plan.OP_MOVE_REL] = self._op_move_rel
+        handlers[playback_plan.OP_BUTTON_DOWN] = self._op_button_down
+        handlers[playback_plan.OP_BUTTON_UP] = self._op_button_up
+        handlers[playback_plan.OP_WHEEL] = self._op_wheel
+        self._handlers = tuple(handlers)
+
+    @property
+    def playing(self):
+        return self._playing
+
+    @playing.setter
+    def playing(self, value):
+        # Setting playing = False anywhere (stop button, ESC, sound monitor, timeouts) wakes all waits
+        self._playing = value
+        if not value:
+            self.control.request_stop()
+
+    @property
+    def paused(self):
+        return self.control.paused
 
     def _esc_emergency_stop(self, event):
         """Callback for ESC key detection during playback"""
@@ -31,29 +109,41 @@ class Player:
                     self.log_callback("EMERGENCY STOP: ESC pressed 3 times rapidly!")
                     self.playing = False
 
-    def play_events(self, macro_data, repeat_count=1, speed_multiplier=1.0, stop_on_sound=False, prudent_mode=False):
+    def play_events(self, macro_data, repeat_count=1, speed_multiplier=1.0, stop_on_sound=False, prudent_mode=False, move_rate_hz=0, pixel_rate_hz=DEFAULT_RATE_HZ):
         if self.playing:
             return
         
-        self.thread = threading.Thread(target=self._play_events_task, args=(macro_data, repeat_count, speed_multiplier, stop_on_sound, prudent_mode))
+        self.thread = threading.Thread(target=self._play_events_task, args=(macro_data, repeat_count, speed_multiplier, stop_on_sound, prudent_mode, move_rate_hz, pixel_rate_hz))
         self.thread.start()
 
     def stop_playing(self):
         self.playing = False
         if self.esc_listener_hook:
-            keyboard.unhook(self.esc_listener_hook)
+            get_dispatcher(self.backend).remove(self.esc_listener_hook)
             self.esc_listener_hook = None
         self.log_callback("Stopping playback...")
 
-    def _play_events_task(self, macro_data, repeat_count, speed_multiplier, stop_on_sound, prudent_mode):
+    def pause_playing(self):
+        if self.playing and not self.control.paused:
+            self.control.pause()
+            self.log_callback("Playback paused.")
+
+    def resume_playing(self):
+        if self.control.paused:
+            self.control.resume()
+            self.log_callback("Playback resumed.")
+
+    def _play_events_task(self, macro_data, repeat_count, speed_multiplier, stop_on_sound, prudent_mode, move_rate_hz=0, pixel_rate_hz=DEFAULT_RATE_HZ):
+        self.control.reset()
+        self.last_stop_latency_ms = None
         self.playing = True
         self.esc_press_times.clear()
-        events = macro_data.get('events', [])
+        events = EventStore.coerce(macro_data.get('events'))
         mode = macro_data.get('mode', 'absolute')
         origin = macro_data.get('origin', (0, 0))
 
         # Set up ESC emergency stop listener
-        self.esc_listener_hook = keyboard.on_press(self._esc_emergency_stop)
+        self.esc_listener_hook = get_dispatcher(self.backend).add_key_listener('esc', self._esc_emergency_stop)
 
         # Group events for playback highlighting
         grouped_actions = macro_data.get('grouped_actions')
@@ -61,29 +151,53 @@ class Player:
             import event_grouper # Import here to avoid circular dependency
             grouped_actions = event_grouper.group_events(events)
         
-        # Stop on Sound Monitor
-        if stop_on_sound:
-            def sound_monitor():
+        sampler = None
+        capture = None
+        sound_watch = None
+        sound_monitor = None
+        try:
+            plan = playback_plan.compile_plan(events, grouped_actions, mode, origin, move_rate_hz=move_rate_hz, speed_multiplier=speed_multiplier)
+
+            # One capture stream serves both wait_sound and the Stop on Sound monitor
+            if stop_on_sound or any(ins.op == playback_plan.OP_WAIT_SOUND for ins in plan):
+                capture = self.audio if self.audio else audio_capture.get_default_capture()
                 try:
-                    # Using default input. Ensure 'Stereo Mix' is enabled in Windows Sound Settings for system audio.
-                    with sd.InputStream(channels=1, blocksize=1024) as stream:
-                        self.log_callback("Sound monitor active (Threshold: 0.02).")
-                        while self.playing:
-                            data, overflow = stream.read(1024)
-                            if len(data) == 0: continue
-                            volume = np.abs(data).mean()
-                            
-                            if volume > 0.02: # Sensitive threshold
-                                self.log_callback(f"Sound detected (Vol: {volume:.4f})! Stopping.")
-                                self.playing = False
-                                break
+                    capture.acquire()
                 except Exception as e:
-                    self.log_callback(f"Sound monitor error: {e}")
-            threading.Thread(target=sound_monitor, daemon=True).start()
+                    self.log_callback(f"Sound capture error: {e}")
+                    capture = None
+            if stop_on_sound and capture:
+                # stop_on_sound is True (any sound) or wait_sound style details naming a trigger
+                spec = (sound_trigger.spec_from_details(stop_on_sound) if isinstance(stop_on_sound, dict)
+                        else sound_trigger.TriggerSpec('level', STOP_ON_SOUND_THRESHOLD))
+                trigger = sound_trigger.create_trigger(spec, capture.samplerate)
+                if trigger:
+                    def on_match(score):
+                        self.log_callback(f"Sound matched ({spec.describe()}, score {score:.2f})! Stopping.")
+                        self.playing = False
+                    sound_monitor = sound_trigger.TriggerMonitor(capture, trigger, on_match)
+                    sound_monitor.start()
+                else:
+                    def on_sound(level):
+                        self.log_callback(f"Sound detected (Vol: {level:.4f})! Stopping.")
+                        self.playing = False
+                    sound_watch = capture.watch(spec.threshold, on_sound)
+                self.log_callback(f"Sound monitor active ({spec.describe()}).")
 
-        learned_colors = {} # Key: action_idx, Value: hex_color
+            scheduler = PlaybackScheduler(speed_multiplier, control=self.control)
+            screen = self.screen if self.screen else get_default_screen()
+            points = playback_plan.color_probe_points(plan, include_clicks=prudent_mode)
+            if points and pixel_rate_hz > 0:
+                # Every pixel the macro can test is refreshed in one batched read per period
+                sampler = PlaybackScreenSampler(screen, points, pixel_rate_hz, log_callback=self.log_callback)
+                sampler.start()
+                # Reading the sampler is only a lookup, so wait_color can check well within each period
+                ctx = _PlaybackContext(scheduler, prudent_mode, screen, sampler, sampler.period / 4, capture)
+            else:
+                ctx = _PlaybackContext(scheduler, prudent_mode, screen, screen, 0.1, capture)
+            handlers = self._handlers
+            plan_len = len(plan)
 
-        try:
             for i in range(repeat_count):
                 if not self.playing:
                     break
@@ -92,357 +206,386 @@ class Player:
                 if repeat_count > 1:
                     self.log_callback(f"Playing: {i + 1}/{repeat_count}")
 
-                current_pos_origin = mouse.get_position()
-                start_time = time.time()
-                
-                # Use while loop for control flow
-                idx = 0
-                loop_stack = []
-                self.time_offset = 0 # Initialize time offset for Wait actions
-                while idx < len(grouped_actions):
+                ctx.repeat_index = i
+                ctx.pos_origin = self.backend.get_position()
+                ctx.loop_stack = []
+                scheduler.start()
+
+                pc = 0
+                while pc < plan_len:
                     if not self.playing: break
-                    
-                    action = grouped_actions[idx]
-                    action_idx = idx # Use index as ID for learning colors
-                    
-                    # Highlight the current action in the UI
-                    self.on_action_highlight_callback(action_idx)
+                    ins = plan[pc]
 
                     # --- Universal Timing Logic ---
-                    # Ensure EVERY action waits for its scheduled start time relative to the macro timeline.
-                    # We skip this for 'loop_end' to allow immediate looping.
-                    if action.type != 'loop_end':
-                        # Current macro time = Real elapsed time - Pauses (time_offset)
-                        current_macro_time = time.time() - start_time - self.time_offset
-                        wait_time = action.start_time - current_macro_time
-                        sleep_duration = wait_time / speed_multiplier
-                        
-                        if sleep_duration > 0:
-                            time.sleep(sleep_duration)
-
-                    # --- Logic Actions ---
-                    if action.type == 'loop_start':
-                        count = action.details.get('count', 0)
-                        if not loop_stack or loop_stack[-1]['start_idx'] != idx:
-                            loop_stack.append({'start_idx': idx, 'count': count, 'current': 0})
-                            self.log_callback(f"Loop Start: {count if count > 0 else 'Infinite'}")
-                        idx += 1
-                        continue
-                    elif action.type == 'loop_end':
-                        if loop_stack:
-                            ctx = loop_stack[-1]
-                            ctx['current'] += 1
-                            if ctx['count'] == 0 or ctx['current'] < ctx['count']:
-                                idx = ctx['start_idx'] + 1
-                                self.log_callback(f"Looping back... ({ctx['current']}/{ctx['count'] if ctx['count']>0 else 'Inf'})")
-                                continue
-                            else:
-                                self.log_callback("Loop finished.")
-                                loop_stack.pop()
-                        idx += 1
-                        continue
-                    elif action.type == 'wait_color':
-                        target_hex = action.details.get('target_hex')
-                        x = action.details.get('x')
-                        y = action.details.get('y')
-                        timeout = action.details.get('timeout', 10)
-                        
-                        start_wait = time.time()
-                        self.log_callback(f"Waiting for color {target_hex} at ({x}, {y})...")
-                        
-                        # Move mouse to target pixel
-                        try:
-                            mouse.move(x, y)
-                        except Exception as e:
-                            self.log_callback(f"Failed to move mouse: {e}")
-
-                        while True:
-                            if not self.playing: break
-                            rgb = event_utils.get_pixel_color(x, y)
-                            current_hex = event_utils.rgb_to_hex(rgb)
-                            if current_hex.lower() == target_hex.lower():
-                                self.log_callback("Color matched!")
-                                break
-                            if time.time() - start_wait > timeout:
-                                self.log_callback("Wait Color Timeout! Stopping macro.")
-                                self.playing = False
-                                break
-                            time.sleep(0.1)
-                        
-                        # Update time offset
-                        elapsed = time.time() - start_wait
-                        self.time_offset += elapsed
-                        
-                        # Post-Match Delay
-                        post_delay = action.details.get('post_delay', 0)
-                        if post_delay > 0:
-                            self.log_callback(f"Post-match delay: {post_delay}s")
-                            time.sleep(post_delay)
-                            self.time_offset += post_delay
-
-                        idx += 1
-                        continue
-                    elif action.type == 'wait_sound':
-                        threshold = action.details.get('threshold', 0.1)
-                        timeout = action.details.get('timeout', 10)
-                        self.log_callback(f"Waiting for sound (Threshold: {threshold})...")
-                        start_wait = time.time()
-                        elapsed = time.time() - start_wait
-                        self.time_offset += elapsed
-
-                        # Post-Match Delay
-                        post_delay = action.details.get('post_delay', 0)
-                        if post_delay > 0:
-                            self.log_callback(f"Post-match delay: {post_delay}s")
-                            time.sleep(post_delay)
-                            self.time_offset += post_delay
-
-                        idx += 1
-                        continue
-
-                    elif action.type == 'if_color_match':
-                        # IF COLOR: Check if pixel matches target color
-                        target_hex = action.details.get('target_hex')
-                        x = action.details.get('x')
-                        y = action.details.get('y')
-                        else_jump_idx = action.details.get('else_jump_idx', idx + 1)
-                        
-                        rgb = event_utils.get_pixel_color(x, y)
-                        current_hex = event_utils.rgb_to_hex(rgb)
-                        
-                        if current_hex.lower() == target_hex.lower():
-                            self.log_callback(f"IF COLOR: Matched {target_hex}! Continuing...")
-                            idx += 1
-                        else:
-                            self.log_callback(f"IF COLOR: Not matched ({current_hex} != {target_hex}). Jumping to ELSE.")
-                            idx = else_jump_idx
-                        continue
-
-                    elif action.type == 'if_color_else':
-                        # ELSE branch: skip to IF_END
-                        end_jump_idx = action.details.get('end_jump_idx', idx + 1)
-                        self.log_callback(f"IF COLOR ELSE: Jumping to END at {end_jump_idx}")
-                        idx = end_jump_idx
-                        continue
-
-                    elif action.type == 'if_color_end':
-                        # IF END: just continue
-                        idx += 1
-                        continue
-
-                    elif action.type == 'call_macro':
-                        # Call another macro file as a subroutine
-                        file_path = action.details.get('file_path')
-                        if file_path:
-                            self.log_callback(f"Calling macro: {file_path}")
-                            try:
-                                import json
-                                with open(file_path, 'r') as f:
-                                    sub_data = json.load(f)
-                                
-                                # Deserialize events
-                                sub_events = sub_data.get('events', [])
-                                sub_groups = sub_data.get('grouped_actions', [])
-                                
-                                if sub_groups:
-                                    # Reconstruct GroupedAction objects
-                                    from types_def import GroupedAction
-                                    sub_actions = []
-                                    for g in sub_groups:
-                                        sub_actions.append(GroupedAction(
-                                            type=g['type'],
-                                            display_text=g['display_text'],
-                                            start_time=g['start_time'],
-                                            end_time=g['end_time'],
-                                            start_index=g['start_index'],
-                                            end_index=g['end_index'],
-                                            indices=g.get('indices', []),
-                                            details=g.get('details', {})
-                                        ))
-                                    
-                                    self.log_callback(f"Executing {len(sub_actions)} sub-actions...")
-                                    
-                                    # Execute each sub-action inline
-                                    for sub_action in sub_actions:
-                                        if self.stop_requested or self.stop_due_to_sound:
-                                            break
-                                        
-                                        # Handle high-level mouse actions
-                                        if sub_action.type in ['mouse_click', 'mouse_double_click']:
-                                            details = sub_action.details
-                                            x = details.get('x', 0)
-                                            y = details.get('y', 0)
-                                            btn = details.get('button', 'left')
-                                            
-                                            mouse.move(x, y)
-                                            time.sleep(0.01)
-                                            
-                                            if sub_action.type == 'mouse_double_click':
-                                                mouse.double_click(btn)
-                                            else:
-                                                mouse.click(btn)
-                                            
-                                            self.log_callback(f"Sub: {sub_action.display_text}")
-                                        
-                                        elif sub_action.type == 'shortcut':
-                                            keys = sub_action.details.get('keys', [])
-                                            if keys:
-                                                keyboard.press_and_release('+'.join(keys))
-                                                self.log_callback(f"Sub: {sub_action.display_text}")
-                                        
-                                        elif sub_action.type == 'typing':
-                                            text = sub_action.details.get('text', '')
-                                            if text:
-                                                keyboard.write(text)
-                                                self.log_callback(f"Sub: {sub_action.display_text}")
-                                        
-                                        # Small delay between sub-actions
-                                        time.sleep(0.05)
-                                    
-                                    self.log_callback(f"Subroutine completed.")
-                                else:
-                                    self.log_callback(f"Warning: No grouped_actions in subroutine file")
-                                    
-                            except Exception as e:
-                                self.log_callback(f"Error calling macro: {e}")
-                        
-                        idx += 1
-                        continue
+                    # Every instruction with a timestamp waits for its scheduled time on the macro timeline.
+                    if ins.time is not None:
+                        scheduler.wait_until(ins.time)
+                        if not self._playing: break
 
-                    # --- Action-Aware Playback Logic (High-Level) ---
-                    # Prudent Mode Helper
-                    def check_prudent(target_x, target_y):
-                        if not prudent_mode: return True
-                        
-                        # Move first
-                        # mouse.move(target_x, target_y)
-                        time.sleep(0.05)
-                        
-                        rgb = event_utils.get_pixel_color(target_x, target_y)
-                        current_hex = event_utils.rgb_to_hex(rgb)
-                        
-                        if i == 0: # Learning phase (First iteration of repeat loop)
-                            learned_colors[action_idx] = current_hex
-                            return True
-                        else: # Verification phase
-                            expected = learned_colors.get(action_idx)
-                            if expected and current_hex != expected:
-                                self.log_callback(f"Prudent Mode: Color mismatch! Expected {expected}, Got {current_hex}")
-                                # Retry 3 times
-                                for _ in range(3):
-                                    time.sleep(0.5)
-                                    rgb = event_utils.get_pixel_color(target_x, target_y)
-                                    current_hex = event_utils.rgb_to_hex(rgb)
-                                    if current_hex == expected:
-                                        self.log_callback("Prudent Mode: Color matched after retry.")
-                                        return True
-                                
-                                self.log_callback("Prudent Mode: Mismatch persists. Stopping.")
-                                self.playing = False
-                                return False
-                        return True
-
-                    # For special actions, perform a high-level command
-                    if action.type in ('mouse_click', 'mouse_double_click', 'mouse_triple_click', 'mouse_drag'):
-                        details = action.details
-                        button = details.get('button', 'left')
-                        pos = details.get('start_pos')
-                        
-                        if action.type == 'mouse_drag':
-                            if pos:
-                                mouse.move(pos[0], pos[1])
-                                if not check_prudent(pos[0], pos[1]): break
-                                end_pos = details.get('end_pos')
-                                self.log_callback(f"Player: Executing high-level drag.")
-                                mouse.drag(pos[0], pos[1], end_pos[0], end_pos[1], absolute=True, duration=0.2)
-                        else:
-                            if pos:
-                                mouse.move(pos[0], pos[1])
-                                if not check_prudent(pos[0], pos[1]): break
-                            
-                            if action.type == 'mouse_click':
-                                mouse.click(button)
-                            elif action.type == 'mouse_double_click':
-                                self.log_callback(f"Player: Executing high-level double-click.")
-                                mouse.double_click(button)
-                            elif action.type == 'mouse_triple_click':
-                                self.log_callback(f"Player: Executing high-level triple-click.")
-                                mouse.double_click(button)
-                                time.sleep(0.05)
-                                mouse.click(button)
-                        
-                        idx += 1
-                        continue # Skip the raw event loop for this action
-
-                    # Fallback to playing raw events for other action types
-                    for event_list_idx in action.indices:
-                        if not self.playing: break
-                        
-                        event_time, event_data = events[event_list_idx]
-                        event = event_data['obj']
-                        recorded_pos = event_data.get('pos')
-
-                        # Internal timing for raw events
-                        # Must subtract time_offset!
-                        current_delay = time.time() - start_time - self.time_offset
-                        wait_time = event_time - current_delay
-                        sleep_duration = wait_time / speed_multiplier
-
-                        if sleep_duration > 0:
-                            # Improve stability for very low delays (prevent OS timer resolution issues)
-                            time.sleep(max(sleep_duration, 0.001))
-
-                        # --- Raw Event Playback Logic ---
-                        if isinstance(event, keyboard.KeyboardEvent):
-                            # Fix for Numpad Decimal being recorded as 'decimal' but not playing back correctly
-                            if event.name == 'decimal':
-                                if event.event_type == 'down':
-                                    keyboard.press('.')
-                                elif event.event_type == 'up':
-                                    keyboard.release('.')
-                                continue
-
-                            if event.name in SUGGESTED_TARGET_KEYS:
-                                if event.event_type == 'down':
-                                    keyboard.press_and_release(event.scan_code)
-                                continue
-                            if event.event_type == 'down':
-                                if event.name in ('left windows', 'right windows', 'win') or (len(event.name) == 1 and event.name.isdigit()) or event.name.startswith('numpad'):
-                                    keyboard.press(event.name)
-                                elif hasattr(event, 'scan_code') and event.scan_code != -1:
-                                    keyboard.press(event.scan_code)
-                                else:
-                                    keyboard.press(event.name)
-                            elif event.event_type == 'up':
-                                if event.name in ('left windows', 'right windows', 'win') or (len(event.name) == 1 and event.name.isdigit()) or event.name.startswith('numpad'):
-                                    keyboard.release(event.name)
-                                elif hasattr(event, 'scan_code') and event.scan_code != -1:
-                                    keyboard.release(event.scan_code)
-                                else:
-                                    keyboard.release(event.name)
-                                
-                        elif isinstance(event, mouse.MoveEvent):
-                            if mode == 'relative':
-                                offset_x = event.x - origin[0]
-                                offset_y = event.y - origin[1]
-                                mouse.move(current_pos_origin[0] + offset_x, current_pos_origin[1] + offset_y)
-                            else:
-                                mouse.move(event.x, event.y)
-                        elif isinstance(event, mouse.ButtonEvent):
-                            if event.event_type == 'down':
-                                mouse.press(event.button)
-                            elif event.event_type == 'up':
-                                mouse.release(event.button)
-                        elif isinstance(event, mouse.WheelEvent):
-                            mouse.wheel(event.delta)
-                    
-                    idx += 1
+                    pc = handlers[ins.op](ins, pc, ctx)
 
+            self._acknowledge_stop()
+            self.last_timing_report = scheduler.report()
+            self.log_callback(f"Timing: {self.last_timing_report}")
         except Exception as e:
             self.log_callback(f"Error during playback: {e}")
         finally:
+            if sampler:
+                sampler.close()
+            if capture:
+                if sound_watch:
+                    capture.unwatch(sound_watch)
+                if sound_monitor:
+                    sound_monitor.stop()
+                capture.release()
+            self._acknowledge_stop()
             self.playing = False
+            self.control.resume()
             if self.esc_listener_hook:
-                keyboard.unhook(self.esc_listener_hook)
+                get_dispatcher(self.backend).remove(self.esc_listener_hook)
                 self.esc_listener_hook = None
             self.on_finish_callback()
+
+    def _acknowledge_stop(self):
+        """Records how long it took from the stop request until the player stopped injecting."""
+        if self.last_stop_latency_ms is None:
+            stop_latency_ns = self.control.acknowledge_stop()
+            if stop_latency_ns is not None:
+                self.last_stop_latency_ms = stop_latency_ns / 1e6
+                self.log_callback(f"Stop latency: {self.last_stop_latency_ms:.2f} ms")
+
+    # --- Instruction Handlers ---
+    # Each handler executes one compiled instruction and returns the next program counter.
+
+    def _op_begin(self, ins, pc, ctx):
+        # Highlight the current action in the UI
+        self.on_action_highlight_callback(ins.action_idx)
+        return pc + 1
+
+    def _op_loop_start(self, ins, pc, ctx):
+        count, body_pc = ins.args
+        if not ctx.loop_stack or ctx.loop_stack[-1]['start_pc'] != pc:
+            ctx.loop_stack.append({'start_pc': pc, 'body_pc': body_pc, 'count': count, 'current': 0})
+            self.log_callback(f"Loop Start: {count if count > 0 else 'Infinite'}")
+        return pc + 1
+
+    def _op_loop_end(self, ins, pc, ctx):
+        if ctx.loop_stack:
+            loop = ctx.loop_stack[-1]
+            loop['current'] += 1
+            if loop['count'] == 0 or loop['current'] < loop['count']:
+                self.log_callback(f"Looping back... ({loop['current']}/{loop['count'] if loop['count']>0 else 'Inf'})")
+                return loop['body_pc']
+            self.log_callback("Loop finished.")
+            ctx.loop_stack.pop()
+        return pc + 1
+
+    def _op_wait_color(self, ins, pc, ctx):
+        x, y, condition, timeout, post_delay = ins.args
+        control = self.control
+        start_wait = control.clock_ns()
+        self.log_callback(f"Waiting for color {condition.describe()} at ({x}, {y})...")
+        
+        # Move mouse to target pixel
+        try:
+            self.backend.move(x, y)
+        except Exception as e:
+            self.log_callback(f"Failed to move mouse: {e}")
+
+        while True:
+            if not self.playing: break
+            if self._read_color_condition(ctx, x, y, condition)[0]:
+                self.log_callback("Color matched!")
+                break
+            if control.clock_ns() - start_wait > timeout * NS_PER_S:
+                self.log_callback("Wait Color Timeout! Stopping macro.")
+                self.playing = False
+                break
+            control.sleep(ctx.poll_interval)
+        
+        # Push the rest of the timeline back by the (unpaused) time spent waiting
+        ctx.scheduler.shift((control.clock_ns() - start_wait) / NS_PER_S)
+        self._post_match_delay(post_delay, ctx)
+        return pc + 1
+
+    def _op_wait_image(self, ins, pc, ctx):
+        template_path, roi, threshold, timeout, post_delay, button = ins.args
+        control = self.control
+        name = os.path.basename(template_path)
+        try:
+            template = image_search.load_template(template_path)
+        except Exception as e:
+            self.log_callback(f"Failed to load image {name}: {e}. Stopping macro.")
+            self.playing = False
+            return _STOP_PC
+
+        start_wait = control.clock_ns()
+        self.log_callback(f"Waiting for image {name}...")
+        match = None
+        while True:
+            if not self.playing: break
+            match = image_search.find_template(ctx.provider, template, roi, threshold)
+            if match:
+                self.log_callback(f"Image found at ({match.x}, {match.y}) (score {match.score:.3f})")
+                break
+            if control.clock_ns() - start_wait > timeout * NS_PER_S:
+                self.log_callback("Wait Image Timeout! Stopping macro.")
+                self.playing = False
+                break
+            control.sleep(IMAGE_POLL_INTERVAL)
+
+        ctx.scheduler.shift((control.clock_ns() - start_wait) / NS_PER_S)
+        if match and button:
+            # click_image: click the center of the match
+            self.backend.move(match.x, match.y)
+            self.backend.click(button)
+        self._post_match_delay(post_delay, ctx)
+        return pc + 1
+
+    def _op_wait_region(self, ins, pc, ctx):
+        (left, top, width, height), mode, stable_samples, timeout, post_delay = ins.args
+        control = self.control
+        watcher = region_watch.RegionWatcher(mode, stable_samples)
+        start_wait = control.clock_ns()
+        self.log_callback(f"Waiting for region {width}x{height} at ({left}, {top}) to {'change' if mode == 'change' else 'settle'}...")
+
+        while True:
+            if not self.playing: break
+            if watcher.update(ctx.provider.grab(left, top, width, height)):
+                if mode == 'change':
+                    self.log_callback(f"Region changed ({watcher.changed_tiles} tiles).")
+                else:
+                    self.log_callback(f"Region stable ({watcher.identical_run} identical samples).")
+                break
+            if control.clock_ns() - start_wait > timeout * NS_PER_S:
+                self.log_callback("Wait Region Timeout! Stopping macro.")
+                self.playing = False
+                break
+            control.sleep(region_watch.DEFAULT_INTERVAL)
+
+        ctx.scheduler.shift((control.clock_ns() - start_wait) / NS_PER_S)
+        self._post_match_delay(post_delay, ctx)
+        return pc + 1
+
+    def _op_wait_sound(self, ins, pc, ctx):
+        threshold, timeout, post_delay, spec = ins.args
+        capture = ctx.audio
+        if capture is None:
+            self.log_callback("Wait Sound: no sound capture available. Stopping macro.")
+            self.playing = False
+            return pc + 1
+        try:
+            trigger = sound_trigger.create_trigger(spec, capture.samplerate)
+        except Exception as e:
+            self.log_callback(f"Wait Sound: can't set up {spec.describe()}: {e}. Stopping macro.")
+            self.playing = False
+            return pc + 1
+        if trigger:
+            self.log_callback(f"Waiting for sound ({spec.describe()}, min level {threshold})...")
+        else:
+            self.log_callback(f"Waiting for sound (Threshold: {threshold})...")
+        control = self.control
+        start_wait = control.clock_ns()
+        # Only sound after this point counts; every block is checked, so short sounds aren't missed
+        since = capture.blocks
+        position = capture.position
+        while self.playing:
+            control.sleep(0)  # Blocks while paused
+            if not self.playing: break
+            if trigger:
+                score, position = trigger.scan(capture, position, SOUND_WAIT_SLICE)
+                if score is not None:
+                    self.log_callback(f"Sound matched ({spec.describe()}, score {score:.2f})")
+                    break
+            else:
+                level, since = capture.wait_for_level(threshold, since, SOUND_WAIT_SLICE)
+                if level is not None:
+                    self.log_callback(f"Sound detected (Vol: {level:.4f})")
+                    break
+            if control.clock_ns() - start_wait > timeout * NS_PER_S:
+                self.log_callback("Wait Sound Timeout! Stopping macro.")
+                self.playing = False
+                break
+
+        ctx.scheduler.shift((control.clock_ns() - start_wait) / NS_PER_S)
+        self._post_match_delay(post_delay, ctx)
+        return pc + 1
+
+    def _post_match_delay(self, post_delay, ctx):
+        if post_delay > 0:
+            self.log_callback(f"Post-match delay: {post_delay}s")
+            self.control.sleep(post_delay)
+            ctx.scheduler.shift(post_delay)
+
+    def _op_if_color(self, ins, pc, ctx):
+        # IF COLOR: Check if pixel matches target color
+        x, y, condition, else_pc = ins.args
+        matched, current = self._read_color_condition(ctx, x, y, condition)
+        
+        if matched:
+            self.log_callback(f"IF COLOR: Matched {condition.describe()}! Continuing...")
+            return pc + 1
+        self.log_callback(f"IF COLOR: Not matched ({current} != {condition.describe()}). Jumping to ELSE.")
+        return else_pc
+
+    def _read_color_condition(self, ctx, x, y, condition):
+        """Returns (matched, what was read). A signature reads all its points at once."""
+        if isinstance(condition, ColorSignature):
+            colors = ctx.screen.get_packed_many(condition.xs, condition.ys)
+            if condition.matches_all(colors):
+                return True, None
+            return False, f"{condition.mismatches(colors)} of {len(condition)} points differ"
+        current = ctx.screen.get_packed(x, y)
+        if condition.matches(current):
+            return True, None
+        return False, packed_to_hex(current)
+
+    def _op_else(self, ins, pc, ctx):
+        # ELSE branch: skip to IF_END
+        end_pc, end_action_idx = ins.args
+        self.log_callback(f"IF COLOR ELSE: Jumping to END at {end_action_idx}")
+        return end_pc
+
+    def _op_call_macro(self, ins, pc, ctx):
+        # Call another macro file as a subroutine
+        file_path = ins.args[0]
+        self.log_callback(f"Calling macro: {file_path}")
+        try:
+            sub_actions = macro_file.load_macro(file_path)['grouped_actions']
+            
+            if sub_actions:
+                self.log_callback(f"Executing {len(sub_actions)} sub-actions...")
+                
+                # Execute each sub-action inline
+                for sub_action in sub_actions:
+                    if not self.playing:
+                        break
+                    
+                    # Handle high-level mouse actions
+                    if sub_action.type in ['mouse_click', 'mouse_double_click']:
+                        details = sub_action.details
+                        x = details.get('x', 0)
+                        y = details.get('y', 0)
+                        btn = details.get('button', 'left')
+                        
+                        self.backend.move(x, y)
+                        self.control.sleep(0.01)
+                        
+                        if sub_action.type == 'mouse_double_click':
+                            self.backend.double_click(btn)
+                        else:
+                            self.backend.click(btn)
+                        
+                        self.log_callback(f"Sub: {sub_action.display_text}")
+                    
+                    elif sub_action.type == 'shortcut':
+                        keys = sub_action.details.get('keys', [])
+                        if keys:
+                            self.backend.key_tap('+'.join(keys))
+                            self.log_callback(f"Sub: {sub_action.display_text}")
+                    
+                    elif sub_action.type == 'typing':
+                        text = sub_action.details.get('text', '')
+                        if text:
+                            self.backend.write(text)
+                            self.log_callback(f"Sub: {sub_action.display_text}")
+                    
+                    # Small delay between sub-actions
+                    self.control.sleep(0.05)
+                
+                self.log_callback(f"Subroutine completed.")
+            else:
+                self.log_callback(f"Warning: No grouped_actions in subroutine file")
+                
+        except Exception as e:
+            self.log_callback(f"Error calling macro: {e}")
+        return pc + 1
+
+    def _check_prudent(self, target_x, target_y, ctx, action_idx):
+        """Prudent Mode: learns the pixel under each click on the first repeat and verifies it afterwards."""
+        if not ctx.prudent_mode: return True
+        
+        if not self.control.sleep(0.05): return False
+        
+        current = ctx.screen.get_packed(target_x, target_y)
+        
+        if ctx.repeat_index == 0: # Learning phase (First iteration of repeat loop)
+            ctx.learned_colors[action_idx] = current
+            return True
+
+        # Verification phase
+        expected = ctx.learned_colors.get(action_idx)
+        if expected is not None and current != expected:
+            self.log_callback(f"Prudent Mode: Color mismatch! Expected {packed_to_hex(expected)}, Got {packed_to_hex(current)}")
+            # Retry 3 times
+            for _ in range(3):
+                if not self.control.sleep(0.5): return False
+                if ctx.screen.get_packed(target_x, target_y) == expected:
+                    self.log_callback("Prudent Mode: Color matched after retry.")
+                    return True
+            
+            self.log_callback("Prudent Mode: Mismatch persists. Stopping.")
+            self.playing = False
+            return False
+        return True
+
+    def _op_click(self, ins, pc, ctx):
+        pos, button, clicks = ins.args
+        if pos:
+            self.backend.move(pos[0], pos[1])
+            if not self._check_prudent(pos[0], pos[1], ctx, ins.action_idx):
+                return _STOP_PC
+        
+        if clicks == 1:
+            self.backend.click(button)
+        elif clicks == 2:
+            if self.debug_log_callback: self.debug_log_callback("Player: Executing high-level double-click.")
+            self.backend.double_click(button)
+        else:
+            if self.debug_log_callback: self.debug_log_callback("Player: Executing high-level triple-click.")
+            self.backend.double_click(button)
+            if not self.control.sleep(0.05):
+                return _STOP_PC
+            self.backend.click(button)
+        return pc + 1
+
+    def _op_drag(self, ins, pc, ctx):
+        pos, end_pos, button = ins.args
+        self.backend.move(pos[0], pos[1])
+        if not self._check_prudent(pos[0], pos[1], ctx, ins.action_idx):
+            return _STOP_PC
+        if self.debug_log_callback: self.debug_log_callback("Player: Executing high-level drag.")
+        self.backend.drag(pos[0], pos[1], end_pos[0], end_pos[1], duration=0.2)
+        return pc + 1
+
+    def _op_key_press(self, ins, pc, ctx):
+        self.backend.key_press(ins.args[0])
+        return pc + 1
+
+    def _op_key_release(self, ins, pc, ctx):
+        self.backend.key_release(ins.args[0])
+        return pc + 1
+
+    def _op_key_tap(self, ins, pc, ctx):
+        self.backend.key_tap(ins.args[0])
+        return pc + 1
+
+    def _op_move(self, ins, pc, ctx):
+        self.backend.move(ins.args[0], ins.args[1])
+        return pc + 1
+
+    def _op_move_rel(self, ins, pc, ctx):
+        self.backend.move(ctx.pos_origin[0] + ins.args[0], ctx.pos_origin[1] + ins.args[1])
+        return pc + 1
+
+    def _op_button_down(self, ins, pc, ctx):
+        self.backend.press(ins.args[0])
+        return pc + 1
+
+    def _op_button_up(self, ins, pc, ctx):
+        self.backend.release(ins.args[0])
+        return pc + 1
+
+    def _op_wheel(self, ins, pc, ctx):
+        self.backend.wheel(ins.args[0])
+        return pc + 1
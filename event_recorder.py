@@ -1,8 +1,19 @@
+import itertools
 import time
 import threading
 import keyboard
 import mouse
-import event_utils
+import color_match
+from event_grouper import EventGrouper
+from event_store import EventStore
+from input_backend import get_default_backend
+from input_dispatcher import get_dispatcher
+from record_ring import RecordRing
+from path_simplify import PathPoint, StreamingPathSimplifier
+from pixel_sampler import AsyncPixelSampler
+
+CONSUMER_IDLE_SLEEP = 0.002  # Consumer poll interval while pixel samples are outstanding
+SAMPLE_FLUSH_TIMEOUT = 1.0   # How long stop_recording waits for outstanding pixel samples
 
 NUMPAD_SCAN_CODES = {
     79: {'name': '1', 'scan_code': 2},
@@ -19,12 +30,19 @@ NUMPAD_SCAN_CODES = {
 }
 
 class Recorder:
-    def __init__(self, log_callback, mapper_manager=None):
+    def __init__(self, log_callback, mapper_manager=None, backend=None, on_actions_callback=None, screen=None):
         self.log_callback = log_callback
+        self.on_actions_callback = on_actions_callback  # Receives lists of GroupedActions grouped live
         self.mapper_manager = mapper_manager
+        self.backend = backend if backend else get_default_backend()
         self.recording = False
-        self.events = []
-        self.new_events = []
+        self.events = EventStore()
+        self.new_events = EventStore()
+        self._ring = RecordRing()  # Filled by the hook threads, drained by the listener thread
+        self._wake = threading.Event()  # Set by the hooks (and stop_recording) when the listener has work
+        self._cursor_pos = (0, 0)
+        self._last_event_time = 0.0
+        self.grouper = None
         self.start_time = 0
         self.origin_pos = (0, 0)
         self.coordinate_mode = 'absolute'
@@ -34,10 +52,26 @@ class Recorder:
         self.auto_wait = False
         self.auto_wait_timeout = 5.0
         self.right_click_to_color_check = False
+        self.path_simplifier = None  # Set while recording with move simplification
+        self.screen = screen  # ScreenProvider for pixel capture (None: the default screen)
+        self.pixel_sampler = None
+        self._awaiting_color = {}  # Sample key -> row in new_events whose color is still being captured
+        self._sample_keys = itertools.count()
+        self._next_grouped = 0  # First row of new_events not yet fed to the live grouper
 
-    def _record_event(self, event):
-        if not self.recording:
-            return
+    def _process_event(self, event_time, event):
+        """Runs on the listener thread for every event taken from the ring, in hook order."""
+        if isinstance(event, mouse.MoveEvent):
+            # Moves arrive in order with the clicks, so this is the cursor position at each click
+            self._cursor_pos = (event.x, event.y)
+            if self.path_simplifier:
+                for point in self.path_simplifier.add(PathPoint(event_time, event.x, event.y, event)):
+                    self._store_move(point)
+                return
+        elif self.path_simplifier:
+            # Any other event ends the current path, so the moves next to it are always kept
+            for point in self.path_simplifier.flush():
+                self._store_move(point)
 
         if isinstance(event, keyboard.KeyboardEvent) and self.mapper_manager:
             lookup_key = f"'{event.name}' (Scan Code: {event.scan_code})"
@@ -59,51 +93,39 @@ class Recorder:
             self.button_to_ignore_up = None
             return
 
-        event_time = time.time() - self.start_time
-
         # Right Click → Color Check 변환 처리
         if isinstance(event, mouse.ButtonEvent) and event.button == 'right' and event.event_type == 'down':
             if self.right_click_to_color_check:
-                pos = mouse.get_position()
-                try:
-                    color = event_utils.get_pixel_color(pos[0], pos[1])
-                    hex_color = event_utils.rgb_to_hex(color)
-                    # 우클릭 대신 Color Check 이벤트로 저장
-                    event_to_store = {
-                        'logic_type': 'wait_color',
-                        'target_hex': hex_color,
-                        'x': pos[0],
-                        'y': pos[1],
-                        'timeout': self.auto_wait_timeout,
-                        'post_delay': 0
-                    }
-                    self.new_events.append((event_time, event_to_store))
-                    self.log_callback(f"Right Click → Color Check: {hex_color} at {pos}")
-                    # 우클릭 Up 이벤트도 무시
-                    self.button_to_ignore_up = 'right'
-                    return  # 우클릭 이벤트는 기록하지 않음
-                except Exception as e:
-                    self.log_callback(f"Failed to capture color for right click: {e}")
-
-        pos = mouse.get_position() if isinstance(event, mouse.ButtonEvent) else None
-        event_to_store = {'obj': event, 'pos': pos}
+                pos = self._cursor_pos
+                # 우클릭 대신 Color Check 이벤트로 저장 (the color is attached once the sampler has read it)
+                event_to_store = {
+                    'logic_type': 'wait_color',
+                    'target_hex': None,
+                    'x': pos[0],
+                    'y': pos[1],
+                    'timeout': self.auto_wait_timeout,
+                    'post_delay': 0
+                }
+                self._store_event(lambda: self.new_events.append_logic(event_time, event_to_store), sample=(event_time, pos))
+                # 우클릭 Up 이벤트도 무시
+                self.button_to_ignore_up = 'right'
+                return  # 우클릭 이벤트는 기록하지 않음
+
+        pos = self._cursor_pos if isinstance(event, mouse.ButtonEvent) else None
+        extras = None
+        sample = None
         if isinstance(event, mouse.ButtonEvent) and event.event_type == 'down' and event.button == 'left':
             if self.auto_wait:
-                # Capture color for Auto-Wait
-                try:
-                    color = event_utils.get_pixel_color(pos[0], pos[1])
-                    hex_color = event_utils.rgb_to_hex(color)
-                    event_to_store['auto_wait'] = {
-                        'target_hex': hex_color,
-                        'x': pos[0],
-                        'y': pos[1],
-                        'timeout': self.auto_wait_timeout
-                    }
-                    self.log_callback(f"Auto-Wait captured: {hex_color} at {pos}")
-                except Exception as e:
-                    self.log_callback(f"Failed to capture color: {e}")
-
-        self.new_events.append((event_time, event_to_store))
+                # Capture color for Auto-Wait (attached once the sampler has read it)
+                extras = {'auto_wait': {
+                    'target_hex': None,
+                    'x': pos[0],
+                    'y': pos[1],
+                    'timeout': self.auto_wait_timeout
+                }}
+                sample = (event_time, pos)
+
+        self._store_event(lambda: self.new_events.append_event(event_time, event, pos, extras), sample=sample)
 
         # Optimization: Disable verbose logging for raw events to improve recording performance
         # if not isinstance(event, mouse.MoveEvent):
@@ -113,54 +135,161 @@ class Recorder:
         #     else:
         #         self.log_callback(f"Event: {event}")
 
+    def _store_move(self, point):
+        self._store_event(lambda: self.new_events.append_event(point.time, point.payload, None, None))
+
+    def _store_event(self, append, sample=None):
+        append()
+        if sample:
+            event_time, pos = sample
+            key = next(self._sample_keys)
+            self._awaiting_color[key] = len(self.new_events) - 1
+            self.pixel_sampler.request(key, event_time, pos[0], pos[1])
+        self._feed_grouper()
+
+    def _feed_grouper(self):
+        # Rows are grouped in order, holding back at the first row still waiting for its color
+        if not self.grouper:
+            self._next_grouped = len(self.new_events)
+            return
+        waiting = set(self._awaiting_color.values())
+        actions = []
+        while self._next_grouped < len(self.new_events) and self._next_grouped not in waiting:
+            actions += self.grouper.feed(self.new_events[self._next_grouped])
+            self._next_grouped += 1
+        if actions and self.on_actions_callback:
+            self.on_actions_callback(actions)
+
+    def _apply_samples(self, timeout=None):
+        """Attaches finished pixel samples to their events (listener thread only)."""
+        for sample in self.pixel_sampler.poll(timeout):
+            row = self._awaiting_color.pop(sample.key, None)
+            if row is not None:
+                self._attach_color(row, sample.rgb, sample.error)
+        if timeout:
+            # Whatever is still outstanding after the timeout is treated as a failed capture
+            while self._awaiting_color:
+                key = next(iter(self._awaiting_color))
+                self._attach_color(self._awaiting_color.pop(key), None, TimeoutError("pixel capture timed out"))
+        self._feed_grouper()
+
+    def _attach_color(self, row, rgb, error):
+        if self.new_events.is_logic(row):
+            if rgb is None:
+                self.log_callback(f"Failed to capture color for right click: {error}")
+                # Not grouped yet (grouping holds back at this row), so it can still be removed
+                self.new_events.delete_indices([row])
+                self._awaiting_color = {k: r - 1 if r > row else r for k, r in self._awaiting_color.items()}
+                return
+            details = self.new_events.extras(row)
+            details.update(color_match.target_fields(rgb))
+            self.log_callback(f"Right Click → Color Check: {details['target_hex']} at {(details['x'], details['y'])}")
+        else:
+            extras = self.new_events.extras(row)
+            if rgb is None:
+                self.log_callback(f"Failed to capture color: {error}")
+                extras.pop('auto_wait', None)
+                return
+            extras['auto_wait'].update(color_match.target_fields(rgb))
+            self.log_callback(f"Auto-Wait captured: {extras['auto_wait']['target_hex']} at {(extras['auto_wait']['x'], extras['auto_wait']['y'])}")
+
+    # The hooks only timestamp the event and hand it to the ring; everything else
+    # (mapping, normalization, positions, pixel capture, grouping) runs on the listener thread
     def _keyboard_handler(self, event):
-        self._record_event(event)
+        if self.recording:
+            self._ring.put(time.perf_counter(), event)
+            self._wake.set()
 
     def _mouse_handler(self, event):
-        self._record_event(event)
+        if self.recording:
+            self._ring.put(time.perf_counter(), event)
+            self._wake.set()
+
+    def _drain_ring(self) -> int:
+        items = self._ring.drain()
+        for timestamp, event in items:
+            # Hook threads can race between timestamping and publishing; keep the timeline monotonic
+            event_time = max(timestamp - self.start_time, self._last_event_time)
+            self._last_event_time = event_time
+            try:
+                self._process_event(event_time, event)
+            except Exception as e:
+                self.log_callback(f"Failed to record event {event}: {e}")
+        return len(items)
 
     def _start_listeners(self):
-        self.keyboard_hook = keyboard.hook(self._keyboard_handler)
-        self.mouse_hook = mouse.hook(self._mouse_handler)
+        dispatcher = get_dispatcher(self.backend)
+        self.keyboard_hook = dispatcher.add_keyboard_listener(self._keyboard_handler)
+        self.mouse_hook = dispatcher.add_mouse_listener(self._mouse_handler)
         
-        while self.recording:
-            time.sleep(0.1)
+        while True:
+            self._wake.clear()
+            if not self.recording: break  # Checked after clear(), so the wakeup from stop_recording can't be lost
+            processed = self._drain_ring()
+            if self._awaiting_color:
+                self._apply_samples()
+            if not processed:
+                # Sleep until a hook publishes an event; poll only while pixel samples are outstanding
+                self._wake.wait(CONSUMER_IDLE_SLEEP if self._awaiting_color else None)
         
-        keyboard.unhook(self.keyboard_hook)
-        mouse.unhook(self.mouse_hook)
+        dispatcher.remove(self.keyboard_hook)
+        dispatcher.remove(self.mouse_hook)
+        self.keyboard_hook = self.mouse_hook = None
+        self._drain_ring()
+        if self.path_simplifier:
+            for point in self.path_simplifier.flush():
+                self._store_move(point)
+            self.log_callback(f"Move simplification kept {self.path_simplifier.kept} of {self.path_simplifier.received} moves.")
+        if self._awaiting_color:
+            self._apply_samples(timeout=SAMPLE_FLUSH_TIMEOUT)
+        self.pixel_sampler.close()
+        if self._ring.dropped:
+            self.log_callback(f"Warning: {self._ring.dropped} input event(s) were dropped (recorder fell behind).")
 
-    def start_recording(self, coordinate_mode='absolute', existing_events=None, auto_wait=False, auto_wait_timeout=5.0, right_click_to_color_check=False):
+    def start_recording(self, coordinate_mode='absolute', existing_events=None, auto_wait=False, auto_wait_timeout=5.0, right_click_to_color_check=False,
+                        simplify_moves=False, simplify_tolerance_px=2.0, simplify_min_interval=0.01):
         if self.recording:
             self.log_callback("Already recording.")
             return
 
-        self.events = existing_events if existing_events else []
-        self.new_events = []
+        self.events = EventStore.coerce(existing_events)
+        self.new_events = EventStore()
+        self._ring = RecordRing()
+        # Group live only for fresh recordings; continuations are regrouped as a whole afterwards
+        self.grouper = EventGrouper() if not self.events else None
         self.coordinate_mode = coordinate_mode
         self.button_to_ignore_up = None
         self.auto_wait = auto_wait
         self.auto_wait_timeout = auto_wait_timeout
         self.right_click_to_color_check = right_click_to_color_check
+        self.path_simplifier = StreamingPathSimplifier(simplify_tolerance_px, simplify_min_interval) if simplify_moves else None
+        self.pixel_sampler = AsyncPixelSampler(self.screen)
+        self._awaiting_color = {}
+        self._next_grouped = 0
 
-        last_timestamp = self.events[-1][0] if self.events else 0
+        last_timestamp = float(self.events.time[-1]) if len(self.events) else 0
         
         # Safety check for invalid timestamps (e.g. negative or epoch)
         if last_timestamp < 0 or last_timestamp > 1000000000:
             self.log_callback(f"Warning: Invalid last timestamp ({last_timestamp}). Resetting base time.")
             last_timestamp = 0
 
-        self.start_time = time.time() - last_timestamp
+        # Hook timestamps are taken on the monotonic perf_counter clock
+        self.start_time = time.perf_counter() - last_timestamp
+        self._last_event_time = last_timestamp
+        self._cursor_pos = self.backend.get_position()
 
-        if self.events:
+        if len(self.events):
             self.log_callback(f"Continuing recording from {len(self.events)} existing events...")
             # Safely get origin_pos from the first event that has one
             self.origin_pos = (0,0)
-            for _, evt_data in self.events:
-                if 'pos' in evt_data and evt_data['pos'] is not None:
-                    self.origin_pos = evt_data['pos']
+            for i in range(len(self.events)):
+                pos = self.events.get_pos(i)
+                if pos is not None:
+                    self.origin_pos = pos
                     break
         else:
-            self.origin_pos = mouse.get_position()
+            self.origin_pos = self.backend.get_position()
             self.log_callback(f"Recording started in {coordinate_mode} mode...")
 
         self.recording = True
@@ -173,15 +302,27 @@ class Recorder:
             return None
 
         self.recording = False
+        self._wake.set()
         if self.thread:
             self.thread.join()
 
         self.log_callback("Recording stopped.")
         
+        # The listener thread has drained the ring and exited, so nothing else touches the events now
         final_events = self.events + self.new_events
+        grouped_actions = None
+        if self.grouper:
+            remaining = self.grouper.flush()
+            grouped_actions = self.grouper.actions
+            self.grouper = None
+        if grouped_actions is not None and remaining and self.on_actions_callback:
+            self.on_actions_callback(remaining)
         
-        return {
+        macro_data = {
             'events': final_events,
             'mode': self.coordinate_mode,
             'origin': self.origin_pos
         }
+        if grouped_actions is not None:
+            macro_data['grouped_actions'] = grouped_actions
+        return macro_data
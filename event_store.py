@@ -0,0 +1,593 @@
+"""
+Columnar storage for raw macro events.
+
+An EventStore keeps every raw event in typed NumPy columns (timestamp, kind,
+event type, x/y, button, scan code, wheel delta, key name) instead of a
+(time, dict) tuple holding a `keyboard`/`mouse` library object. Rarely used
+per-event data (remarks, auto_wait metadata, logic payloads) lives in a
+sparse side table keyed by row index.
+
+For compatibility with code written against the old list of (time, dict)
+tuples, indexing a store returns (time, EventView) where EventView is a
+dict-like view of the row: reading 'obj' builds the library event on demand
+and writing 'obj', 'pos' or any other key writes through to the store.
+Views refer to a row index, so re-fetch them after inserting or deleting rows.
+"""
+import copy
+from collections.abc import MutableMapping
+from typing import Any, Iterable, Optional
+
+import keyboard
+import mouse
+import numpy as np
+
+# --- Event Kinds ---
+KIND_KEY = 0
+KIND_MOVE = 1
+KIND_BUTTON = 2
+KIND_WHEEL = 3
+KIND_LOGIC = 4
+
+EVENT_TYPES = ('down', 'up', 'double')
+NO_EVENT_TYPE = 255
+MOUSE_BUTTONS = ('left', 'right', 'middle', 'x', 'x2', 'wheel')
+NO_BUTTON = 255
+NO_POS = np.iinfo(np.int32).min  # x/y of a button event recorded without a cursor position
+NO_NAME = -1
+
+COLUMNS = (
+    ('time', np.float64),
+    ('kind', np.uint8),
+    ('event_type', np.uint8),
+    ('x', np.int32),
+    ('y', np.int32),
+    ('button', np.uint8),
+    ('scan_code', np.int32),
+    ('delta', np.float64),
+    ('name_id', np.int32),
+)
+
+_EVENT_TYPE_IDS = {name: i for i, name in enumerate(EVENT_TYPES)}
+_BUTTON_IDS = {name: i for i, name in enumerate(MOUSE_BUTTONS)}
+# Keys of the serialized format that map to columns rather than to the side table
+_SERIALIZED_COLUMN_KEYS = frozenset({'time', 'type', 'event_type', 'name', 'scan_code', 'x', 'y', 'button', 'pos', 'delta'})
+_INITIAL_CAPACITY = 64
+
+
+class EventView(MutableMapping):
+    """Dict-like view of one EventStore row, mirroring the old event data dict."""
+    __slots__ = ('_store', '_index', '_obj')
+
+    def __init__(self, store: 'EventStore', index: int):
+        self._store = store
+        self._index = index
+        self._obj = None
+
+    def __getitem__(self, key):
+        store, i = self._store, self._index
+        if key == 'obj':
+            if store.kind[i] == KIND_LOGIC:
+                raise KeyError(key)
+            if self._obj is None:
+                self._obj = store.get_obj(i)
+            return self._obj
+        if key == 'pos':
+            pos = store.get_pos(i)
+            if pos is None:
+                raise KeyError(key)
+            return pos
+        extras = store._extras.get(i)
+        if extras is None:
+            raise KeyError(key)
+        return extras[key]
+
+    def __setitem__(self, key, value):
+        store, i = self._store, self._index
+        if key == 'obj':
+            store.set_obj(i, value)
+            self._obj = None
+        elif key == 'pos':
+            store.set_pos(i, value)
+        else:
+            store.extras(i)[key] = value
+
+    def __delitem__(self, key):
+        extras = self._store._extras.get(self._index)
+        if key in ('obj', 'pos') or extras is None or key not in extras:
+            raise KeyError(key)
+        del extras[key]
+        if not extras and self._store.kind[self._index] != KIND_LOGIC:
+            del self._store._extras[self._index]
+
+    def __contains__(self, key):
+        store, i = self._store, self._index
+        if key == 'obj':
+            return store.kind[i] != KIND_LOGIC
+        if key == 'pos':
+            return store.get_pos(i) is not None
+        extras = store._extras.get(i)
+        return extras is not None and key in extras
+
+    def extras(self) -> dict:
+        """The row's side-table dict; for logic rows this is the logic payload itself."""
+        return self._store.extras(self._index)
+
+    def _keys(self):
+        keys = []
+        if 'obj' in self:
+            keys.append('obj')
+        if 'pos' in self:
+            keys.append('pos')
+        keys.extend(self._store._extras.get(self._index, ()))
+        return keys
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+
+class EventStore:
+    def __init__(self, capacity: int = _INITIAL_CAPACITY):
+        self._size = 0
+        self._capacity = max(capacity, 1)
+        for name, dtype in COLUMNS:
+            setattr(self, '_' + name, np.zeros(self._capacity, dtype=dtype))
+        self._extras: dict[int, dict] = {}
+        self.names: list[str] = []
+        self._name_ids: dict[str, int] = {}
+
+    # --- Construction ---
+    @classmethod
+    def from_events(cls, events: Iterable) -> 'EventStore':
+        """Builds a store from (time, data dict) tuples (the legacy in-memory format)."""
+        store = cls()
+        for event in events:
+            store.append(event)
+        return store
+
+    @classmethod
+    def coerce(cls, events) -> 'EventStore':
+        """Returns `events` if it already is a store, otherwise converts it."""
+        if isinstance(events, EventStore):
+            return events
+        return cls.from_events(events or [])
+
+    @classmethod
+    def from_columns(cls, columns: dict, names: list[str], extras: Optional[dict] = None) -> 'EventStore':
+        """
+        Wraps existing column arrays without copying them (e.g. views into a
+        memory-mapped macro file). Columns must be writable for in-place edits;
+        appending reallocates them.
+        """
+        size = len(columns['time'])
+        store = cls.__new__(cls)
+        store._size = size
+        store._capacity = size
+        for name, dtype in COLUMNS:
+            column = columns[name]
+            if column.dtype != dtype or len(column) != size:
+                raise ValueError(f"Column '{name}' must be {np.dtype(dtype).name}[{size}]")
+            setattr(store, '_' + name, column)
+        store._extras = dict(extras) if extras else {}
+        store.names = list(names)
+        store._name_ids = {name: i for i, name in enumerate(store.names)}
+        return store
+
+    def detach(self):
+        """Copies every column into memory the store owns, releasing views into a mapped macro file."""
+        for name, _ in COLUMNS:
+            setattr(self, '_' + name, np.array(getattr(self, '_' + name)))
+
+    def column_arrays(self) -> dict:
+        """The used part of every column, keyed by column name."""
+        return {name: getattr(self, '_' + name)[:self._size] for name, _ in COLUMNS}
+
+    @classmethod
+    def from_serialized(cls, event_dicts: list[dict]) -> 'EventStore':
+        """Builds a store from the JSON macro file representation of events."""
+        store = cls(len(event_dicts))
+        for event_dict in event_dicts:
+            store.append_serialized(event_dict)
+        return store
+
+    # --- Columns ---
+    # Views of the used part of each column; valid until the store is resized.
+    @property
+    def time(self) -> np.ndarray: return self._time[:self._size]
+    @property
+    def kind(self) -> np.ndarray: return self._kind[:self._size]
+    @property
+    def event_type(self) -> np.ndarray: return self._event_type[:self._size]
+    @property
+    def x(self) -> np.ndarray: return self._x[:self._size]
+    @property
+    def y(self) -> np.ndarray: return self._y[:self._size]
+    @property
+    def button(self) -> np.ndarray: return self._button[:self._size]
+    @property
+    def scan_code(self) -> np.ndarray: return self._scan_code[:self._size]
+    @property
+    def delta(self) -> np.ndarray: return self._delta[:self._size]
+    @property
+    def name_id(self) -> np.ndarray: return self._name_id[:self._size]
+
+    def nbytes(self) -> int:
+        return sum(getattr(self, '_' + name)[:self._size].nbytes for name, _ in COLUMNS)
+
+    def _reserve(self, size: int):
+        if size <= self._capacity:
+            return
+        capacity = max(size, self._capacity * 2)
+        for name, _ in COLUMNS:
+            old = getattr(self, '_' + name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, '_' + name, new)
+        self._capacity = capacity
+
+    def _intern(self, name: Optional[str]) -> int:
+        if name is None:
+            return NO_NAME
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self.names.append(name)
+            self._name_ids[name] = name_id
+        return name_id
+
+    # --- Row Access ---
+    def __len__(self):
+        return self._size
+
+    def _check_index(self, i: int) -> int:
+        if i < 0:
+            i += self._size
+        if not 0 <= i < self._size:
+            raise IndexError('event index out of range')
+        return i
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self.take(np.arange(self._size)[i])
+        i = self._check_index(i)
+        return (float(self._time[i]), EventView(self, i))
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield (float(self._time[i]), EventView(self, i))
+
+    def __setitem__(self, i, event):
+        i = self._check_index(i)
+        event_time, data = event
+        if isinstance(data, EventView) and data._store is self and data._index == i:
+            self._time[i] = event_time
+            return
+        self._write_row(i, event_time, dict(data))
+
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            self.delete_indices(np.arange(self._size)[i])
+        else:
+            self.delete_indices([self._check_index(i)])
+
+    def __add__(self, other) -> 'EventStore':
+        result = self.take(np.arange(self._size))
+        result.extend(other)
+        return result
+
+    def get_obj(self, i: int):
+        """Builds the `keyboard`/`mouse` library event for row i (None for logic rows)."""
+        kind = self._kind[i]
+        event_time = float(self._time[i])
+        if kind == KIND_MOVE:
+            return mouse.MoveEvent(int(self._x[i]), int(self._y[i]), event_time)
+        if kind == KIND_BUTTON:
+            return mouse.ButtonEvent(self.event_type_name(i), MOUSE_BUTTONS[self._button[i]], event_time)
+        if kind == KIND_KEY:
+            return keyboard.KeyboardEvent(self.event_type_name(i), int(self._scan_code[i]), name=self.key_name(i), time=event_time)
+        if kind == KIND_WHEEL:
+            return mouse.WheelEvent(self.wheel_delta(i), event_time)
+        return None
+
+    def event_type_name(self, i: int) -> Optional[str]:
+        event_type = self._event_type[i]
+        return EVENT_TYPES[event_type] if event_type != NO_EVENT_TYPE else None
+
+    def key_name(self, i: int) -> Optional[str]:
+        name_id = self._name_id[i]
+        return self.names[name_id] if name_id != NO_NAME else None
+
+    def wheel_delta(self, i: int) -> float:
+        return float(self._delta[i])
+
+    def get_pos(self, i: int) -> Optional[tuple[int, int]]:
+        """Cursor position recorded with a mouse button event."""
+        if self._kind[i] != KIND_BUTTON or self._x[i] == NO_POS:
+            return None
+        return (int(self._x[i]), int(self._y[i]))
+
+    def set_pos(self, i: int, pos):
+        if self._kind[i] != KIND_BUTTON:
+            return
+        if pos is None:
+            self._x[i] = self._y[i] = NO_POS
+        else:
+            self._x[i], self._y[i] = pos[0], pos[1]
+
+    def is_logic(self, i: int) -> bool:
+        return self._kind[i] == KIND_LOGIC
+
+    def extras(self, i: int) -> dict:
+        """The side-table dict of row i (created on demand). For logic rows this is the logic payload."""
+        extras = self._extras.get(i)
+        if extras is None:
+            extras = self._extras[i] = {}
+        return extras
+
+    def extras_items(self) -> list[tuple[int, dict]]:
+        """(row, side-table dict) pairs in row order."""
+        return sorted(self._extras.items())
+
+    def get_extra(self, i: int, key: str, default: Any = None) -> Any:
+        extras = self._extras.get(i)
+        return extras.get(key, default) if extras else default
+
+    # --- Writing ---
+    def set_obj(self, i: int, event):
+        """Overwrites the columns of row i from a `keyboard`/`mouse` library event."""
+        pos = self.get_pos(i)
+        self._x[i] = self._y[i] = 0
+        self._button[i] = NO_BUTTON
+        self._scan_code[i] = -1
+        self._delta[i] = 0
+        self._name_id[i] = NO_NAME
+        self._event_type[i] = NO_EVENT_TYPE
+        if isinstance(event, keyboard.KeyboardEvent):
+            self._kind[i] = KIND_KEY
+            self._event_type[i] = _EVENT_TYPE_IDS.get(event.event_type, NO_EVENT_TYPE)
+            self._scan_code[i] = event.scan_code if event.scan_code is not None else -1
+            self._name_id[i] = self._intern(event.name)
+        elif isinstance(event, mouse.MoveEvent):
+            self._kind[i] = KIND_MOVE
+            self._x[i], self._y[i] = event.x, event.y
+        elif isinstance(event, mouse.ButtonEvent):
+            self._kind[i] = KIND_BUTTON
+            self._event_type[i] = _EVENT_TYPE_IDS.get(event.event_type, NO_EVENT_TYPE)
+            self._button[i] = _BUTTON_IDS.get(event.button, NO_BUTTON)
+            self.set_pos(i, pos)
+        elif isinstance(event, mouse.WheelEvent):
+            self._kind[i] = KIND_WHEEL
+            self._delta[i] = event.delta
+        else:
+            raise TypeError(f"Unsupported event object: {event!r}")
+
+    def _write_row(self, i: int, event_time: float, data: dict):
+        self._time[i] = event_time
+        self._extras.pop(i, None)
+        if 'logic_type' in data:
+            self._kind[i] = KIND_LOGIC
+            self._event_type[i] = NO_EVENT_TYPE
+            self._button[i] = NO_BUTTON
+            self._x[i] = self._y[i] = 0
+            self._scan_code[i] = -1
+            self._delta[i] = 0
+            self._name_id[i] = NO_NAME
+            self._extras[i] = data
+            return
+        self._x[i] = self._y[i] = NO_POS
+        self._kind[i] = KIND_MOVE  # Placeholder so set_obj's get_pos sees no position
+        self.set_obj(i, data['obj'])
+        if data.get('pos') is not None:
+            self.set_pos(i, data['pos'])
+        extras = {k: v for k, v in data.items() if k not in ('obj', 'pos')}
+        if extras:
+            self._extras[i] = extras
+
+    def append(self, event):
+        """Appends a (time, data) tuple; data may be a dict or an EventView of any store."""
+        event_time, data = event
+        if isinstance(data, EventView):
+            self._append_from(data._store, data._index, event_time)
+            return
+        self._reserve(self._size + 1)
+        self._size += 1
+        self._write_row(self._size - 1, event_time, dict(data))
+
+    def append_event(self, event_time: float, event, pos=None, extras: Optional[dict] = None):
+        """Fast path for recorders: appends a library event without building a data dict."""
+        self._reserve(self._size + 1)
+        i = self._size
+        self._size += 1
+        self._time[i] = event_time
+        self._x[i] = self._y[i] = NO_POS
+        self._kind[i] = KIND_MOVE
+        self.set_obj(i, event)
+        if pos is not None:
+            self.set_pos(i, pos)
+        if extras:
+            self._extras[i] = extras
+
+    def append_logic(self, event_time: float, payload: dict):
+        self.append((event_time, payload))
+
+    def append_serialized(self, event_dict: dict):
+        """Appends one event in the JSON macro file format. Unknown event types are skipped."""
+        event_time = event_dict['time']
+        if 'logic_type' in event_dict:
+            payload = event_dict.copy()
+            del payload['time']
+            self.append((event_time, payload))
+            return
+
+        event_type = event_dict.get('type')
+        if event_type not in ('keyboard', 'mouse_move', 'mouse_button', 'mouse_wheel'):
+            return
+        self._reserve(self._size + 1)
+        i = self._size
+        self._size += 1
+        self._time[i] = event_time
+        self._event_type[i] = NO_EVENT_TYPE
+        self._button[i] = NO_BUTTON
+        self._x[i] = self._y[i] = 0
+        self._scan_code[i] = -1
+        self._delta[i] = 0
+        self._name_id[i] = NO_NAME
+        if event_type == 'keyboard':
+            self._kind[i] = KIND_KEY
+            self._event_type[i] = _EVENT_TYPE_IDS.get(event_dict['event_type'], NO_EVENT_TYPE)
+            self._scan_code[i] = event_dict.get('scan_code', -1)
+            self._name_id[i] = self._intern(event_dict['name'])
+        elif event_type == 'mouse_move':
+            self._kind[i] = KIND_MOVE
+            self._x[i], self._y[i] = event_dict['x'], event_dict['y']
+        elif event_type == 'mouse_button':
+            self._kind[i] = KIND_BUTTON
+            self._event_type[i] = _EVENT_TYPE_IDS.get(event_dict['event_type'], NO_EVENT_TYPE)
+            self._button[i] = _BUTTON_IDS.get(event_dict['button'], NO_BUTTON)
+            pos = event_dict.get('pos')
+            self._x[i], self._y[i] = (pos[0], pos[1]) if pos else (NO_POS, NO_POS)
+        else:
+            self._kind[i] = KIND_WHEEL
+            self._delta[i] = event_dict['delta']
+
+        extras = {k: v for k, v in event_dict.items() if k not in _SERIALIZED_COLUMN_KEYS}
+        if extras:
+            self._extras[i] = extras
+
+    def _append_from(self, source: 'EventStore', j: int, event_time: float):
+        self._reserve(self._size + 1)
+        i = self._size
+        self._size += 1
+        for name, _ in COLUMNS:
+            getattr(self, '_' + name)[i] = getattr(source, '_' + name)[j]
+        self._time[i] = event_time
+        if source is not self and source._name_id[j] != NO_NAME:
+            self._name_id[i] = self._intern(source.names[source._name_id[j]])
+        extras = source._extras.get(j)
+        if extras is not None:
+            self._extras[i] = copy.deepcopy(extras)
+
+    def extend(self, events):
+        if isinstance(events, EventStore):
+            self._extend_store(events)
+        else:
+            for event in events:
+                self.append(event)
+
+    def _extend_store(self, other: 'EventStore'):
+        n, m = self._size, len(other)
+        self._reserve(n + m)
+        for name, _ in COLUMNS:
+            getattr(self, '_' + name)[n:n + m] = getattr(other, '_' + name)[:m]
+        if other is not self and other.names:
+            remap = np.array([self._intern(name) for name in other.names], dtype=np.int32)
+            ids = self._name_id[n:n + m]
+            has_name = ids != NO_NAME
+            ids[has_name] = remap[ids[has_name]]
+        for j, extras in list(other._extras.items()):
+            self._extras[n + j] = copy.deepcopy(extras)
+        self._size = n + m
+
+    def insert(self, i: int, event):
+        """Inserts a (time, data) tuple before row i. O(n) like list.insert."""
+        if i < 0:
+            i = max(self._size + i, 0)
+        i = min(i, self._size)
+        event_time, data = event
+        data = dict(data) if isinstance(data, EventView) else data
+        self._reserve(self._size + 1)
+        for name, _ in COLUMNS:
+            column = getattr(self, '_' + name)
+            column[i + 1:self._size + 1] = column[i:self._size]
+        self._extras = {(k + 1 if k >= i else k): v for k, v in self._extras.items()}
+        self._size += 1
+        self._write_row(i, event_time, dict(data))
+
+    def delete_indices(self, indices) -> int:
+        """Deletes many rows in one vectorized pass. Returns the number of rows removed."""
+        indices = np.unique(np.asarray(list(indices) if not isinstance(indices, np.ndarray) else indices, dtype=np.int64))
+        if len(indices) == 0:
+            return 0
+        keep = np.ones(self._size, dtype=bool)
+        keep[indices] = False
+        self._compact(keep)
+        return len(indices)
+
+    def _compact(self, keep: np.ndarray):
+        new_index = np.cumsum(keep) - 1
+        for name, _ in COLUMNS:
+            column = getattr(self, '_' + name)
+            kept = column[:self._size][keep]
+            column[:len(kept)] = kept
+        self._extras = {int(new_index[k]): v for k, v in self._extras.items() if keep[k]}
+        self._size = int(keep.sum())
+
+    def take(self, indices) -> 'EventStore':
+        """Returns a new store with the given rows, in the given order (vectorized)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        result = EventStore(len(indices))
+        for name, _ in COLUMNS:
+            getattr(result, '_' + name)[:len(indices)] = getattr(self, '_' + name)[:self._size][indices]
+        result._size = len(indices)
+        result.names = list(self.names)
+        result._name_ids = dict(self._name_ids)
+        if self._extras:
+            positions = {int(j): k for k, j in enumerate(indices)}
+            for j, extras in self._extras.items():
+                k = positions.get(j)
+                if k is not None:
+                    result._extras[k] = copy.deepcopy(extras)
+        return result
+
+    def shift_times(self, delta: float, start: int = 0, stop: Optional[int] = None):
+        """Adds `delta` to the timestamps of rows [start, stop)."""
+        stop = self._size if stop is None else stop
+        self._time[start:stop] += delta
+
+    # --- Serialization ---
+    def serialize(self, i: int) -> Optional[dict]:
+        """Row i in the JSON macro file format."""
+        event_time = float(self._time[i])
+        kind = self._kind[i]
+        if kind == KIND_LOGIC:
+            event_dict = {'time': event_time}
+            event_dict.update(self._extras.get(i, {}))
+            return event_dict
+
+        event_dict = {'time': event_time}
+        event_dict.update(self._extras.get(i, {}))
+        if kind == KIND_KEY:
+            event_dict['type'] = 'keyboard'
+            event_dict['event_type'] = self.event_type_name(i)
+            event_dict['name'] = self.key_name(i)
+            event_dict['scan_code'] = int(self._scan_code[i])
+        elif kind == KIND_MOVE:
+            event_dict['type'] = 'mouse_move'
+            event_dict['x'] = int(self._x[i])
+            event_dict['y'] = int(self._y[i])
+        elif kind == KIND_BUTTON:
+            event_dict['type'] = 'mouse_button'
+            event_dict['event_type'] = self.event_type_name(i)
+            event_dict['button'] = MOUSE_BUTTONS[self._button[i]]
+            pos = self.get_pos(i)
+            if pos: event_dict['pos'] = pos
+        elif kind == KIND_WHEEL:
+            event_dict['type'] = 'mouse_wheel'
+            event_dict['delta'] = self.wheel_delta(i)
+        else:
+            return None
+        return event_dict
+
+    def to_serialized(self) -> list[dict]:
+        return [event_dict for event_dict in (self.serialize(i) for i in range(self._size)) if event_dict is not None]
@@ -1,6 +1,8 @@
 import keyboard
 import mouse
 
+from event_store import EventStore
+
 def get_event_obj(event):
     """Helper to extract the event object from a macro data entry."""
     return event[1]['obj']
@@ -83,7 +85,7 @@ def remove_redundant_paste_events(events):
     if not events:
         return events
 
-    cleaned_events = []
+    kept_indices = []
     skip_indices = set()
     
     win_v_detected_time = 0
@@ -118,7 +120,7 @@ def remove_redundant_paste_events(events):
             
         evt_time, evt_data = events[i]
         if 'obj' not in evt_data:
-            cleaned_events.append(events[i])
+            kept_indices.append(i)
             continue
             
         evt_obj = evt_data['obj']
@@ -183,21 +185,16 @@ def remove_redundant_paste_events(events):
                     skip_indices.update(indices_to_remove)
                     win_v_detected_time = 0 # Reset detection
                     
-        cleaned_events.append(events[i])
+        kept_indices.append(i)
 
-    return cleaned_events
+    if isinstance(events, EventStore):
+        return events.take(kept_indices)
+    return [events[i] for i in kept_indices]
 
-import ctypes
+import screen_provider
 
 def get_pixel_color(x, y):
-    hdc = ctypes.windll.user32.GetDC(0)
-    color = ctypes.windll.gdi32.GetPixel(hdc, x, y)
-    ctypes.windll.user32.ReleaseDC(0, hdc)
-    # Color is BGR in Windows GDI
-    r = color & 0xFF
-    g = (color >> 8) & 0xFF
-    b = (color >> 16) & 0xFF
-    return (r, g, b)
+    return screen_provider.get_default_screen().get_pixel(x, y)
 
 def rgb_to_hex(rgb):
     return "#{:02x}{:02x}{:02x}".format(rgb[0], rgb[1], rgb[2])
@@ -1,39 +1,35 @@
+from input_dispatcher import get_dispatcher
 
-import keyboard
-import threading
-import time
+RECORD_HOTKEY = 'ctrl+alt+f5'
+PLAY_HOTKEY = 'ctrl+alt+f6'
+STOP_HOTKEY = 'ctrl+alt+f7'
 
 class HotkeyManager:
-    def __init__(self, on_record_hotkey, on_play_hotkey, on_stop_hotkey):
+    def __init__(self, on_record_hotkey, on_play_hotkey, on_stop_hotkey, dispatcher=None):
         self.on_record_hotkey = on_record_hotkey
         self.on_play_hotkey = on_play_hotkey
         self.on_stop_hotkey = on_stop_hotkey
+        self.dispatcher = dispatcher
         self.running = False
-
-    def _listen(self):
-        # Register hotkeys
-        keyboard.add_hotkey('ctrl+alt+f5', self.on_record_hotkey)
-        keyboard.add_hotkey('ctrl+alt+f6', self.on_play_hotkey)
-        keyboard.add_hotkey('ctrl+alt+f7', self.on_stop_hotkey)
-
-        # Keep the thread alive to listen for hotkeys
-        while self.running:
-            time.sleep(0.1)
-
-        # Clean up hooks in the same thread that created them.
-        keyboard.clear_all_hotkeys()
+        self._subscriptions = []
 
     def start(self):
         if self.running:
             return
         self.running = True
-        self.thread = threading.Thread(target=self._listen, daemon=True)
-        self.thread.start()
+        # Hotkeys are entries in the shared input dispatcher; no listener thread of our own
+        if self.dispatcher is None:
+            self.dispatcher = get_dispatcher()
+        self._subscriptions = [
+            self.dispatcher.add_hotkey(RECORD_HOTKEY, self.on_record_hotkey),
+            self.dispatcher.add_hotkey(PLAY_HOTKEY, self.on_play_hotkey),
+            self.dispatcher.add_hotkey(STOP_HOTKEY, self.on_stop_hotkey),
+        ]
 
     def stop(self):
         if not self.running:
             return
         self.running = False
-        # Wait for the listener thread to finish its cleanup.
-        if self.thread:
-            self.thread.join()
+        for subscription in self._subscriptions:
+            self.dispatcher.remove(subscription)
+        self._subscriptions = []
@@ -0,0 +1,211 @@
+"""
+Template image search for the Macro Editor (wait_image / click_image).
+
+Matching is normalized cross-correlation (NCC) on grayscale images, so a
+match survives uniform brightness and contrast changes. The score is 1.0
+for a perfect match.
+
+The search runs coarse-to-fine. Frame and template are halved a few
+times. The coarsest level is correlated everywhere in the search region
+(region of interest, ROI) with one FFT. The best candidates are then
+refined level by level in a small neighbourhood, and only the full
+resolution score is compared with the threshold.
+
+Templates are stored as .npy (RGB uint8) files; PNG and other formats load
+when Pillow is installed. Loaded templates are cached in their
+preprocessed (zero-mean pyramid) form, keyed by path and modification
+time.
+"""
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from screen_provider import ScreenProvider
+
+DEFAULT_THRESHOLD = 0.9
+MAX_LEVELS = 3            # Pyramid levels below full resolution
+MIN_TEMPLATE_SIDE = 8     # Don't shrink the template below this at the coarsest level
+CANDIDATES = 5            # Coarse positions refined at each finer level
+REFINE_RADIUS = 2         # Pixels searched around each candidate at the finer level
+TEMPLATE_DIR = "templates"
+MIN_WINDOW_VARIANCE = 0.25  # Per pixel; flatter windows (std below half a gray level) score 0
+
+
+class ImageMatch(NamedTuple):
+    x: int          # Center of the match, in screen coordinates
+    y: int
+    left: int
+    top: int
+    score: float
+
+
+def to_gray(rgb: np.ndarray) -> np.ndarray:
+    """(h, w, 3) RGB -> (h, w) float32 luma."""
+    rgb = np.asarray(rgb, dtype=np.float32)
+    return rgb[..., 0] * 0.299 + rgb[..., 1] * 0.587 + rgb[..., 2] * 0.114
+
+
+def downsample(gray: np.ndarray) -> np.ndarray:
+    """Halves an image by averaging 2x2 blocks (an odd last row/column is dropped)."""
+    h, w = gray.shape[0] // 2 * 2, gray.shape[1] // 2 * 2
+    g = gray[:h, :w]
+    return (g[0::2, 0::2] + g[1::2, 0::2] + g[0::2, 1::2] + g[1::2, 1::2]) * 0.25
+
+
+class Template:
+    """A template, preprocessed for matching: zero-mean grayscale at every pyramid level."""
+
+    def __init__(self, rgb: np.ndarray):
+        rgb = np.asarray(rgb, dtype=np.uint8)
+        if rgb.ndim != 3 or rgb.shape[2] < 3:
+            raise ValueError("Template must be an (h, w, 3) RGB image.")
+        self.rgb = rgb[:, :, :3]
+        self.height, self.width = rgb.shape[:2]
+        self.levels = []        # (zero-mean template, its L2 norm), full resolution first
+        gray = to_gray(self.rgb)
+        while True:
+            zero_mean = gray - gray.mean()
+            norm = float(np.sqrt((zero_mean * zero_mean).sum()))
+            self.levels.append((zero_mean, norm))
+            if len(self.levels) > MAX_LEVELS or min(gray.shape) // 2 < MIN_TEMPLATE_SIDE:
+                break
+            gray = downsample(gray)
+        if self.levels[0][1] < 1e-3:
+            raise ValueError("Template is a single flat color; use a color condition instead.")
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def load_template(path: str) -> Template:
+    """Loads (or returns the cached) preprocessed template for an image file."""
+    mtime = os.path.getmtime(path)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    if path.lower().endswith('.npy'):
+        rgb = np.load(path)
+    else:
+        try:
+            from PIL import Image
+        except ImportError:
+            raise ImportError("Loading image files other than .npy needs Pillow (pip install pillow).")
+        with Image.open(path) as image:
+            rgb = np.asarray(image.convert('RGB'))
+    template = Template(rgb)
+    with _cache_lock:
+        _cache[path] = (mtime, template)
+    return template
+
+
+def save_template(rgb: np.ndarray, directory: str = TEMPLATE_DIR) -> str:
+    """Saves a captured template as .npy and returns its path."""
+    Template(rgb)  # Reject flat captures before writing anything
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, time.strftime("template_%Y%m%d_%H%M%S") + f"_{int(time.time() * 1000) % 1000:03d}.npy")
+    np.save(path, np.asarray(rgb, dtype=np.uint8))
+    return path
+
+
+def _window_sums(image: np.ndarray, h: int, w: int):
+    """Sum and sum of squares of every h x w window ('valid' positions), via integral images."""
+    padded = np.zeros((image.shape[0] + 1, image.shape[1] + 1), dtype=np.float64)
+    padded[1:, 1:] = image
+    s1 = padded.cumsum(0).cumsum(1)
+    padded[1:, 1:] = image.astype(np.float64) ** 2
+    s2 = padded.cumsum(0).cumsum(1)
+    window = lambda s: s[h:, w:] - s[:-h, w:] - s[h:, :-w] + s[:-h, :-w]
+    return window(s1), window(s2)
+
+
+def _ncc_map(image: np.ndarray, zero_mean: np.ndarray, norm: float) -> np.ndarray:
+    """NCC of the template at every valid position of the image (FFT correlation)."""
+    h, w = zero_mean.shape
+    H, W = image.shape
+    fft_shape = (H, W)
+    spectrum = np.fft.rfft2(image, fft_shape) * np.conj(np.fft.rfft2(zero_mean, fft_shape))
+    numerator = np.fft.irfft2(spectrum, fft_shape)[:H - h + 1, :W - w + 1]
+    sums, squares = _window_sums(image, h, w)
+    variance = squares - sums * sums / (h * w)
+    # Flat windows: the variance is mostly rounding error there, and would blow the score up
+    textured = variance > MIN_WINDOW_VARIANCE * h * w
+    denominator = np.sqrt(np.maximum(variance, 0.0)) * norm
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=textured)
+
+
+def _ncc_at(image: np.ndarray, zero_mean: np.ndarray, norm: float, top: int, left: int, radius: int):
+    """NCC at every position within `radius` of (top, left). Returns (score, top, left) of the best."""
+    h, w = zero_mean.shape
+    y0, x0 = max(top - radius, 0), max(left - radius, 0)
+    y1, x1 = min(top + radius, image.shape[0] - h), min(left + radius, image.shape[1] - w)
+    if y1 < y0 or x1 < x0:
+        return -1.0, top, left
+    patch = image[y0:y1 + h, x0:x1 + w].astype(np.float64)  # Sums of squares lose too much in float32
+    windows = np.lib.stride_tricks.sliding_window_view(patch, (h, w))  # (ny, nx, h, w)
+    numerator = np.einsum('ijkl,kl->ij', windows, zero_mean, optimize=True)
+    sums = windows.sum(axis=(2, 3))
+    squares = np.einsum('ijkl,ijkl->ij', windows, windows, optimize=True)
+    variance = squares - sums * sums / (h * w)
+    denominator = np.sqrt(np.maximum(variance, 0.0)) * norm
+    scores = np.divide(numerator, denominator, out=np.zeros_like(numerator), where=variance > MIN_WINDOW_VARIANCE * h * w)
+    best = np.unravel_index(int(np.argmax(scores)), scores.shape)
+    return float(scores[best]), y0 + int(best[0]), x0 + int(best[1])
+
+
+def match_in_frame(frame_rgb: np.ndarray, template: Template) -> Optional[tuple[float, int, int]]:
+    """Best (score, top, left) of the template in an RGB frame, or None if it doesn't fit."""
+    gray = to_gray(frame_rgb)
+    if gray.shape[0] < template.height or gray.shape[1] < template.width:
+        return None
+    pyramid = [gray]
+    for zero_mean, _ in template.levels[1:]:
+        smaller = downsample(pyramid[-1])
+        if smaller.shape[0] < zero_mean.shape[0] or smaller.shape[1] < zero_mean.shape[1]:
+            break
+        pyramid.append(smaller)
+    level = len(pyramid) - 1
+
+    # Coarsest level: every position, keep the best few (at least one pyramid cell apart)
+    scores = _ncc_map(pyramid[level], *template.levels[level])
+    flat = scores.ravel()
+    count = min(CANDIDATES * 4, flat.size)
+    order = np.argpartition(flat, -count)[-count:]
+    order = order[np.argsort(flat[order])[::-1]]
+    candidates = []
+    for index in order:
+        top, left = divmod(int(index), scores.shape[1])
+        if all(abs(top - t) > 1 or abs(left - l) > 1 for _, t, l in candidates):
+            candidates.append((float(flat[index]), top, left))
+            if len(candidates) == CANDIDATES:
+                break
+
+    # Finer levels: refine each candidate around its upscaled position
+    while level > 0:
+        level -= 1
+        refined = [_ncc_at(pyramid[level], *template.levels[level], top * 2, left * 2, REFINE_RADIUS)
+                   for _, top, left in candidates]
+        candidates = sorted(refined, reverse=True)[:CANDIDATES]
+    return candidates[0]
+
+
+def find_template(screen: ScreenProvider, template: Template, roi=None,
+                  threshold: float = DEFAULT_THRESHOLD) -> Optional[ImageMatch]:
+    """
+    Searches roi = (left, top, width, height), or the whole screen if None,
+    and returns the best match scoring at least `threshold`, or None.
+    """
+    if roi is None:
+        roi = (0, 0) + tuple(screen.size())
+    left, top, width, height = (int(v) for v in roi)
+    frame = screen.grab(left, top, width, height)
+    best = match_in_frame(frame, template)
+    if best is None or best[0] < threshold:
+        return None
+    score, match_top, match_left = best
+    return ImageMatch(left + match_left + template.width // 2, top + match_top + template.height // 2,
+                      left + match_left, top + match_top, score)
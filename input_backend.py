@@ -0,0 +1,249 @@
+"""
+Input injection backends for the Macro Editor.
+
+Player and Recorder talk to the OS exclusively through an InputBackend, so
+playback and recording can run headless (e.g. on Linux build boxes) by
+swapping in the FakeInputBackend.
+"""
+import threading
+import time
+from typing import Any, Callable, NamedTuple, Optional
+
+
+class InputBackend:
+    """
+    Interface for injecting and hooking keyboard/mouse input.
+
+    Keys are either scan codes (int) or key names (str), exactly as accepted
+    by the `keyboard` library. Hook callbacks receive `keyboard`/`mouse`
+    library event objects.
+    """
+
+    # --- Mouse ---
+    def move(self, x: int, y: int) -> None:
+        raise NotImplementedError
+
+    def press(self, button: str) -> None:
+        raise NotImplementedError
+
+    def release(self, button: str) -> None:
+        raise NotImplementedError
+
+    def click(self, button: str) -> None:
+        raise NotImplementedError
+
+    def double_click(self, button: str) -> None:
+        raise NotImplementedError
+
+    def drag(self, start_x: int, start_y: int, end_x: int, end_y: int, duration: float = 0.2) -> None:
+        raise NotImplementedError
+
+    def wheel(self, delta: float) -> None:
+        raise NotImplementedError
+
+    def get_position(self) -> tuple[int, int]:
+        raise NotImplementedError
+
+    # --- Keyboard ---
+    def key_press(self, key) -> None:
+        raise NotImplementedError
+
+    def key_release(self, key) -> None:
+        raise NotImplementedError
+
+    def key_tap(self, key) -> None:
+        raise NotImplementedError
+
+    def write(self, text: str) -> None:
+        raise NotImplementedError
+
+    # --- Hooks ---
+    def hook_keyboard(self, callback: Callable) -> Any:
+        raise NotImplementedError
+
+    def unhook_keyboard(self, handle: Any) -> None:
+        raise NotImplementedError
+
+    def hook_mouse(self, callback: Callable) -> Any:
+        raise NotImplementedError
+
+    def unhook_mouse(self, handle: Any) -> None:
+        raise NotImplementedError
+
+
+class KeyboardMouseBackend(InputBackend):
+    """The real backend, built on the `keyboard` and `mouse` libraries."""
+
+    def __init__(self):
+        import keyboard
+        import mouse
+        self._keyboard = keyboard
+        self._mouse = mouse
+
+    def move(self, x, y):
+        self._mouse.move(x, y)
+
+    def press(self, button):
+        self._mouse.press(button)
+
+    def release(self, button):
+        self._mouse.release(button)
+
+    def click(self, button):
+        self._mouse.click(button)
+
+    def double_click(self, button):
+        self._mouse.double_click(button)
+
+    def drag(self, start_x, start_y, end_x, end_y, duration=0.2):
+        self._mouse.drag(start_x, start_y, end_x, end_y, absolute=True, duration=duration)
+
+    def wheel(self, delta):
+        self._mouse.wheel(delta)
+
+    def get_position(self):
+        return self._mouse.get_position()
+
+    def key_press(self, key):
+        self._keyboard.press(key)
+
+    def key_release(self, key):
+        self._keyboard.release(key)
+
+    def key_tap(self, key):
+        self._keyboard.press_and_release(key)
+
+    def write(self, text):
+        self._keyboard.write(text)
+
+    def hook_keyboard(self, callback):
+        return self._keyboard.hook(callback)
+
+    def unhook_keyboard(self, handle):
+        self._keyboard.unhook(handle)
+
+    def hook_mouse(self, callback):
+        return self._mouse.hook(callback)
+
+    def unhook_mouse(self, handle):
+        self._mouse.unhook(handle)
+
+
+class InjectedOp(NamedTuple):
+    """One operation recorded by the FakeInputBackend."""
+    t_ns: int       # time.perf_counter_ns() at injection
+    op: str         # Backend method name, e.g. 'move', 'key_press'
+    args: tuple
+
+
+class FakeInputBackend(InputBackend):
+    """
+    In-memory backend for headless playback and benchmarks.
+
+    Every injected operation is appended to `log` with a perf_counter_ns
+    timestamp. Hooked callbacks can be driven with emit_keyboard/emit_mouse.
+    """
+
+    def __init__(self, position=(0, 0)):
+        self.log: list[InjectedOp] = []
+        self.position = tuple(position)
+        self._keyboard_hooks = []
+        self._mouse_hooks = []
+        self._lock = threading.Lock()
+
+    def _record(self, op, *args):
+        self.log.append(InjectedOp(time.perf_counter_ns(), op, args))
+
+    def clear(self):
+        self.log.clear()
+
+    def ops(self, op: Optional[str] = None) -> list[InjectedOp]:
+        """Returns the logged operations, optionally filtered by name."""
+        if op is None:
+            return list(self.log)
+        return [entry for entry in self.log if entry.op == op]
+
+    def move(self, x, y):
+        self.position = (x, y)
+        self._record('move', x, y)
+
+    def press(self, button):
+        self._record('press', button)
+
+    def release(self, button):
+        self._record('release', button)
+
+    def click(self, button):
+        self._record('click', button)
+
+    def double_click(self, button):
+        self._record('double_click', button)
+
+    def drag(self, start_x, start_y, end_x, end_y, duration=0.2):
+        self.position = (end_x, end_y)
+        self._record('drag', start_x, start_y, end_x, end_y, duration)
+
+    def wheel(self, delta):
+        self._record('wheel', delta)
+
+    def get_position(self):
+        return self.position
+
+    def key_press(self, key):
+        self._record('key_press', key)
+
+    def key_release(self, key):
+        self._record('key_release', key)
+
+    def key_tap(self, key):
+        self._record('key_tap', key)
+
+    def write(self, text):
+        self._record('write', text)
+
+    def hook_keyboard(self, callback):
+        with self._lock:
+            self._keyboard_hooks.append(callback)
+        return callback
+
+    def unhook_keyboard(self, handle):
+        with self._lock:
+            if handle in self._keyboard_hooks:
+                self._keyboard_hooks.remove(handle)
+
+    def hook_mouse(self, callback):
+        with self._lock:
+            self._mouse_hooks.append(callback)
+        return callback
+
+    def unhook_mouse(self, handle):
+        with self._lock:
+            if handle in self._mouse_hooks:
+                self._mouse_hooks.remove(handle)
+
+    def emit_keyboard(self, event):
+        """Delivers a synthetic keyboard event to every keyboard hook."""
+        with self._lock:
+            hooks = list(self._keyboard_hooks)
+        for callback in hooks:
+            callback(event)
+
+    def emit_mouse(self, event):
+        """Delivers a synthetic mouse event to every mouse hook."""
+        if hasattr(event, 'x') and hasattr(event, 'y'):
+            self.position = (event.x, event.y)
+        with self._lock:
+            hooks = list(self._mouse_hooks)
+        for callback in hooks:
+            callback(event)
+
+
+_default_backend = None
+
+
+def get_default_backend() -> InputBackend:
+    """Returns the shared KeyboardMouseBackend, creating it on first use."""
+    global _default_backend
+    if _default_backend is None:
+        _default_backend = KeyboardMouseBackend()
+    return _default_backend
@@ -0,0 +1,193 @@
+"""
+Single input hook for the Macro Editor.
+
+Every feature that listens to the keyboard or mouse (global hotkeys, quick
+slots, the player's ESC emergency stop, the screen pickers and the
+recorder) subscribes here instead of installing its own hook or polling
+key state. The dispatcher owns one keyboard hook and one mouse hook on the
+InputBackend, installed while anyone is subscribed.
+
+Events are routed through lookup tables that are rebuilt when a
+subscription changes and only read on the event path:
+
+- raw subscribers get every keyboard / mouse event (the recorder),
+- key listeners are looked up by (key name, 'down'/'up'),
+- hotkeys are looked up by their main key on key-down and compared with
+  the set of modifiers currently held. A hotkey fires once per press, not
+  on auto-repeat.
+
+Callbacks run on the hook thread and must return quickly; GUI work should
+be handed to the Tk thread.
+"""
+import threading
+from typing import Callable, Optional
+
+from input_backend import InputBackend, get_default_backend
+
+# Key names as reported by the keyboard library -> the modifier they stand for
+_MODIFIER_NAMES = {
+    'ctrl': 'ctrl', 'left ctrl': 'ctrl', 'right ctrl': 'ctrl',
+    'alt': 'alt', 'left alt': 'alt', 'right alt': 'alt', 'alt gr': 'alt',
+    'shift': 'shift', 'left shift': 'shift', 'right shift': 'shift',
+    'windows': 'windows', 'left windows': 'windows', 'right windows': 'windows', 'win': 'windows',
+}
+
+
+def parse_hotkey(hotkey: str) -> tuple[frozenset, str]:
+    """'ctrl+alt+f5' -> (frozenset({'ctrl', 'alt'}), 'f5')."""
+    parts = [part.strip().lower() for part in hotkey.split('+')]
+    if not parts or not parts[-1]:
+        raise ValueError(f"Invalid hotkey: {hotkey!r}")
+    modifiers = []
+    for part in parts[:-1]:
+        if part not in _MODIFIER_NAMES:
+            raise ValueError(f"Unknown modifier {part!r} in hotkey {hotkey!r}")
+        modifiers.append(_MODIFIER_NAMES[part])
+    return frozenset(modifiers), parts[-1]
+
+
+class _Subscription:
+    """Handle returned by the add_* methods; pass it to remove()."""
+    __slots__ = ('kind', 'key', 'callback')
+
+    def __init__(self, kind, key, callback):
+        self.kind = kind          # 'keyboard', 'mouse', 'key' or 'hotkey'
+        self.key = key            # None, (name, event_type) or (modifiers, name)
+        self.callback = callback
+
+
+class InputDispatcher:
+    def __init__(self, backend: Optional[InputBackend] = None, log_callback=None):
+        self.backend = backend if backend else get_default_backend()
+        self.log_callback = log_callback
+        self._lock = threading.Lock()
+        self._subscriptions: list[_Subscription] = []
+        self._keyboard_handle = None
+        self._mouse_handle = None
+        self._pressed = set()     # Key names currently held (seen by our hook)
+        # Lookup tables, replaced as a whole by _rebuild()
+        self._raw_keyboard = ()
+        self._raw_mouse = ()
+        self._key_listeners = {}
+        self._hotkeys = {}
+
+    # --- Subscribing (any thread) ---
+    def add_keyboard_listener(self, callback: Callable) -> _Subscription:
+        """Every keyboard event."""
+        return self._add(_Subscription('keyboard', None, callback))
+
+    def add_mouse_listener(self, callback: Callable) -> _Subscription:
+        """Every mouse event."""
+        return self._add(_Subscription('mouse', None, callback))
+
+    def add_key_listener(self, name: str, callback: Callable, event_type: str = 'down') -> _Subscription:
+        """callback(event) for every 'down' (including auto-repeat) or 'up' event of one key."""
+        return self._add(_Subscription('key', (name.lower(), event_type), callback))
+
+    def add_hotkey(self, hotkey: str, callback: Callable[[], None]) -> _Subscription:
+        """callback() when the key combination (e.g. 'ctrl+alt+f5') is pressed."""
+        return self._add(_Subscription('hotkey', parse_hotkey(hotkey), callback))
+
+    def remove(self, subscription: Optional[_Subscription]):
+        if subscription is None:
+            return
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+                self._rebuild()
+
+    def _add(self, subscription):
+        with self._lock:
+            self._subscriptions.append(subscription)
+            self._rebuild()
+        return subscription
+
+    def _rebuild(self):
+        """Recomputes the lookup tables and (un)installs the hooks. Called with the lock held."""
+        raw_keyboard, raw_mouse, key_listeners, hotkeys = [], [], {}, {}
+        for sub in self._subscriptions:
+            if sub.kind == 'keyboard':
+                raw_keyboard.append(sub.callback)
+            elif sub.kind == 'mouse':
+                raw_mouse.append(sub.callback)
+            elif sub.kind == 'key':
+                key_listeners.setdefault(sub.key, []).append(sub.callback)
+            else:
+                modifiers, name = sub.key
+                hotkeys.setdefault(name, []).append((modifiers, sub.callback))
+        self._raw_keyboard = tuple(raw_keyboard)
+        self._raw_mouse = tuple(raw_mouse)
+        self._key_listeners = {key: tuple(callbacks) for key, callbacks in key_listeners.items()}
+        self._hotkeys = {name: tuple(entries) for name, entries in hotkeys.items()}
+
+        wants_keyboard = bool(raw_keyboard or key_listeners or hotkeys)
+        if wants_keyboard and self._keyboard_handle is None:
+            self._keyboard_handle = self.backend.hook_keyboard(self._on_keyboard)
+        elif not wants_keyboard and self._keyboard_handle is not None:
+            self.backend.unhook_keyboard(self._keyboard_handle)
+            self._keyboard_handle = None
+            self._pressed.clear()
+        if raw_mouse and self._mouse_handle is None:
+            self._mouse_handle = self.backend.hook_mouse(self._on_mouse)
+        elif not raw_mouse and self._mouse_handle is not None:
+            self.backend.unhook_mouse(self._mouse_handle)
+            self._mouse_handle = None
+
+    # --- Dispatch (hook threads) ---
+    def _on_keyboard(self, event):
+        name = (event.name or '').lower()
+        event_type = event.event_type
+        repeat = False
+        if event_type == 'down':
+            repeat = name in self._pressed
+            self._pressed.add(name)
+        else:
+            self._pressed.discard(name)
+
+        for callback in self._raw_keyboard:
+            self._call(callback, event)
+        listeners = self._key_listeners.get((name, event_type))
+        if listeners:
+            for callback in listeners:
+                self._call(callback, event)
+        if event_type == 'down' and not repeat:
+            hotkeys = self._hotkeys.get(name)
+            if hotkeys:
+                held = frozenset(_MODIFIER_NAMES[key] for key in self._pressed if key in _MODIFIER_NAMES and key != name)
+                for modifiers, callback in hotkeys:
+                    if modifiers == held:
+                        self._call(callback)
+
+    def _on_mouse(self, event):
+        for callback in self._raw_mouse:
+            self._call(callback, event)
+
+    def _call(self, callback, *args):
+        # One failing subscriber must not keep the event from the others
+        try:
+            callback(*args)
+        except Exception as e:
+            log_callback = self.log_callback
+            if log_callback:
+                log_callback(f"Input handler error: {e}")
+
+
+_dispatchers = {}
+_dispatchers_lock = threading.Lock()
+
+
+def get_dispatcher(backend: Optional[InputBackend] = None, log_callback=None) -> InputDispatcher:
+    """
+    The shared dispatcher of a backend (the default backend if None),
+    created on first use. A log_callback, if given, receives the errors of
+    all its subscribers from then on (the app passes its log once at startup).
+    """
+    backend = backend if backend else get_default_backend()
+    with _dispatchers_lock:
+        dispatcher = _dispatchers.get(backend)
+        if dispatcher is None:
+            dispatcher = InputDispatcher(backend)
+            _dispatchers[backend] = dispatcher
+        if log_callback:
+            dispatcher.log_callback = log_callback
+        return dispatcher
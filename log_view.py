@@ -0,0 +1,54 @@
+"""
+Bounded log pane for the Macro Editor.
+
+LogView keeps a tk.Text log as a fixed-capacity ring: lines are appended
+in batched chunks, and once the widget holds `capacity + trim_chunk` lines
+the oldest lines are deleted in one operation, so the widget never grows
+without limit and trimming is rare. The full history is in the log file.
+
+The view only follows new lines when it is already scrolled to the bottom;
+if the user scrolled up to read something, the visible lines stay put.
+"""
+import tkinter as tk
+
+DEFAULT_CAPACITY = 5000
+DEFAULT_TRIM_CHUNK = 500
+
+
+class LogView:
+    def __init__(self, text_widget: tk.Text, capacity: int = DEFAULT_CAPACITY, trim_chunk: int = DEFAULT_TRIM_CHUNK):
+        self.text = text_widget
+        self.capacity = capacity
+        self.trim_chunk = trim_chunk
+        self.line_count = 0
+
+    def append(self, lines: list[str]):
+        if not lines:
+            return
+        if len(lines) > self.capacity:
+            lines = lines[-self.capacity:]
+        at_bottom = self.text.yview()[1] >= 0.999
+        top_line = int(self.text.index("@0,0").split('.')[0])
+
+        self.text.config(state='normal')
+        self.text.insert(tk.END, "\n".join(lines) + "\n")
+        self.line_count += len(lines)
+
+        trimmed = 0
+        if self.line_count > self.capacity + self.trim_chunk:
+            trimmed = self.line_count - self.capacity
+            self.text.delete("1.0", f"{trimmed + 1}.0")
+            self.line_count = self.capacity
+        self.text.config(state='disabled')
+
+        if at_bottom:
+            self.text.see(tk.END)
+        elif trimmed:
+            # Keep the lines the user is reading in place
+            self.text.yview(f"{max(top_line - trimmed, 1)}.0")
+
+    def clear(self):
+        self.text.config(state='normal')
+        self.text.delete("1.0", tk.END)
+        self.text.config(state='disabled')
+        self.line_count = 0
@@ -0,0 +1,145 @@
+"""
+Asynchronous, levelled log file writer for the Macro Editor.
+
+Callers (player, recorder and grouper threads, the Tk thread) only put a
+record on a bounded queue; a background thread formats the records, writes
+them in batches to a file that stays open, and rotates it by size. Nothing
+on the caller's side touches the disk, and a full queue drops records
+(counted and reported in the file) instead of blocking.
+
+Records below the writer's level are rejected before they are queued.
+Hot-path callers should check `enabled_for(DEBUG)` (or receive no debug
+callback at all) so filtered messages are never even formatted.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+DEFAULT_QUEUE_SIZE = 10000
+MAX_BATCH = 1000
+
+_STOP = object()
+
+
+class LogWriter:
+    def __init__(self, path: str, level: int = INFO, max_bytes: int = DEFAULT_MAX_BYTES,
+                 backup_count: int = DEFAULT_BACKUP_COUNT, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 error_callback: Optional[Callable[[str], None]] = None):
+        self.path = path
+        self.level = level
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.error_callback = error_callback
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._dropped = 0
+        self._dropped_lock = threading.Lock()
+        self._file = None
+        self._size = 0
+        self._failing = False
+        self._thread = threading.Thread(target=self._run, name="LogWriter", daemon=True)
+        self._thread.start()
+
+    def enabled_for(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, message: str, level: int = INFO):
+        """Queues one record. Never blocks; drops the record if the queue is full."""
+        if level < self.level:
+            return
+        try:
+            self._queue.put_nowait((time.time(), level, message))
+        except queue.Full:
+            with self._dropped_lock:
+                self._dropped += 1
+
+    def debug(self, message: str):
+        self.log(message, DEBUG)
+
+    def close(self, timeout: float = 2.0):
+        """Flushes the queued records and stops the writer thread."""
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    # --- Writer thread ---
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < MAX_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = any(record is _STOP for record in batch)
+            records = [record for record in batch if record is not _STOP]
+            self._write_batch(records)
+            if stopping:
+                self._close_file()
+                return
+
+    def _format(self, record) -> str:
+        timestamp, level, message = record
+        prefix = time.strftime("[%Y-%m-%d %H:%M:%S]", time.localtime(timestamp))
+        if level == INFO:
+            return f"{prefix} {message}"
+        return f"{prefix} [{logging.getLevelName(level)}] {message}"
+
+    def _write_batch(self, records):
+        with self._dropped_lock:
+            dropped, self._dropped = self._dropped, 0
+        lines = [self._format(record) for record in records]
+        if dropped:
+            lines.append(self._format((time.time(), WARNING, f"Log queue full; dropped {dropped} record(s).")))
+        if not lines:
+            return
+        data = ("\n".join(lines) + "\n").encode('utf-8')
+
+        try:
+            if self._file is None:
+                self._file = open(self.path, 'ab')
+                self._size = self._file.tell()
+            if self._size and self._size + len(data) > self.max_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+            self._failing = False
+        except OSError as e:
+            self._close_file()
+            if not self._failing and self.error_callback:
+                # Report once per failure streak, not once per batch
+                self.error_callback(f"Could not write to log file: {e}")
+            self._failing = True
+
+    def _rotate(self):
+        self._close_file()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'ab')
+        self._size = 0
+
+    def _close_file(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
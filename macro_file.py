@@ -0,0 +1,237 @@
+"""
+Macro file I/O for the Macro Editor.
+
+Two on-disk formats are supported and convert losslessly into each other:
+
+* JSON (`.json`): the original human-readable format.
+* Binary (`.mcrb`): a versioned container holding the EventStore columns as
+  raw little-endian arrays, followed by a JSON metadata section (mode,
+  origin, interned key names, per-event extras, grouped actions).
+
+Binary files are opened with a copy-on-write `mmap`, and the columns become
+NumPy views into the mapping, so loading does not copy or parse events.
+Pages are only copied when an edit writes to them, and the file on disk is
+never modified. Windows can't replace a file that is still mapped, so
+saving over a loaded .mcrb first copies the columns of every store mapped
+from it (EventStore.detach), which closes the mapping.
+
+Binary layout (all integers little-endian):
+
+    offset 0   magic      8 bytes  b'MACROBIN'
+    offset 8   version    uint16
+    offset 10  flags      uint16   (reserved, 0)
+    offset 12  reserved   uint32
+    offset 16  meta_off   uint64   offset of the UTF-8 JSON metadata
+    offset 24  meta_len   uint64
+    offset 32  columns    each column 8-byte aligned; offsets are in the metadata
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import weakref
+from typing import Optional
+
+import numpy as np
+
+from event_store import COLUMNS, EventStore
+from types_def import GroupedAction
+
+MAGIC = b'MACROBIN'
+FORMAT_VERSION = 1
+BINARY_EXTENSION = '.mcrb'
+_HEADER = struct.Struct('<8sHHIQQ')
+_ALIGN = 8
+
+
+# --- Grouped Actions ---
+def actions_to_dicts(actions: list[GroupedAction]) -> list[dict]:
+    return [{
+        'type': action.type,
+        'display_text': action.display_text,
+        'start_time': action.start_time,
+        'end_time': action.end_time,
+        'start_index': action.start_index,
+        'end_index': action.end_index,
+        'indices': action.indices,
+        'details': action.details
+    } for action in actions]
+
+
+def actions_from_dicts(action_dicts: list[dict]) -> list[GroupedAction]:
+    return [GroupedAction(
+        type=action_dict['type'],
+        display_text=action_dict['display_text'],
+        start_time=action_dict['start_time'],
+        end_time=action_dict['end_time'],
+        start_index=action_dict['start_index'],
+        end_index=action_dict['end_index'],
+        indices=action_dict.get('indices', []),
+        details=action_dict.get('details', {})
+    ) for action_dict in action_dicts]
+
+
+# --- Format Detection ---
+def is_binary_macro(file_path: str) -> bool:
+    with open(file_path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def _is_binary_path(file_path: str) -> bool:
+    return os.path.splitext(file_path)[1].lower() == BINARY_EXTENSION
+
+
+# --- Loading ---
+def load_macro(file_path: str) -> dict:
+    """
+    Loads a JSON or binary macro file (detected by content, not extension).
+
+    Returns a macro_data dict: 'mode', 'origin', 'events' (EventStore) and
+    'grouped_actions' (list of GroupedAction, empty if the file has none).
+    """
+    if is_binary_macro(file_path):
+        return _load_binary(file_path)
+    with open(file_path, 'r') as f:
+        loaded_data = json.load(f)
+    return {
+        'mode': loaded_data.get('mode', 'absolute'),
+        'origin': loaded_data.get('origin', (0, 0)),
+        'events': EventStore.from_serialized(loaded_data.get('events', [])),
+        'grouped_actions': actions_from_dicts(loaded_data.get('grouped_actions') or [])
+    }
+
+
+# Stores whose columns are views into a mapped .mcrb, keyed by the file's normalized path
+_mapped_stores: dict[str, weakref.WeakSet] = {}
+_mapped_lock = threading.Lock()
+
+
+def _path_key(file_path: str) -> str:
+    return os.path.normcase(os.path.realpath(file_path))
+
+
+def _load_binary(file_path: str) -> dict:
+    with open(file_path, 'rb') as f:
+        # ACCESS_COPY: writable, copy-on-write pages; edits never reach the file
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    if len(buffer) < _HEADER.size:
+        raise ValueError("Binary macro file is truncated.")
+    magic, version, _, _, meta_offset, meta_length = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a binary macro file.")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"Binary macro format version {version} is newer than supported ({FORMAT_VERSION}).")
+    if meta_offset + meta_length > len(buffer):
+        raise ValueError("Binary macro file is truncated.")
+
+    meta = json.loads(bytes(buffer[meta_offset:meta_offset + meta_length]).decode('utf-8'))
+    count = meta['count']
+    columns = {}
+    for name, (dtype_str, offset) in meta['columns'].items():
+        dtype = np.dtype(dtype_str)
+        if offset + count * dtype.itemsize > meta_offset:
+            raise ValueError(f"Column '{name}' overlaps the metadata section.")
+        columns[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset)
+    # Columns written in a foreign byte order or width are converted once
+    for name, dtype in COLUMNS:
+        if columns[name].dtype != dtype:
+            columns[name] = columns[name].astype(dtype)
+
+    extras = {row: data for row, data in meta.get('extras', [])}
+    events = EventStore.from_columns(columns, meta.get('names', []), extras)
+    with _mapped_lock:
+        _mapped_stores.setdefault(_path_key(file_path), weakref.WeakSet()).add(events)
+    return {
+        'mode': meta.get('mode', 'absolute'),
+        'origin': meta.get('origin', (0, 0)),
+        'events': events,
+        'grouped_actions': actions_from_dicts(meta.get('grouped_actions') or [])
+    }
+
+
+# --- Saving ---
+def save_macro(file_path: str, macro_data: dict, grouped_actions: Optional[list[GroupedAction]] = None):
+    """Saves macro_data as binary if the path ends in .mcrb, otherwise as JSON."""
+    if grouped_actions is None:
+        grouped_actions = macro_data.get('grouped_actions') or []
+    if _is_binary_path(file_path):
+        _save_binary(file_path, macro_data, grouped_actions)
+    else:
+        _save_json(file_path, macro_data, grouped_actions)
+
+
+def _save_json(file_path: str, macro_data: dict, grouped_actions: list[GroupedAction]):
+    events = EventStore.coerce(macro_data.get('events'))
+    serializable_macro_data = {
+        'mode': macro_data.get('mode', 'absolute'),
+        'origin': macro_data.get('origin', (0, 0)),
+        'events': events.to_serialized(),
+        'grouped_actions': actions_to_dicts(grouped_actions)
+    }
+    with open(file_path, 'w') as f:
+        json.dump(serializable_macro_data, f, indent=4)
+
+
+def _save_binary(file_path: str, macro_data: dict, grouped_actions: list[GroupedAction]):
+    events = EventStore.coerce(macro_data.get('events'))
+    arrays = events.column_arrays()
+
+    column_table = {}
+    offset = _HEADER.size + (-_HEADER.size % _ALIGN)
+    for name, dtype in COLUMNS:
+        column_table[name] = [np.dtype(dtype).newbyteorder('<').str, offset]
+        offset += arrays[name].nbytes
+        offset += -offset % _ALIGN
+
+    meta = {
+        'count': len(events),
+        'columns': column_table,
+        'mode': macro_data.get('mode', 'absolute'),
+        'origin': macro_data.get('origin', (0, 0)),
+        'names': events.names,
+        'extras': [[row, extras] for row, extras in events.extras_items()],
+        'grouped_actions': actions_to_dicts(grouped_actions)
+    }
+    meta_bytes = json.dumps(meta).encode('utf-8')
+
+    # Write to a temporary file first so a failed save never truncates the old macro
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, 0, offset, len(meta_bytes)))
+        for name, _ in COLUMNS:
+            dtype_str, column_offset = column_table[name]
+            f.write(b'\0' * (column_offset - f.tell()))
+            f.write(arrays[name].astype(dtype_str, copy=False).tobytes())
+        f.write(b'\0' * (offset - f.tell()))
+        f.write(meta_bytes)
+
+    # Release every mapping of the file we are about to replace (including the one being saved, if any)
+    del arrays, events
+    with _mapped_lock:
+        mapped = list(_mapped_stores.pop(_path_key(file_path), ()))
+    for store in mapped:
+        store.detach()
+    del mapped
+    try:
+        os.replace(tmp_path, file_path)
+    except OSError:
+        os.remove(tmp_path)
+        raise
+
+
+# --- Conversion ---
+def convert_macro(src_path: str, dst_path: str):
+    """Converts between JSON and binary; the output format follows dst_path's extension."""
+    macro_data = load_macro(src_path)
+    save_macro(dst_path, macro_data)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print(f"Usage: python {os.path.basename(__file__)} <source> <destination{BINARY_EXTENSION}|destination.json>")
+        sys.exit(1)
+    convert_macro(sys.argv[1], sys.argv[2])
+    print(f"Converted {sys.argv[1]} -> {sys.argv[2]}")
@@ -0,0 +1,255 @@
+"""
+Mouse path simplification for the Macro Editor.
+
+Distances are Synchronized Euclidean Distances (SED): a dropped point is
+compared with the position that linear interpolation between the kept
+points gives *at the dropped point's timestamp*. Keeping SED within the
+tolerance preserves both the shape of a path and the speed along it, so
+drags and hover-dependent UIs replay the way they were recorded.
+
+StreamingPathSimplifier does this on the fly while recording (an
+opening-window variant of Ramer-Douglas-Peucker), holding back at most one
+window of moves. simplify_paths() is the batch version for existing macros:
+a Ramer-Douglas-Peucker that splits every open segment of every path in the
+same vectorized NumPy pass.
+"""
+import math
+from typing import Any, NamedTuple, Optional
+
+import numpy as np
+
+from event_store import KIND_MOVE, EventStore
+from types_def import GroupedAction
+
+DEFAULT_TOLERANCE_PX = 2.0
+DEFAULT_MIN_INTERVAL = 0.01   # Seconds between candidate points
+DEFAULT_MAX_WINDOW = 100      # Longest run of points one kept segment may replace
+DEFAULT_MAX_INTERVAL = 0.25   # Seconds between kept points (batch); below HUMAN_PAUSE_THRESHOLD so regrouping is unchanged
+
+
+class PathPoint(NamedTuple):
+    time: float
+    x: float
+    y: float
+    payload: Any = None     # Whatever the caller stores for this point (e.g. the MoveEvent)
+
+
+def _sed(point: PathPoint, start: PathPoint, end: PathPoint) -> float:
+    span = end.time - start.time
+    ratio = (point.time - start.time) / span if span > 0 else 0.0
+    x = start.x + (end.x - start.x) * ratio
+    y = start.y + (end.y - start.y) * ratio
+    return math.hypot(point.x - x, point.y - y)
+
+
+class StreamingPathSimplifier:
+    """
+    Feed moves with add(); call flush() at every non-move event (button,
+    wheel, key, logic) and at the end of the stream. The first move after a
+    flush and the last move before it are always kept, so the points
+    adjacent to clicks and wheel events are exact.
+
+    Every point is checked against the tolerance, but only points at least
+    min_interval after the previous candidate may become kept points. The
+    interval gives way to the tolerance when no such point exists (e.g.
+    right after the cursor warps).
+    """
+
+    def __init__(self, tolerance_px: float = DEFAULT_TOLERANCE_PX, min_interval: float = DEFAULT_MIN_INTERVAL,
+                 max_window: int = DEFAULT_MAX_WINDOW):
+        self.tolerance_px = tolerance_px
+        self.min_interval = min_interval
+        self.max_window = max_window
+        self.received = 0
+        self.kept = 0
+        self._anchor = None             # Last kept point
+        self._window = []               # (point, eligible) since the anchor, all within tolerance of anchor -> window[-1]
+        self._last_candidate_time = 0.0
+
+    def add(self, point: PathPoint) -> list[PathPoint]:
+        """Returns the points to store now (in order)."""
+        self.received += 1
+        kept = []
+        pending = [point]
+        while pending:
+            point = pending.pop(0)
+            if self._anchor is None:
+                self._set_anchor(point)
+                kept.append(point)
+                continue
+
+            eligible = point.time - self._last_candidate_time >= self.min_interval
+            if len(self._window) < self.max_window and \
+               all(_sed(p, self._anchor, point) <= self.tolerance_px for p, _ in self._window):
+                self._window.append((point, eligible))
+                if eligible:
+                    self._last_candidate_time = point.time
+                continue
+
+            # The window can't be stretched to `point`: its last eligible point becomes the new anchor,
+            # and the points after it are checked again against that anchor
+            k = next((i for i in range(len(self._window) - 1, -1, -1) if self._window[i][1]), len(self._window) - 1)
+            anchor = self._window[k][0]
+            pending = [p for p, _ in self._window[k + 1:]] + [point] + pending
+            self._set_anchor(anchor)
+            kept.append(anchor)
+        self.kept += len(kept)
+        return kept
+
+    def flush(self) -> list[PathPoint]:
+        """Ends the current path, returning its last point if it wasn't stored yet."""
+        last = self._window[-1][0] if self._window else None
+        self._anchor = None
+        self._window = []
+        if last is None:
+            return []
+        self.kept += 1
+        return [last]
+
+    def _set_anchor(self, point):
+        self._anchor = point
+        self._window = []
+        self._last_candidate_time = point.time
+
+
+# --- Batch simplification ---
+def simplify_paths(t: np.ndarray, x: np.ndarray, y: np.ndarray, starts: np.ndarray, stops: np.ndarray,
+                   tolerance_px: float = DEFAULT_TOLERANCE_PX, max_interval: float = DEFAULT_MAX_INTERVAL) -> np.ndarray:
+    """
+    SED Ramer-Douglas-Peucker over many paths at once. Path k is points
+    [starts[k], stops[k]) of the t/x/y arrays. Returns a keep mask.
+
+    A segment is split while a point in it is further than tolerance_px from
+    the interpolated position, or while it spans more than max_interval
+    seconds (split in the middle, so long straight strokes keep their pace).
+    """
+    t = np.asarray(t, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    starts = np.asarray(starts, dtype=np.int64)
+    stops = np.asarray(stops, dtype=np.int64)
+    keep = np.zeros(len(t), dtype=bool)
+    nonempty = stops > starts
+    keep[starts[nonempty]] = True
+    keep[stops[nonempty] - 1] = True
+
+    seg_a, seg_b = starts[nonempty], stops[nonempty] - 1
+    while True:
+        interior = seg_b - seg_a - 1
+        open_segments = interior > 0
+        seg_a, seg_b, interior = seg_a[open_segments], seg_b[open_segments], interior[open_segments]
+        if len(seg_a) == 0:
+            break
+
+        # Every interior point of every open segment, with the id of its segment
+        offsets = np.concatenate(([0], np.cumsum(interior)[:-1]))
+        seg_id = np.repeat(np.arange(len(seg_a)), interior)
+        points = seg_a[seg_id] + 1 + (np.arange(len(seg_id)) - offsets[seg_id])
+        a, b = seg_a[seg_id], seg_b[seg_id]
+
+        span = t[b] - t[a]
+        ratio = np.divide(t[points] - t[a], span, out=np.zeros_like(span), where=span > 0)
+        distance = np.hypot(x[points] - (x[a] + (x[b] - x[a]) * ratio),
+                            y[points] - (y[a] + (y[b] - y[a]) * ratio))
+
+        max_distance = np.maximum.reduceat(distance, offsets)
+        too_far = max_distance > tolerance_px
+        too_long = (t[seg_b] - t[seg_a]) > max_interval
+        split = too_far | too_long
+        if not split.any():
+            break
+
+        # Split at the farthest point, or in the middle for segments that are only too long
+        is_max = distance == max_distance[seg_id]
+        first_max = np.full(len(seg_a), -1, dtype=np.int64)
+        hits = np.flatnonzero(is_max)
+        ids, first = np.unique(seg_id[hits], return_index=True)
+        first_max[ids] = points[hits[first]]
+        split_at = np.where(too_far, first_max, (seg_a + seg_b) // 2)
+
+        split_at = split_at[split]
+        keep[split_at] = True
+        seg_a, seg_b = np.concatenate((seg_a[split], split_at)), np.concatenate((split_at, seg_b[split]))
+    return keep
+
+
+def move_paths(events: EventStore, actions: list[GroupedAction], action_indices=None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Collects the paths of the given mouse_move actions (all of them if
+    action_indices is None). Returns (event_rows, starts, stops): the event
+    rows of all paths concatenated, and each path's bounds in that array.
+    A path is a run of consecutive move events of one action; wheel events
+    inside an action end a path and are left alone.
+    """
+    if action_indices is None:
+        action_indices = range(len(actions))
+    groups = [actions[i].indices for i in action_indices if actions[i].type == 'mouse_move' and actions[i].indices]
+    if not groups:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    rows = np.concatenate([np.asarray(g, dtype=np.int64) for g in groups])
+    group_start = np.zeros(len(rows), dtype=bool)
+    group_start[np.cumsum([0] + [len(g) for g in groups[:-1]])] = True
+
+    is_move = events.kind[rows] == KIND_MOVE
+    previous_move = np.concatenate(([False], is_move[:-1])) & ~group_start
+    next_move = np.concatenate((is_move[1:], [False])) & ~np.concatenate((group_start[1:], [True]))
+    starts = np.flatnonzero(is_move & ~previous_move)
+    stops = np.flatnonzero(is_move & ~next_move) + 1
+    return rows, starts, stops
+
+
+def plan_move_simplification(events: EventStore, actions: list[GroupedAction], action_indices=None,
+                             tolerance_px: float = DEFAULT_TOLERANCE_PX,
+                             max_interval: float = DEFAULT_MAX_INTERVAL) -> np.ndarray:
+    """Returns the (sorted) event rows that simplifying the mouse_move actions would remove."""
+    rows, starts, stops = move_paths(events, actions, action_indices)
+    if len(rows) == 0:
+        return rows
+    # Rows inside a path (wheel events between paths are not simplified)
+    path_marks = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.add.at(path_marks, starts, 1)
+    np.add.at(path_marks, stops, -1)
+    in_path = np.cumsum(path_marks[:-1]) > 0
+
+    path_keep = simplify_paths(events.time[rows], events.x[rows], events.y[rows], starts, stops,
+                               tolerance_px, max_interval)
+    return np.sort(rows[in_path & ~path_keep])
+
+
+def remove_events(events: EventStore, actions: list[GroupedAction], removed_rows) -> list[GroupedAction]:
+    """
+    Deletes `removed_rows` from `events` and fixes up every action's indices,
+    start_index and end_index in one vectorized pass (new = old - number of
+    removed rows before it). Actions left without events are dropped; the
+    'count' of mouse_move actions is updated.
+    """
+    removed_rows = np.asarray(removed_rows, dtype=np.int64)
+    if len(removed_rows) == 0:
+        return actions
+    removed = np.zeros(len(events), dtype=bool)
+    removed[removed_rows] = True
+    shift = np.cumsum(removed)  # Rows removed at or before each old row
+    events.delete_indices(removed_rows)
+
+    lengths = np.array([len(a.indices) for a in actions], dtype=np.int64)
+    if lengths.sum():
+        all_indices = np.concatenate([np.asarray(a.indices, dtype=np.int64) for a in actions if a.indices])
+    else:
+        all_indices = np.zeros(0, dtype=np.int64)
+    kept = ~removed[all_indices]
+    action_ids = np.repeat(np.arange(len(actions)), lengths)
+    kept_lengths = np.bincount(action_ids[kept], minlength=len(actions))
+    per_action = np.split(all_indices[kept] - shift[all_indices[kept]], np.cumsum(kept_lengths)[:-1])
+
+    result = []
+    for action, indices, length in zip(actions, per_action, lengths):
+        if length and not len(indices):
+            continue
+        action.indices = indices.tolist()
+        action.start_index -= int(shift[action.start_index])
+        action.end_index -= int(shift[action.end_index])
+        if action.type == 'mouse_move':
+            action.details['count'] = len(action.indices)
+        result.append(action)
+    return result
@@ -0,0 +1,82 @@
+"""
+Pixel sampling workers for the Macro Editor.
+
+AsyncPixelSampler takes (key, timestamp, x, y) requests from the recorder
+and reads the pixels on its own thread, so neither the input hooks nor the
+recorder's event processing wait on screen capture. Finished samples are
+collected with poll() by the thread that owns the data, which attaches the
+colors to the matching events.
+"""
+import queue
+import threading
+import time
+from typing import Any, NamedTuple, Optional
+
+from screen_provider import ScreenProvider, get_default_screen
+
+
+class PixelSample(NamedTuple):
+    key: Any
+    timestamp: float                # When the sample was requested
+    x: int
+    y: int
+    rgb: Optional[tuple]            # None if the capture failed
+    error: Optional[Exception] = None
+
+
+class AsyncPixelSampler:
+    def __init__(self, screen: Optional[ScreenProvider] = None):
+        self.screen = screen if screen else get_default_screen()
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="PixelSampler", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        """Requests not yet collected with poll()."""
+        with self._lock:
+            return self._pending
+
+    def request(self, key, timestamp: float, x: int, y: int):
+        with self._lock:
+            self._pending += 1
+        self._requests.put((key, timestamp, x, y))
+
+    def poll(self, timeout: Optional[float] = None) -> list[PixelSample]:
+        """
+        Returns the samples finished so far. With a timeout, waits up to that
+        long for all pending requests to finish (used when recording stops).
+        """
+        samples = []
+        deadline = time.perf_counter() + timeout if timeout else None
+        while True:
+            try:
+                if deadline is None:
+                    sample = self._results.get_nowait()
+                else:
+                    if not self.pending:
+                        break
+                    sample = self._results.get(timeout=max(deadline - time.perf_counter(), 0))
+            except queue.Empty:
+                break
+            with self._lock:
+                self._pending -= 1
+            samples.append(sample)
+        return samples
+
+    def close(self):
+        self._requests.put(None)
+
+    def _run(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            key, timestamp, x, y = request
+            try:
+                self._results.put(PixelSample(key, timestamp, x, y, self.screen.get_pixel(x, y)))
+            except Exception as e:
+                self._results.put(PixelSample(key, timestamp, x, y, None, e))
@@ -0,0 +1,307 @@
+"""
+Playback plan compiler for the Macro Editor.
+
+Turns raw events plus their GroupedActions into a flat, immutable tuple of
+Instructions that the Player can execute with a constant-cost dispatch loop.
+Everything that does not depend on the moment of playback is decided here:
+jump targets are resolved to instruction indices, relative-mode coordinates
+are turned into offsets from the recording origin, and the keyboard injection
+method (scan code vs. key name) is chosen once per event.
+"""
+from typing import Any, NamedTuple, Optional
+import numpy as np
+
+import event_store
+import region_watch
+import sound_trigger
+from color_match import ColorSignature, condition_from_details
+from event_store import EventStore
+from key_mapper_gui import SUGGESTED_TARGET_KEYS
+from types_def import GroupedAction
+
+# --- Opcodes ---
+# Action level
+OP_BEGIN = 0          # Highlight action, wait for its start time
+OP_LOOP_START = 1     # args: (count, body_pc)
+OP_LOOP_END = 2       # args: ()
+OP_WAIT_COLOR = 3     # args: (x, y, condition, timeout, post_delay)  condition is a color_match.ColorCondition
+OP_WAIT_SOUND = 4     # args: (threshold, timeout, post_delay, trigger)  trigger is a sound_trigger.TriggerSpec
+OP_IF_COLOR = 5       # args: (x, y, condition, else_pc)
+OP_ELSE = 6           # args: (end_pc, end_action_idx)
+OP_CALL_MACRO = 7     # args: (file_path,)
+OP_CLICK = 8          # args: (pos, button, clicks)
+OP_DRAG = 9           # args: (start_pos, end_pos, button)
+# Raw events
+OP_KEY_PRESS = 10     # args: (key,)  key is a scan code or a key name
+OP_KEY_RELEASE = 11   # args: (key,)
+OP_KEY_TAP = 12       # args: (scan_code,)
+OP_MOVE = 13          # args: (x, y)
+OP_MOVE_REL = 14      # args: (dx, dy) offset from the playback origin
+OP_BUTTON_DOWN = 15   # args: (button,)
+OP_BUTTON_UP = 16     # args: (button,)
+OP_WHEEL = 17         # args: (delta,)
+OP_WAIT_IMAGE = 18    # args: (template_path, roi, threshold, timeout, post_delay, button)  button is None for wait_image
+OP_WAIT_REGION = 19   # args: (region, mode, stable_samples, timeout, post_delay)  mode is 'change' or 'stable'
+
+OPCODE_COUNT = 20
+
+CLICK_TYPES = {'mouse_click': 1, 'mouse_double_click': 2, 'mouse_triple_click': 3}
+NAME_INJECTED_KEYS = frozenset({'left windows', 'right windows', 'win'})
+
+
+class Instruction(NamedTuple):
+    """
+    A single step of a compiled playback plan.
+
+    Attributes:
+        op: One of the OP_* opcodes
+        time: Macro timestamp to wait for before executing, or None for no wait
+        action_idx: Index of the GroupedAction this instruction belongs to
+        args: Opcode specific, pre-resolved arguments
+    """
+    op: int
+    time: Optional[float]
+    action_idx: int
+    args: tuple
+
+
+def _key_instruction(name, event_type, scan_code, event_time, action_idx) -> Optional[Instruction]:
+    """Decides how a recorded keyboard event is injected."""
+    name = name or ''
+    is_down = event_type == 'down'
+    if event_type not in ('down', 'up'):
+        return None
+
+    # Numpad Decimal is recorded as 'decimal' but only plays back correctly as '.'
+    if name == 'decimal':
+        return Instruction(OP_KEY_PRESS if is_down else OP_KEY_RELEASE, event_time, action_idx, ('.',))
+
+    if name in SUGGESTED_TARGET_KEYS:
+        if not is_down:
+            return None
+        return Instruction(OP_KEY_TAP, event_time, action_idx, (scan_code,))
+
+    if name in NAME_INJECTED_KEYS or (len(name) == 1 and name.isdigit()) or name.startswith('numpad'):
+        key = name
+    elif scan_code != -1:
+        key = scan_code
+    else:
+        key = name
+    return Instruction(OP_KEY_PRESS if is_down else OP_KEY_RELEASE, event_time, action_idx, (key,))
+
+
+def _raw_instruction(events: EventStore, i: int, action_idx, mode, origin) -> Optional[Instruction]:
+    """Compiles row i of the event store, reading its columns directly."""
+    kind = events.kind[i]
+    event_time = float(events.time[i])
+    if kind == event_store.KIND_KEY:
+        return _key_instruction(events.key_name(i), events.event_type_name(i), int(events.scan_code[i]), event_time, action_idx)
+    if kind == event_store.KIND_MOVE:
+        x, y = int(events.x[i]), int(events.y[i])
+        if mode == 'relative':
+            return Instruction(OP_MOVE_REL, event_time, action_idx, (x - origin[0], y - origin[1]))
+        return Instruction(OP_MOVE, event_time, action_idx, (x, y))
+    if kind == event_store.KIND_BUTTON:
+        event_type = events.event_type_name(i)
+        button = event_store.MOUSE_BUTTONS[events.button[i]]
+        if event_type == 'down':
+            return Instruction(OP_BUTTON_DOWN, event_time, action_idx, (button,))
+        if event_type == 'up':
+            return Instruction(OP_BUTTON_UP, event_time, action_idx, (button,))
+        return None
+    if kind == event_store.KIND_WHEEL:
+        return Instruction(OP_WHEEL, event_time, action_idx, (events.wheel_delta(i),))
+    return None
+
+
+def _resampled_moves(events: EventStore, indices, action_idx, mode, origin, step) -> Optional[list[Instruction]]:
+    """
+    Resamples a mouse_move group onto a fixed macro-time grid of `step` seconds.
+    The first and last samples are exactly the recorded endpoints. Returns None
+    when resampling would not reduce the number of moves.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    indices = indices[events.kind[indices] == event_store.KIND_MOVE]
+    if len(indices) < 3:
+        return None
+
+    times = events.time[indices]
+    recorded_x = events.x[indices].astype(np.float64)
+    recorded_y = events.y[indices].astype(np.float64)
+    duration = times[-1] - times[0]
+    if step <= 0:
+        return None
+    grid = times[0] + np.arange(int(duration / step) + 1) * step
+    # A grid point that lands on the end (duration a multiple of step) would repeat the endpoint
+    grid = grid[grid < times[-1] - 1e-9]
+    if len(grid) + 1 >= len(indices):
+        return None
+
+    sample_times = np.append(grid, times[-1])
+    xs = np.rint(np.interp(sample_times, times, recorded_x)).astype(np.int64)
+    ys = np.rint(np.interp(sample_times, times, recorded_y)).astype(np.int64)
+    xs[-1], ys[-1] = recorded_x[-1], recorded_y[-1]
+
+    if mode == 'relative':
+        op = OP_MOVE_REL
+        xs -= origin[0]
+        ys -= origin[1]
+    else:
+        op = OP_MOVE
+    return [Instruction(op, t, action_idx, (x, y)) for t, x, y in zip(sample_times.tolist(), xs.tolist(), ys.tolist())]
+
+
+def _find_block_target(actions: list, idx: int, targets: tuple) -> int:
+    """
+    Finds the matching ELSE / END IF for the IF block at `idx`, honouring nesting.
+    Used when a stored jump index is missing or invalid (e.g. -1 from single inserts).
+    """
+    depth = 0
+    for j in range(idx + 1, len(actions)):
+        action_type = actions[j].type
+        if action_type == 'if_color_match':
+            depth += 1
+        elif action_type == 'if_color_end':
+            if depth == 0:
+                return j
+            depth -= 1
+        elif action_type == 'if_color_else' and depth == 0 and 'if_color_else' in targets:
+            return j
+    return idx + 1
+
+
+def _resolve_jump(actions: list, idx: int, stored: Any, targets: tuple) -> int:
+    if isinstance(stored, int) and idx < stored <= len(actions):
+        return stored
+    return _find_block_target(actions, idx, targets)
+
+
+def compile_plan(events, grouped_actions: list[GroupedAction], mode: str = 'absolute', origin=(0, 0),
+                 move_rate_hz: float = 0, speed_multiplier: float = 1.0) -> tuple[Instruction, ...]:
+    """
+    Compiles raw events and grouped actions into a flat instruction tuple.
+
+    Every action starts with an OP_BEGIN instruction; jump arguments are
+    instruction indices pointing at the OP_BEGIN of the target action
+    (or at len(plan) to finish the iteration).
+
+    With move_rate_hz > 0, every mouse_move group is resampled so that it
+    injects at most move_rate_hz moves per wall-clock second at the given
+    playback speed.
+    """
+    events = EventStore.coerce(events)
+    origin = tuple(origin) if origin else (0, 0)
+    # Wall-clock sample period expressed in macro seconds
+    move_step = speed_multiplier / move_rate_hz if move_rate_hz > 0 else 0
+    plan = []
+    begin_pc = []
+    # (instruction index, action index of the jump target) to patch once all actions are laid out
+    fixups = []
+
+    for idx, action in enumerate(grouped_actions):
+        begin_pc.append(len(plan))
+        details = action.details
+        action_type = action.type
+
+        # 'loop_end' does not wait, to allow immediate looping
+        plan.append(Instruction(OP_BEGIN, None if action_type == 'loop_end' else action.start_time, idx, ()))
+
+        if action_type == 'loop_start':
+            fixups.append((len(plan), idx + 1))
+            plan.append(Instruction(OP_LOOP_START, None, idx, (details.get('count', 0), None)))
+        elif action_type == 'loop_end':
+            plan.append(Instruction(OP_LOOP_END, None, idx, ()))
+        elif action_type == 'wait_color':
+            plan.append(Instruction(OP_WAIT_COLOR, None, idx, (
+                details.get('x'), details.get('y'), condition_from_details(details),
+                details.get('timeout', 10), details.get('post_delay', 0))))
+        elif action_type in ('wait_image', 'click_image'):
+            if details.get('template_path'):
+                roi = details.get('roi')
+                plan.append(Instruction(OP_WAIT_IMAGE, None, idx, (
+                    details['template_path'], tuple(roi) if roi else None, details.get('threshold', 0.9),
+                    details.get('timeout', 10), details.get('post_delay', 0),
+                    details.get('button', 'left') if action_type == 'click_image' else None)))
+        elif action_type in ('wait_region_change', 'wait_region_stable'):
+            if details.get('region'):
+                plan.append(Instruction(OP_WAIT_REGION, None, idx, (
+                    tuple(details['region']), 'change' if action_type == 'wait_region_change' else 'stable',
+                    details.get('stable_samples', region_watch.DEFAULT_STABLE_SAMPLES),
+                    details.get('timeout', 10), details.get('post_delay', 0))))
+        elif action_type == 'wait_sound':
+            plan.append(Instruction(OP_WAIT_SOUND, None, idx, (
+                details.get('threshold', 0.1), details.get('timeout', 10), details.get('post_delay', 0),
+                sound_trigger.spec_from_details(details))))
+        elif action_type == 'if_color_match':
+            else_idx = _resolve_jump(grouped_actions, idx, details.get('else_jump_idx', idx + 1), ('if_color_else', 'if_color_end'))
+            fixups.append((len(plan), else_idx))
+            plan.append(Instruction(OP_IF_COLOR, None, idx, (details.get('x'), details.get('y'), condition_from_details(details), None)))
+        elif action_type == 'if_color_else':
+            end_idx = _resolve_jump(grouped_actions, idx, details.get('end_jump_idx', idx + 1), ('if_color_end',))
+            fixups.append((len(plan), end_idx))
+            plan.append(Instruction(OP_ELSE, None, idx, (None, end_idx)))
+        elif action_type == 'if_color_end':
+            pass
+        elif action_type == 'call_macro':
+            if details.get('file_path'):
+                plan.append(Instruction(OP_CALL_MACRO, None, idx, (details['file_path'],)))
+        elif action_type in CLICK_TYPES:
+            pos = details.get('start_pos')
+            plan.append(Instruction(OP_CLICK, None, idx, (tuple(pos) if pos else None, details.get('button', 'left'), CLICK_TYPES[action_type])))
+        elif action_type == 'mouse_drag':
+            pos = details.get('start_pos')
+            end_pos = details.get('end_pos')
+            if pos and end_pos:
+                plan.append(Instruction(OP_DRAG, None, idx, (tuple(pos), tuple(end_pos), details.get('button', 'left'))))
+        else:
+            if move_step and action_type == 'mouse_move':
+                moves = _resampled_moves(events, action.indices, idx, mode, origin, move_step)
+                if moves is not None:
+                    plan.extend(moves)
+                    continue
+
+            # Fallback to playing raw events for other action types
+            for event_idx in action.indices:
+                instruction = _raw_instruction(events, event_idx, idx, mode, origin)
+                if instruction is not None:
+                    plan.append(instruction)
+
+    begin_pc.append(len(plan))  # Jumping past the last action finishes the iteration
+
+    for pc, target_idx in fixups:
+        ins = plan[pc]
+        target_pc = begin_pc[min(target_idx, len(grouped_actions))]
+        if ins.op == OP_LOOP_START:
+            args = (ins.args[0], target_pc)
+        elif ins.op == OP_IF_COLOR:
+            args = ins.args[:3] + (target_pc,)
+        else:  # OP_ELSE
+            args = (target_pc, ins.args[1])
+        plan[pc] = ins._replace(args=args)
+
+    return tuple(plan)
+
+
+def color_probe_points(plan: tuple[Instruction, ...], include_clicks: bool = False) -> list[tuple[int, int]]:
+    """
+    Every pixel the plan can test during playback, in first-use order:
+    wait_color and if_color_match targets (every point of a color
+    signature), plus click and drag start
+    positions when include_clicks is set (prudent mode checks those).
+    """
+    points = {}
+    for ins in plan:
+        if ins.op == OP_WAIT_COLOR or ins.op == OP_IF_COLOR:
+            condition = ins.args[2]
+            if isinstance(condition, ColorSignature):
+                for x, y in zip(condition.xs.tolist(), condition.ys.tolist()):
+                    points[(x, y)] = None
+                continue
+            x, y = ins.args[0], ins.args[1]
+        elif include_clicks and (ins.op == OP_CLICK or ins.op == OP_DRAG) and ins.args[0]:
+            x, y = ins.args[0]
+        else:
+            continue
+        if x is not None and y is not None:
+            points[(int(x), int(y))] = None
+    return list(points)
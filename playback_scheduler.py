@@ -0,0 +1,201 @@
+"""
+High-precision playback scheduler for the Macro Editor.
+
+Every timed instruction is scheduled against an absolute deadline on the
+perf_counter_ns clock, computed from the playback start, the speed multiplier
+and the accumulated pause offset. Because deadlines never depend on when the
+previous event actually fired, lateness does not accumulate over the timeline.
+
+Waiting is hybrid: a coarse sleep covers most of the interval (shortened by
+the observed sleep overshoot), and the last sub-millisecond is spun.
+
+All waits go through a PlaybackControl, which sleeps in short slices, so stop,
+pause and resume interrupt them within a couple of milliseconds instead of
+after the current sleep.
+"""
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+NS_PER_S = 1_000_000_000
+DEFAULT_SPIN_NS = 1_000_000  # Spin for the last 1 ms before a deadline
+SLEEP_SLICE_NS = 2_000_000   # Longest uninterrupted sleep, bounds the stop latency
+
+
+class TimingReport(NamedTuple):
+    """Lateness statistics for one playback (milliseconds)."""
+    count: int          # Timed instructions reached on time
+    overdue: int        # Instructions reached more than spin_ns after their deadline (e.g. loop repeats)
+    mean_ms: float
+    p99_ms: float
+    max_ms: float
+
+    def __str__(self) -> str:
+        return (f"{self.count} timed events, lateness mean {self.mean_ms:.3f} ms, "
+                f"p99 {self.p99_ms:.3f} ms, max {self.max_ms:.3f} ms ({self.overdue} overdue)")
+
+
+class PlaybackControl:
+    """
+    Shared stop/pause state for one Player.
+
+    `clock_ns()` is an "active" clock that stands still while paused, so timeline
+    deadlines and wait timeouts measured on it are unaffected by pauses.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.stopped = False
+        self.paused = False
+        self._paused_total_ns = 0
+        self._pause_started_ns = 0
+        self._stop_requested_ns: Optional[int] = None
+        self.stop_latency_ns: Optional[int] = None
+
+    def reset(self):
+        with self._cond:
+            self.stopped = False
+            self.paused = False
+            self._paused_total_ns = 0
+            self._stop_requested_ns = None
+            self.stop_latency_ns = None
+
+    def clock_ns(self) -> int:
+        if self.paused:
+            return self._pause_started_ns - self._paused_total_ns
+        return time.perf_counter_ns() - self._paused_total_ns
+
+    def request_stop(self):
+        with self._cond:
+            if not self.stopped:
+                self.stopped = True
+                self._stop_requested_ns = time.perf_counter_ns()
+            self._cond.notify_all()
+
+    def acknowledge_stop(self) -> Optional[int]:
+        """Called by the player once it has stopped injecting; records the stop latency."""
+        with self._cond:
+            if self._stop_requested_ns is not None and self.stop_latency_ns is None:
+                self.stop_latency_ns = time.perf_counter_ns() - self._stop_requested_ns
+            return self.stop_latency_ns
+
+    def pause(self):
+        with self._cond:
+            if not self.paused and not self.stopped:
+                self._pause_started_ns = time.perf_counter_ns()
+                self.paused = True
+            self._cond.notify_all()
+
+    def resume(self):
+        with self._cond:
+            if self.paused:
+                self._paused_total_ns += time.perf_counter_ns() - self._pause_started_ns
+                self.paused = False
+            self._cond.notify_all()
+
+    def sleep(self, seconds: float) -> bool:
+        """
+        Waits for `seconds` of active (unpaused) time.
+        Returns False as soon as a stop is requested, True otherwise.
+
+        Running time is waited with time.sleep, which uses a high-resolution timer
+        on Windows (a Condition timeout is rounded to the ~15.6 ms system tick), in
+        slices of at most SLEEP_SLICE_NS so a stop is noticed within one slice.
+        Pauses block on the condition until resume() or request_stop().
+        """
+        end_ns = self.clock_ns() + int(seconds * NS_PER_S)
+        while not self.stopped:
+            if self.paused:
+                with self._cond:
+                    while self.paused and not self.stopped:
+                        self._cond.wait()
+                continue
+            remaining_ns = end_ns - self.clock_ns()
+            if remaining_ns <= 0:
+                return True
+            time.sleep(min(remaining_ns, SLEEP_SLICE_NS) / NS_PER_S)
+        return False
+
+
+class PlaybackScheduler:
+    def __init__(self, speed_multiplier: float = 1.0, spin_ns: int = DEFAULT_SPIN_NS, control: Optional[PlaybackControl] = None):
+        self.control = control if control else PlaybackControl()
+        self.speed_multiplier = speed_multiplier
+        self.spin_ns = spin_ns
+        self._ns_per_macro_s = NS_PER_S / speed_multiplier
+        self._origin_ns = 0
+        self._offset_ns = 0
+        self._sleep_overshoot_ns = 0.0  # EWMA of how late time.sleep wakes up
+        self.lateness_ns = []
+        self.overdue = 0
+
+    def start(self):
+        """Anchors macro time 0 at the current instant. Statistics are kept across repeats."""
+        self._origin_ns = self.control.clock_ns()
+        self._offset_ns = 0
+
+    def reset_stats(self):
+        self.lateness_ns = []
+        self.overdue = 0
+
+    def shift(self, seconds: float):
+        """Pushes the rest of the timeline back by `seconds` of real time (e.g. after a wait action)."""
+        self._offset_ns += int(seconds * NS_PER_S)
+
+    def deadline_ns(self, macro_time: float) -> int:
+        return self._origin_ns + self._offset_ns + int(macro_time * self._ns_per_macro_s)
+
+    def macro_time(self) -> float:
+        """Current position on the macro timeline, in macro seconds."""
+        return (self.control.clock_ns() - self._origin_ns - self._offset_ns) / self._ns_per_macro_s
+
+    def wait_until(self, macro_time: float) -> int:
+        """
+        Blocks until `macro_time` on the macro timeline is reached, or a stop is requested.
+        Returns the lateness in nanoseconds (how far past the deadline we woke up).
+        """
+        control = self.control
+        deadline = self.deadline_ns(macro_time)
+        now = control.clock_ns()
+        if now >= deadline:
+            # Deadlines shared with the previous instruction are on time; anything
+            # further behind (loop repeats, slow injections) is counted separately
+            if now - deadline < self.spin_ns:
+                self.lateness_ns.append(now - deadline)
+            else:
+                self.overdue += 1
+            return now - deadline
+
+        coarse_ns = deadline - now - self.spin_ns - int(self._sleep_overshoot_ns)
+        if coarse_ns > 0:
+            before = control.clock_ns()
+            if not control.sleep(coarse_ns / NS_PER_S):
+                return 0
+            overshoot = control.clock_ns() - before - coarse_ns
+            self._sleep_overshoot_ns += 0.1 * (max(overshoot, 0) - self._sleep_overshoot_ns)
+
+        now = control.clock_ns()
+        while now < deadline:
+            if control.stopped:
+                return 0
+            if control.paused:
+                control.sleep(0)  # Blocks until resumed or stopped
+            now = control.clock_ns()
+
+        lateness = now - deadline
+        self.lateness_ns.append(lateness)
+        return lateness
+
+    def report(self) -> TimingReport:
+        if not self.lateness_ns:
+            return TimingReport(0, self.overdue, 0.0, 0.0, 0.0)
+        lateness_ms = np.asarray(self.lateness_ns, dtype=np.float64) / 1e6
+        return TimingReport(
+            count=len(lateness_ms),
+            overdue=self.overdue,
+            mean_ms=float(lateness_ms.mean()),
+            p99_ms=float(np.percentile(lateness_ms, 99)),
+            max_ms=float(lateness_ms.max()),
+        )
@@ -0,0 +1,55 @@
+"""
+Ring buffer between the Recorder's input hooks and its consumer thread.
+
+The keyboard and mouse hooks run on different threads and must return
+quickly, or the OS delays or drops input. A hook only takes a timestamp and
+a sequence number and stores one tuple into a preallocated slot; there are
+no locks on that path. The sequence comes from itertools.count, whose
+next() is atomic under the GIL, so the two hook threads never share a
+number and the consumer sees events in one global order.
+
+The consumer reads slots strictly in sequence order. A slot whose event is
+still being written (its sequence is from the previous lap) stops the
+drain until the next call, so ordering is preserved even if a hook thread
+is preempted mid-put. If the producers ever lap the consumer, the
+overwritten events are counted in `dropped`.
+"""
+import itertools
+from typing import Any
+
+DEFAULT_CAPACITY = 1 << 16  # ~65 s of backlog at 1000 Hz
+
+
+class RecordRing:
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError("capacity must be a power of two")
+        self.capacity = capacity
+        self._mask = capacity - 1
+        self._slots: list = [None] * capacity
+        self._sequence = itertools.count()
+        self._next = 0  # Next sequence number the consumer expects
+        self.dropped = 0
+
+    def put(self, timestamp: float, event: Any):
+        """Producer side (hook threads)."""
+        seq = next(self._sequence)
+        self._slots[seq & self._mask] = (seq, timestamp, event)
+
+    def drain(self) -> list[tuple[float, Any]]:
+        """Consumer side (one thread). Returns the (timestamp, event) pairs published so far, in order."""
+        items = []
+        slots, mask = self._slots, self._mask
+        while True:
+            item = slots[self._next & mask]
+            if item is None or item[0] < self._next:
+                break
+            if item[0] > self._next:
+                # Lapped: everything older than one capacity behind this slot was overwritten
+                oldest = item[0] - mask
+                self.dropped += oldest - self._next
+                self._next = oldest
+                continue
+            items.append((item[1], item[2]))
+            self._next += 1
+        return items
@@ -0,0 +1,84 @@
+"""
+Region change / stability detection for the Macro Editor
+(wait_region_change / wait_region_stable).
+
+A screen rectangle is split into tiles and every tile is reduced to one
+64-bit hash, computed for all tiles at once with NumPy. The tile's pixels
+are read as 64-bit words, multiplied by fixed random odd constants, and
+summed with wrap-around. Comparing two samples is then a comparison of a
+few hundred integers, and the number of differing tiles tells how much
+of the region changed.
+"""
+from typing import Optional
+
+import numpy as np
+
+DEFAULT_TILE = 16            # Tile side in pixels (a multiple of 8, so a tile row is whole 64-bit words)
+DEFAULT_STABLE_SAMPLES = 5   # Consecutive identical samples that count as "stable"
+DEFAULT_INTERVAL = 0.05      # Seconds between samples
+
+_coefficients = {}
+
+
+def _tile_coefficients(tile: int) -> np.ndarray:
+    coefficients = _coefficients.get(tile)
+    if coefficients is None:
+        words = tile * 3 // 8
+        rng = np.random.default_rng(0x5EED + tile)
+        coefficients = rng.integers(1, 1 << 63, size=(tile, words), dtype=np.uint64) | np.uint64(1)
+        _coefficients[tile] = coefficients
+    return coefficients
+
+
+def tile_hashes(frame: np.ndarray, tile: int = DEFAULT_TILE) -> np.ndarray:
+    """(h, w, 3) uint8 frame -> (ceil(h / tile), ceil(w / tile)) uint64 tile hashes."""
+    if tile % 8:
+        raise ValueError("tile must be a multiple of 8")
+    frame = np.asarray(frame, dtype=np.uint8)
+    h, w = frame.shape[:2]
+    rows, cols = -(-h // tile), -(-w // tile)
+    if (rows * tile, cols * tile) != (h, w):
+        padded = np.zeros((rows * tile, cols * tile, 3), dtype=np.uint8)
+        padded[:h, :w] = frame[:, :, :3]
+        frame = padded
+    else:
+        frame = np.ascontiguousarray(frame[:, :, :3])
+    # (rows, tile, cols, tile * 3 bytes) -> 64-bit words per tile row
+    words = frame.reshape(rows, tile, cols, tile * 3).view(np.uint64)
+    return np.einsum('itjw,tw->ij', words, _tile_coefficients(tile))
+
+
+class RegionWatcher:
+    """
+    Feed successive grabs of the same region to update(); it returns True
+    once the condition is met.
+
+    'change': at least min_changed_tiles tiles differ from the previous sample.
+    'stable': stable_samples consecutive samples were identical to their predecessor.
+    """
+
+    def __init__(self, mode: str, stable_samples: int = DEFAULT_STABLE_SAMPLES,
+                 min_changed_tiles: int = 1, tile: int = DEFAULT_TILE):
+        if mode not in ('change', 'stable'):
+            raise ValueError(f"Unknown region wait mode: {mode}")
+        self.mode = mode
+        self.stable_samples = max(int(stable_samples), 1)
+        self.min_changed_tiles = max(int(min_changed_tiles), 1)
+        self.tile = tile
+        self.changed_tiles = 0      # Tiles that differed in the last update
+        self.identical_run = 0      # Consecutive samples identical to their predecessor
+        self._previous: Optional[np.ndarray] = None
+
+    def update(self, frame: np.ndarray) -> bool:
+        hashes = tile_hashes(frame, self.tile)
+        previous, self._previous = self._previous, hashes
+        if previous is None or previous.shape != hashes.shape:
+            self.changed_tiles = 0
+            self.identical_run = 0
+            return False
+        self.changed_tiles = int(np.count_nonzero(hashes != previous))
+        if self.changed_tiles:
+            self.identical_run = 0
+            return self.mode == 'change' and self.changed_tiles >= self.min_changed_tiles
+        self.identical_run += 1
+        return self.mode == 'stable' and self.identical_run >= self.stable_samples
@@ -0,0 +1,221 @@
+"""
+Screen access for the Macro Editor.
+
+Everything that reads the screen (recorder pixel capture, playback color
+conditions, the color pickers) goes through a ScreenProvider, so the
+Windows GDI implementation can be swapped for a synthetic framebuffer in
+tests and on machines without a Windows desktop.
+
+Colors are (r, g, b) tuples for single pixels; region grabs are NumPy
+arrays of shape (height, width, 3), dtype uint8, in RGB order.
+"""
+import sys
+import threading
+
+import numpy as np
+
+from color_match import pack_rgb, pack_rgb_array
+
+
+class ScreenProvider:
+    """Interface for reading screen pixels."""
+
+    def get_pixel(self, x: int, y: int) -> tuple[int, int, int]:
+        raise NotImplementedError
+
+    def grab(self, left: int, top: int, width: int, height: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def size(self) -> tuple[int, int]:
+        """(width, height) of the screen."""
+        raise NotImplementedError
+
+    def get_packed(self, x: int, y: int) -> int:
+        """The pixel as a packed 0xRRGGBB integer (see color_match)."""
+        return pack_rgb(self.get_pixel(x, y))
+
+    def get_packed_many(self, xs, ys) -> np.ndarray:
+        """get_pixels() as packed colors, all from one read."""
+        return pack_rgb_array(self.get_pixels(xs, ys))
+
+    def get_pixels(self, xs, ys) -> np.ndarray:
+        """Reads many pixels with one grab of their bounding box. Returns an (n, 3) uint8 array."""
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        if len(xs) == 0:
+            return np.zeros((0, 3), dtype=np.uint8)
+        left, top = int(xs.min()), int(ys.min())
+        region = self.grab(left, top, int(xs.max()) - left + 1, int(ys.max()) - top + 1)
+        return region[ys - top, xs - left]
+
+
+class GdiScreenProvider(ScreenProvider):
+    """Windows GDI: GetPixel for single pixels, BitBlt + GetDIBits for regions."""
+
+    SRCCOPY = 0x00CC0020
+    CAPTUREBLT = 0x40000000
+    CLR_INVALID = 0xFFFFFFFF
+    GRAB_AREA_LIMIT = 256 * 256  # Larger bounding boxes are read pixel by pixel in get_pixels...
+    GETPIXEL_POINT_LIMIT = 16    # ...unless there are more points than this; GetPixel on the screen DC is slow
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+
+        class BITMAPINFOHEADER(ctypes.Structure):
+            _fields_ = [('biSize', wintypes.DWORD), ('biWidth', wintypes.LONG), ('biHeight', wintypes.LONG),
+                        ('biPlanes', wintypes.WORD), ('biBitCount', wintypes.WORD), ('biCompression', wintypes.DWORD),
+                        ('biSizeImage', wintypes.DWORD), ('biXPelsPerMeter', wintypes.LONG), ('biYPelsPerMeter', wintypes.LONG),
+                        ('biClrUsed', wintypes.DWORD), ('biClrImportant', wintypes.DWORD)]
+
+        class BITMAPINFO(ctypes.Structure):
+            _fields_ = [('bmiHeader', BITMAPINFOHEADER), ('bmiColors', wintypes.DWORD * 3)]
+
+        self._ctypes = ctypes
+        self._BITMAPINFO = BITMAPINFO
+        self._BITMAPINFOHEADER = BITMAPINFOHEADER
+        user32 = ctypes.windll.user32
+        gdi32 = ctypes.windll.gdi32
+        # Explicit handle types: the default int restype truncates handles on 64-bit Python
+        user32.GetDC.argtypes = [wintypes.HWND]
+        user32.GetDC.restype = wintypes.HDC
+        user32.ReleaseDC.argtypes = [wintypes.HWND, wintypes.HDC]
+        gdi32.GetPixel.argtypes = [wintypes.HDC, ctypes.c_int, ctypes.c_int]
+        gdi32.GetPixel.restype = wintypes.DWORD
+        gdi32.CreateCompatibleDC.argtypes = [wintypes.HDC]
+        gdi32.CreateCompatibleDC.restype = wintypes.HDC
+        gdi32.CreateCompatibleBitmap.argtypes = [wintypes.HDC, ctypes.c_int, ctypes.c_int]
+        gdi32.CreateCompatibleBitmap.restype = wintypes.HBITMAP
+        gdi32.SelectObject.argtypes = [wintypes.HDC, wintypes.HGDIOBJ]
+        gdi32.SelectObject.restype = wintypes.HGDIOBJ
+        gdi32.BitBlt.argtypes = [wintypes.HDC, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                 wintypes.HDC, ctypes.c_int, ctypes.c_int, wintypes.DWORD]
+        gdi32.GetDIBits.argtypes = [wintypes.HDC, wintypes.HBITMAP, wintypes.UINT, wintypes.UINT,
+                                    ctypes.c_void_p, ctypes.c_void_p, wintypes.UINT]
+        gdi32.DeleteObject.argtypes = [wintypes.HGDIOBJ]
+        gdi32.DeleteDC.argtypes = [wintypes.HDC]
+        self._user32 = user32
+        self._gdi32 = gdi32
+
+    def size(self):
+        return (self._user32.GetSystemMetrics(0), self._user32.GetSystemMetrics(1))  # SM_CXSCREEN, SM_CYSCREEN
+
+    def get_pixel(self, x, y):
+        hdc = self._user32.GetDC(None)
+        try:
+            color = self._gdi32.GetPixel(hdc, int(x), int(y))
+        finally:
+            self._user32.ReleaseDC(None, hdc)
+        if color == self.CLR_INVALID:
+            raise OSError(f"GetPixel failed at ({x}, {y}).")
+        # Color is BGR in Windows GDI
+        return (color & 0xFF, (color >> 8) & 0xFF, (color >> 16) & 0xFF)
+
+    def get_pixels(self, xs, ys):
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        if len(xs) == 0:
+            return np.zeros((0, 3), dtype=np.uint8)
+        area = (int(xs.max()) - int(xs.min()) + 1) * (int(ys.max()) - int(ys.min()) + 1)
+        if area <= self.GRAB_AREA_LIMIT or len(xs) > self.GETPIXEL_POINT_LIMIT:
+            # One BitBlt of the bounding box; for many points even a full screen copy beats GetPixel per point
+            return super().get_pixels(xs, ys)
+        # A few points spread over the screen: GetPixel each of them on one DC instead of copying the whole box
+        colors = np.empty(len(xs), dtype=np.uint32)
+        hdc = self._user32.GetDC(None)
+        try:
+            for i, (x, y) in enumerate(zip(xs.tolist(), ys.tolist())):
+                colors[i] = self._gdi32.GetPixel(hdc, x, y)
+        finally:
+            self._user32.ReleaseDC(None, hdc)
+        if (colors == self.CLR_INVALID).any():
+            raise OSError("GetPixel failed.")
+        return np.stack((colors & 0xFF, (colors >> 8) & 0xFF, (colors >> 16) & 0xFF), axis=1).astype(np.uint8)
+
+    def grab(self, left, top, width, height):
+        ctypes = self._ctypes
+        user32, gdi32 = self._user32, self._gdi32
+        width, height = max(int(width), 1), max(int(height), 1)
+        hdc_screen = user32.GetDC(None)
+        hdc_mem = gdi32.CreateCompatibleDC(hdc_screen)
+        bitmap = gdi32.CreateCompatibleBitmap(hdc_screen, width, height)
+        previous = gdi32.SelectObject(hdc_mem, bitmap)
+        try:
+            if not gdi32.BitBlt(hdc_mem, 0, 0, width, height, hdc_screen, int(left), int(top), self.SRCCOPY | self.CAPTUREBLT):
+                raise OSError("BitBlt failed.")
+            info = self._BITMAPINFO()
+            info.bmiHeader.biSize = ctypes.sizeof(self._BITMAPINFOHEADER)
+            info.bmiHeader.biWidth = width
+            info.bmiHeader.biHeight = -height  # Top-down rows
+            info.bmiHeader.biPlanes = 1
+            info.bmiHeader.biBitCount = 32
+            info.bmiHeader.biCompression = 0  # BI_RGB
+            pixels = np.empty((height, width, 4), dtype=np.uint8)
+            if not gdi32.GetDIBits(hdc_mem, bitmap, 0, height, pixels.ctypes.data, ctypes.byref(info), 0):
+                raise OSError("GetDIBits failed.")
+        finally:
+            gdi32.SelectObject(hdc_mem, previous)
+            gdi32.DeleteObject(bitmap)
+            gdi32.DeleteDC(hdc_mem)
+            user32.ReleaseDC(None, hdc_screen)
+        # BGRA -> RGB
+        return pixels[:, :, 2::-1].copy()
+
+
+class SyntheticScreenProvider(ScreenProvider):
+    """
+    In-memory framebuffer for tests and headless runs. Pixels outside the
+    framebuffer read as black. `reads` counts get_pixel/grab calls.
+    """
+
+    def __init__(self, width: int = 1920, height: int = 1080, color=(0, 0, 0)):
+        self.framebuffer = np.empty((height, width, 3), dtype=np.uint8)
+        self.framebuffer[:] = color
+        self.reads = 0
+        self._lock = threading.Lock()
+
+    def set_pixel(self, x, y, color):
+        with self._lock:
+            self.framebuffer[y, x] = color
+
+    def fill(self, left, top, width, height, color):
+        with self._lock:
+            self.framebuffer[max(top, 0):top + height, max(left, 0):left + width] = color
+
+    def size(self):
+        return (self.framebuffer.shape[1], self.framebuffer.shape[0])
+
+    def get_pixel(self, x, y):
+        with self._lock:
+            self.reads += 1
+            height, width = self.framebuffer.shape[:2]
+            if 0 <= x < width and 0 <= y < height:
+                return tuple(int(c) for c in self.framebuffer[y, x])
+            return (0, 0, 0)
+
+    def grab(self, left, top, width, height):
+        region = np.zeros((max(int(height), 1), max(int(width), 1), 3), dtype=np.uint8)
+        with self._lock:
+            self.reads += 1
+            fb_height, fb_width = self.framebuffer.shape[:2]
+            x0, y0 = max(left, 0), max(top, 0)
+            x1, y1 = min(left + width, fb_width), min(top + height, fb_height)
+            if x1 > x0 and y1 > y0:
+                region[y0 - top:y1 - top, x0 - left:x1 - left] = self.framebuffer[y0:y1, x0:x1]
+        return region
+
+
+_default_screen = None
+
+
+def get_default_screen() -> ScreenProvider:
+    """Returns the shared provider: GDI on Windows, a synthetic framebuffer elsewhere."""
+    global _default_screen
+    if _default_screen is None:
+        _default_screen = GdiScreenProvider() if sys.platform == 'win32' else SyntheticScreenProvider()
+    return _default_screen
+
+
+def set_default_screen(provider: ScreenProvider):
+    global _default_screen
+    _default_screen = provider
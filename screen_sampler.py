@@ -0,0 +1,86 @@
+"""
+Playback-scoped screen sampling for the Macro Editor.
+
+Before playback starts, the Player collects every pixel the compiled plan
+can test (wait_color and if_color_match targets, plus click positions in
+prudent mode). PlaybackScreenSampler refreshes all of them with one
+batched read (ScreenProvider.get_pixels) per sample period on its own
+thread, and condition checks read the latest colors from memory.
+
+Reads are at most one sample period old. Pixels that were not known in
+advance (none today, but the interface allows it), and every pixel after
+a failed refresh, are read directly.
+"""
+import threading
+from typing import Optional
+
+import numpy as np
+
+from color_match import pack_rgb_array, unpack_rgb
+from screen_provider import ScreenProvider
+
+DEFAULT_RATE_HZ = 60
+
+
+class PlaybackScreenSampler:
+    def __init__(self, screen: ScreenProvider, points, rate_hz: float = DEFAULT_RATE_HZ, log_callback=None):
+        self.screen = screen
+        self.period = 1.0 / rate_hz
+        self.log_callback = log_callback
+        self.points = list(dict.fromkeys((int(x), int(y)) for x, y in points))
+        self._index = {point: i for i, point in enumerate(self.points)}
+        self._xs = np.array([x for x, _ in self.points], dtype=np.int64)
+        self._ys = np.array([y for _, y in self.points], dtype=np.int64)
+        self._colors: list[int] = []   # Packed 0xRRGGBB; replaced as a whole on every refresh
+        self.captures = 0
+        self.last_error: Optional[Exception] = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Reads every pixel once (so the first checks see current colors) and starts refreshing."""
+        self._refresh()
+        self._thread = threading.Thread(target=self._run, name="ScreenSampler", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def get_packed(self, x, y) -> int:
+        i = self._index.get((x, y))
+        colors = self._colors
+        if i is None or i >= len(colors):
+            return self.screen.get_packed(x, y)
+        return colors[i]
+
+    def get_packed_many(self, xs, ys) -> np.ndarray:
+        """Packed colors of several points, all from the same refresh."""
+        colors = self._colors
+        indices = [self._index.get((x, y)) for x, y in zip(np.asarray(xs).tolist(), np.asarray(ys).tolist())]
+        if not colors or None in indices:
+            return self.screen.get_packed_many(xs, ys)
+        return np.array([colors[i] for i in indices], dtype=np.int64)
+
+    def get_pixel(self, x, y) -> tuple[int, int, int]:
+        return unpack_rgb(self.get_packed(x, y))
+
+    def _run(self):
+        while not self._stop.wait(self.period):
+            self._refresh()
+
+    def _refresh(self):
+        try:
+            rgb = self.screen.get_pixels(self._xs, self._ys)
+        except Exception as e:
+            # Drop the old colors, so checks read the screen directly (and fail) instead of
+            # matching a frozen snapshot; report each distinct failure once
+            self._colors = []
+            if self.log_callback and str(e) != str(self.last_error):
+                self.log_callback(f"Screen sampler error: {e}")
+            self.last_error = e
+            return
+        self._colors = pack_rgb_array(rgb).tolist()
+        self.captures += 1
@@ -0,0 +1,311 @@
+"""
+Sound triggers for the Macro Editor: match a specific sound instead of any
+sound louder than a threshold.
+
+'band' - most of the sound's energy lies in a frequency band (a beep or a
+         tone). A sliding FFT: a Hann-windowed frame of FRAME_SIZE samples
+         is transformed every HOP_SIZE samples (75% overlap), and the
+         band's share of the frame energy and its RMS level are compared
+         with the limits. The tone must hold for `min_duration`.
+
+'clip' - the stream matches a short recorded reference clip. Normalized
+         cross-correlation (NCC) of the zero-mean reference against every
+         window of the stream, computed with FFT overlap-add: each new block
+         is transformed once and multiplied by the reference spectrum,
+         which is precomputed when the clip loads. The score is 1.0 for a
+         perfect match and does not depend on the playback volume.
+
+Both also require the matched window to be at least `threshold` loud
+(RMS), so quiet background noise never triggers. Triggers are fed from
+an AudioCapture with scan(); they keep their own state, so each wait
+creates a fresh one with create_trigger().
+"""
+import os
+import threading
+import time
+import wave
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+TRIGGER_TYPES = ('level', 'band', 'clip')
+FRAME_SIZE = 1024           # Band FFT frame (64 ms at 16 kHz)
+HOP_SIZE = 256              # New samples between band frames
+CLIP_HOP = 1024             # New samples per clip overlap-add block (bounds the detection delay)
+MAX_CLIP_SECONDS = 2.0
+DEFAULT_BAND_RATIO = 0.5    # Share of the frame energy that must lie in the band
+DEFAULT_MIN_DURATION = 0.05
+DEFAULT_CLIP_SCORE = 0.6
+CLIP_DIR = "sounds"
+
+
+class TriggerSpec(NamedTuple):
+    """A wait_sound / stop-on-sound trigger as stored in the action details."""
+    kind: str                   # One of TRIGGER_TYPES
+    threshold: float            # Minimum RMS level
+    band: tuple = (0.0, 0.0)    # (low Hz, high Hz) for 'band'
+    ratio: float = DEFAULT_BAND_RATIO
+    min_duration: float = DEFAULT_MIN_DURATION
+    clip_path: Optional[str] = None
+    score: float = DEFAULT_CLIP_SCORE
+
+    def describe(self) -> str:
+        if self.kind == 'band':
+            return f"{self.band[0]:g}-{self.band[1]:g} Hz band"
+        if self.kind == 'clip':
+            return f"clip {os.path.basename(self.clip_path or '')}"
+        return f"level {self.threshold}"
+
+
+def spec_from_details(details: dict) -> TriggerSpec:
+    """Reads the trigger of a wait_sound action (older macros only have 'threshold')."""
+    kind = details.get('trigger', 'level')
+    if kind not in TRIGGER_TYPES:
+        raise ValueError(f"Unknown sound trigger: {kind}")
+    band = details.get('band') or (0.0, 0.0)
+    return TriggerSpec(kind, float(details.get('threshold', 0.1)), (float(band[0]), float(band[1])),
+                       float(details.get('band_ratio', DEFAULT_BAND_RATIO)),
+                       float(details.get('min_duration', DEFAULT_MIN_DURATION)),
+                       details.get('clip_path'), float(details.get('score', DEFAULT_CLIP_SCORE)))
+
+
+class SoundTrigger:
+    """Consumes the stream in fixed hops; feed() returns the score of the first match, else None."""
+    hop = HOP_SIZE
+
+    def __init__(self):
+        self._pending = np.zeros(0, dtype=np.float32)
+        self.last_score = 0.0
+
+    def feed(self, samples: np.ndarray) -> Optional[float]:
+        pending = np.concatenate((self._pending, np.asarray(samples, dtype=np.float32)))
+        hop = self.hop
+        used = 0
+        matched = None
+        while len(pending) - used >= hop:
+            score = self._process(pending[used:used + hop])
+            used += hop
+            if score is not None:
+                matched = score
+                break
+        self._pending = pending[used:]
+        return matched
+
+    def scan(self, capture, position: int, timeout: float) -> tuple[Optional[float], int]:
+        """
+        Waits up to `timeout` for capture data after `position` and feeds it.
+        Returns (score or None, the new position).
+        """
+        end = capture.wait_for_data(position, timeout)
+        if end <= position:
+            return None, position
+        samples = capture.read(position, end - position)
+        return self.feed(samples), end
+
+    def _process(self, block: np.ndarray) -> Optional[float]:
+        raise NotImplementedError
+
+
+class BandTrigger(SoundTrigger):
+    def __init__(self, samplerate: int, low_hz: float, high_hz: float, threshold: float,
+                 ratio: float = DEFAULT_BAND_RATIO, min_duration: float = DEFAULT_MIN_DURATION):
+        super().__init__()
+        if not 0 <= low_hz < high_hz:
+            raise ValueError("The band needs 0 <= low < high (Hz).")
+        self.threshold = threshold
+        self.ratio = ratio
+        self.hold = max(int(round(min_duration * samplerate / self.hop)), 1)
+        self._window = np.hanning(FRAME_SIZE).astype(np.float32)
+        freqs = np.fft.rfftfreq(FRAME_SIZE, 1.0 / samplerate)
+        self._band = (freqs >= low_hz) & (freqs <= high_hz)
+        if not self._band.any():
+            raise ValueError("The band is narrower than one FFT bin.")
+        # Band power -> RMS of the band-limited signal (Parseval, one-sided spectrum)
+        self._power_to_ms = 2.0 / (FRAME_SIZE * float(np.dot(self._window, self._window)))
+        self._frame = np.zeros(FRAME_SIZE, dtype=np.float32)
+        self._run = 0
+
+    def _process(self, block):
+        frame = self._frame
+        frame[:-len(block)] = frame[len(block):]
+        frame[-len(block):] = block
+        spectrum = np.fft.rfft(frame * self._window)
+        power = spectrum.real * spectrum.real + spectrum.imag * spectrum.imag
+        total = float(power.sum())
+        band = float(power[self._band].sum())
+        level = (band * self._power_to_ms) ** 0.5
+        self.last_score = band / total if total > 0 else 0.0
+        if level >= self.threshold and self.last_score >= self.ratio:
+            self._run += 1
+            if self._run >= self.hold:
+                return self.last_score
+        else:
+            self._run = 0
+        return None
+
+
+class ReferenceClip:
+    """A reference clip, preprocessed: zero-mean samples, their norm and cached spectra per FFT size."""
+
+    def __init__(self, samples: np.ndarray, samplerate: int):
+        samples = np.asarray(samples, dtype=np.float64).ravel()
+        if len(samples) > MAX_CLIP_SECONDS * samplerate:
+            raise ValueError(f"Reference clips can be at most {MAX_CLIP_SECONDS:g} seconds long.")
+        self.samplerate = samplerate
+        self.zero_mean = samples - samples.mean()
+        self.norm = float(np.sqrt(np.dot(self.zero_mean, self.zero_mean)))
+        if len(samples) < 2 or self.norm < 1e-6:
+            raise ValueError("The reference clip is silent.")
+        self._spectra = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.zero_mean)
+
+    def spectrum(self, nfft: int) -> np.ndarray:
+        """FFT of the time-reversed clip: multiplying by it correlates with the clip."""
+        with self._lock:
+            spectrum = self._spectra.get(nfft)
+            if spectrum is None:
+                spectrum = np.fft.rfft(self.zero_mean[::-1], nfft)
+                self._spectra[nfft] = spectrum
+            return spectrum
+
+
+class ClipTrigger(SoundTrigger):
+    hop = CLIP_HOP
+
+    def __init__(self, clip: ReferenceClip, threshold: float, score: float = DEFAULT_CLIP_SCORE):
+        super().__init__()
+        self.clip = clip
+        self.threshold = threshold
+        self.score = score
+        m = len(clip)
+        self._nfft = 1 << (m + self.hop - 2).bit_length()
+        self._spectrum = clip.spectrum(self._nfft)
+        self._tail = np.zeros(m - 1)                # Overlap-add carry into the next block's outputs
+        self._history = np.zeros(m - 1)             # Last m - 1 samples, for the window energies
+        self._min_energy = threshold * threshold * m
+
+    def _process(self, block):
+        m, hop = len(self.clip), self.hop
+        # Overlap-add: correlation outputs ending at this block's samples are complete once the carry is added
+        out = np.fft.irfft(np.fft.rfft(block, self._nfft) * self._spectrum, self._nfft)[:hop + m - 1]
+        out[:m - 1] += self._tail
+        self._tail = out[hop:].copy()
+        numerator = out[:hop]
+
+        # Sum and sum of squares of the m-sample window ending at each new sample
+        samples = np.concatenate((self._history, block))
+        self._history = samples[hop:]
+        sums = np.concatenate(([0.0], np.cumsum(samples)))
+        squares = np.concatenate(([0.0], np.cumsum(samples * samples)))
+        window_sum = sums[m:] - sums[:hop]
+        energy = squares[m:] - squares[:hop]
+        variance = energy - window_sum * window_sum / m
+        loud = (energy >= self._min_energy) & (variance > 1e-12)
+        scores = np.divide(numerator, np.sqrt(np.maximum(variance, 0.0)) * self.clip.norm,
+                           out=np.zeros(hop), where=loud)
+        best = float(scores.max())
+        self.last_score = best
+        return best if best >= self.score else None
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def load_clip(path: str, samplerate: int) -> ReferenceClip:
+    """Loads (or returns the cached) reference clip from a .wav file, resampled to `samplerate`."""
+    mtime = os.path.getmtime(path)
+    key = (path, samplerate)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    with wave.open(path, 'rb') as wav:
+        width, channels, rate = wav.getsampwidth(), wav.getnchannels(), wav.getframerate()
+        raw = wav.readframes(wav.getnframes())
+    if width == 2:
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float64) / 32768.0
+    elif width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float64) - 128.0) / 128.0
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype='<i4').astype(np.float64) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width * 8} bits")
+    samples = samples.reshape(-1, channels).mean(axis=1)
+    if rate != samplerate:
+        positions = np.arange(int(len(samples) * samplerate / rate)) * (rate / samplerate)
+        samples = np.interp(positions, np.arange(len(samples)), samples)
+    clip = ReferenceClip(samples, samplerate)
+    with _cache_lock:
+        _cache[key] = (mtime, clip)
+    return clip
+
+
+def save_clip(samples: np.ndarray, samplerate: int, directory: str = CLIP_DIR) -> str:
+    """Saves a recorded reference clip as 16-bit mono .wav and returns its path."""
+    ReferenceClip(samples, samplerate)  # Reject silent or overlong clips before writing anything
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, time.strftime("clip_%Y%m%d_%H%M%S") + f"_{int(time.time() * 1000) % 1000:03d}.wav")
+    pcm = (np.clip(np.asarray(samples, dtype=np.float64), -1.0, 1.0) * 32767).astype('<i2')
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(samplerate)
+        wav.writeframes(pcm.tobytes())
+    return path
+
+
+def trim_clip(samples: np.ndarray, samplerate: int, floor: float = 0.1) -> np.ndarray:
+    """Cuts a recording down to the part between the first and last 10 ms block louder than `floor` x its peak."""
+    samples = np.asarray(samples, dtype=np.float32)
+    block = max(samplerate // 100, 1)
+    count = len(samples) // block
+    if count == 0:
+        return samples
+    levels = np.sqrt((samples[:count * block].reshape(count, block) ** 2).mean(axis=1))
+    loud = np.flatnonzero(levels >= levels.max() * floor)
+    start = loud[0] * block
+    return samples[start:min((loud[-1] + 1) * block, start + int(MAX_CLIP_SECONDS * samplerate))]
+
+
+def create_trigger(spec: TriggerSpec, samplerate: int) -> Optional[SoundTrigger]:
+    """A fresh trigger for one wait, or None for the plain level trigger."""
+    if spec.kind == 'band':
+        return BandTrigger(samplerate, spec.band[0], spec.band[1], spec.threshold, spec.ratio, spec.min_duration)
+    if spec.kind == 'clip':
+        if not spec.clip_path:
+            raise ValueError("No reference clip set.")
+        return ClipTrigger(load_clip(spec.clip_path, samplerate), spec.threshold, spec.score)
+    return None
+
+
+class TriggerMonitor:
+    """Runs a trigger on its own thread and calls on_match(score) once (stop-on-sound)."""
+
+    def __init__(self, capture, trigger: SoundTrigger, on_match, poll: float = 0.05):
+        self.capture = capture
+        self.trigger = trigger
+        self.on_match = on_match
+        self.poll = poll
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, args=(self.capture.position,), name="SoundTrigger", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self, position):
+        while not self._stop.is_set():
+            score, position = self.trigger.scan(self.capture, position, self.poll)
+            if score is not None:
+                self.on_match(score)
+                return
@@ -0,0 +1,84 @@
+"""
+Coalescing UI update pump for the Macro Editor.
+
+Worker threads (player, recorder, hotkeys) must not touch Tk widgets, and
+scheduling one root.after(0, ...) per update floods the Tk event queue when
+playback is fast. Instead, workers post into a UIPump and the Tk thread
+drains it at a fixed frame rate:
+
+* post_latest(key, callback, *args): only the most recent update per key is
+  applied (e.g. the highlighted action, the status text).
+* post_line(line): lines are batched and handed to the line sink in one call.
+* call(callback, *args): callbacks that must all run, in order (e.g. the
+  end-of-playback handler).
+"""
+import threading
+from collections import deque
+from typing import Callable, Optional
+
+DEFAULT_FRAME_RATE_HZ = 30
+MAX_LINES_PER_FRAME = 500
+
+
+class UIPump:
+    def __init__(self, root, line_sink: Optional[Callable[[list[str]], None]] = None, frame_rate_hz: float = DEFAULT_FRAME_RATE_HZ):
+        self.root = root
+        self.line_sink = line_sink
+        self.frame_ms = max(1, int(1000 / frame_rate_hz))
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._lines = deque(maxlen=MAX_LINES_PER_FRAME)
+        self._dropped_lines = 0
+        self._calls = []
+        self._running = False
+
+    # --- Producers (any thread) ---
+    def post_latest(self, key, callback: Callable, *args):
+        with self._lock:
+            self._latest[key] = (callback, args)
+
+    def post_line(self, line: str):
+        with self._lock:
+            if len(self._lines) == self._lines.maxlen:
+                # The oldest line falls out of the view; the log file still has every line
+                self._dropped_lines += 1
+            self._lines.append(line)
+
+    def call(self, callback: Callable, *args):
+        with self._lock:
+            self._calls.append((callback, args))
+
+    # --- Consumer (Tk thread) ---
+    def start(self):
+        if not self._running:
+            self._running = True
+            self.root.after(self.frame_ms, self._tick)
+
+    def stop(self):
+        self._running = False
+
+    def _tick(self):
+        if not self._running:
+            return
+        try:
+            self.drain()
+        finally:
+            self.root.after(self.frame_ms, self._tick)
+
+    def drain(self):
+        """Applies everything posted since the last frame. Must run on the Tk thread."""
+        with self._lock:
+            lines = list(self._lines)
+            self._lines.clear()
+            dropped, self._dropped_lines = self._dropped_lines, 0
+            latest, self._latest = self._latest, {}
+            calls, self._calls = self._calls, []
+
+        if lines and self.line_sink:
+            if dropped:
+                lines.insert(0, f"... {dropped} log line(s) skipped in the view (see the log file)")
+            self.line_sink(lines)
+        for callback, args in latest.values():
+            callback(*args)
+        for callback, args in calls:
+            callback(*args)
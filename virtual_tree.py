@@ -0,0 +1,202 @@
+"""
+Virtualized list view for the Macro Editor.
+
+A ttk.Treeview with one item per action becomes slow for large macros:
+inserting every row on each refresh, and looking rows up through
+get_children(), is O(n) work on the Tk main loop. VirtualTreeview only
+materializes the rows around the visible area (plus a margin on each side)
+and moves that window as the view scrolls, inserting and deleting just the
+rows that enter or leave it.
+
+Row i always has the iid str(i), so index <-> row lookups are O(1). The
+selection is kept as a set of indices, because selected rows are not
+necessarily materialized.
+"""
+from tkinter import ttk
+from typing import Callable, Iterable, Optional
+
+DEFAULT_MARGIN = 100        # Rows materialized above and below the visible area
+DEFAULT_ROW_HEIGHT = 20
+
+
+class VirtualTreeview:
+    def __init__(self, master, row_values: Callable[[int], tuple], margin: int = DEFAULT_MARGIN, **tree_options):
+        """
+        row_values(i) returns the column values of row i. It is only called for
+        rows that are being materialized.
+        """
+        self.tree = ttk.Treeview(master, **tree_options)
+        self.scrollbar = ttk.Scrollbar(master, orient="vertical", command=self._on_scrollbar)
+        self.tree.configure(yscrollcommand=self._on_tree_yview)
+        self.row_values = row_values
+        self.margin = margin
+        self.count = 0
+        self.selected = set()
+        self._first = 0             # Materialized rows are [_first, _stop)
+        self._stop = 0
+        self._anchor: Optional[int] = None
+        self._rewindow_pending = False
+
+        self.tree.bind("<Button-1>", lambda e: self._on_click(e, 'set'))
+        self.tree.bind("<Control-Button-1>", lambda e: self._on_click(e, 'toggle'))
+        self.tree.bind("<Shift-Button-1>", lambda e: self._on_click(e, 'extend'))
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+
+    # --- Rows ---
+    def set_count(self, count: int):
+        """
+        Sets the number of rows after the underlying data changed. Materialized
+        rows are updated in place and the scroll position is kept; the
+        selection is cleared.
+        """
+        top = self._top()
+        self.selected = set()
+        self._anchor = None
+        self.tree.selection_set(())
+        if self._stop > count:
+            self._delete_rows(max(self._first, count), self._stop)
+            self._stop = max(self._first, count)
+            if self._first >= self._stop:
+                self._first = self._stop = 0
+        for i in range(self._first, self._stop):
+            self.tree.item(str(i), values=self.row_values(i))
+        self.count = count
+        self._materialize(top)
+
+    def append_rows(self, n: int):
+        """Adds n rows at the end without touching the existing ones."""
+        self.count += n
+        self._materialize(self._top())
+
+    def see(self, index: int):
+        if not 0 <= index < self.count:
+            return
+        if not self._first <= index < self._stop:
+            self._materialize(index - self._visible_rows() // 2)
+        self.tree.see(str(index))
+
+    def identify_index(self, y: int) -> Optional[int]:
+        iid = self.tree.identify_row(y)
+        return int(iid) if iid else None
+
+    # --- Selection ---
+    def selected_indices(self) -> list[int]:
+        return sorted(self.selected)
+
+    def selection_set(self, indices: Iterable[int]):
+        self.selected = {i for i in indices if 0 <= i < self.count}
+        self._apply_selection()
+
+    def _apply_selection(self):
+        if len(self.selected) < self._stop - self._first:
+            rows = [str(i) for i in self.selected if self._first <= i < self._stop]
+        else:
+            rows = [str(i) for i in range(self._first, self._stop) if i in self.selected]
+        self.tree.selection_set(rows)
+
+    def _on_click(self, event, mode):
+        if self.tree.identify_region(event.x, event.y) not in ('cell', 'tree'):
+            return None  # Headings and separators keep the default behaviour
+        index = self.identify_index(event.y)
+        if index is None:
+            return None
+        if mode == 'extend' and self._anchor is not None:
+            low, high = sorted((self._anchor, index))
+            self.selected = set(range(low, high + 1))
+        elif mode == 'toggle':
+            self.selected ^= {index}
+            self._anchor = index
+        else:
+            self.selected = {index}
+            self._anchor = index
+        self.tree.focus(str(index))
+        self.tree.focus_set()
+        self._apply_selection()
+        return "break"
+
+    def _on_tree_select(self, event=None):
+        # Keyboard navigation changes the tree's selection directly; merge it into the index set.
+        # Reading the current state (not the event) keeps this idempotent for our own updates.
+        in_window = {int(iid) for iid in self.tree.selection()}
+        self.selected = {i for i in self.selected if not self._first <= i < self._stop} | in_window
+
+    # --- Windowing ---
+    def _visible_rows(self) -> int:
+        try:
+            row_height = int(ttk.Style().lookup("Treeview", "rowheight") or DEFAULT_ROW_HEIGHT)
+        except (ValueError, TypeError):
+            row_height = DEFAULT_ROW_HEIGHT
+        return max(int(self.tree.cget("height")), self.tree.winfo_height() // max(row_height, 1) + 1)
+
+    def _top(self) -> int:
+        if self._stop <= self._first:
+            return self._first
+        return self._first + int(round(self.tree.yview()[0] * (self._stop - self._first)))
+
+    def _materialize(self, top: int):
+        """Moves the materialized window so that row `top` is at the top of the view."""
+        span = self._visible_rows() + 2 * self.margin
+        first = max(0, min(top - self.margin, self.count - span))
+        stop = min(self.count, first + span)
+        old_first, old_stop = self._first, self._stop
+
+        if first >= old_stop or stop <= old_first:
+            self._delete_rows(old_first, old_stop)
+            self._insert_rows(first, stop, "end")
+        else:
+            if first > old_first:
+                self._delete_rows(old_first, first)
+            if stop < old_stop:
+                self._delete_rows(stop, old_stop)
+            if first < old_first:
+                self._insert_rows(first, old_first, 0)
+            if stop > old_stop:
+                self._insert_rows(old_stop, stop, "end")
+        self._first, self._stop = first, stop
+
+        self._apply_selection()
+        if stop > first:
+            self.tree.yview_moveto((min(max(top, first), stop) - first) / (stop - first))
+
+    def _insert_rows(self, first: int, stop: int, position):
+        if position == 0:
+            for i in range(first, stop):
+                self.tree.insert("", i - first, iid=str(i), values=self.row_values(i))
+        else:
+            for i in range(first, stop):
+                self.tree.insert("", "end", iid=str(i), values=self.row_values(i))
+
+    def _delete_rows(self, first: int, stop: int):
+        if stop > first:
+            self.tree.delete(*[str(i) for i in range(first, stop)])
+
+    def _rewindow(self):
+        self._rewindow_pending = False
+        self._materialize(self._top())
+
+    def _on_tree_yview(self, low, high):
+        low, high = float(low), float(high)
+        materialized = self._stop - self._first
+        if not self.count or not materialized:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        top = self._first + low * materialized
+        bottom = self._first + high * materialized
+        self.scrollbar.set(top / self.count, bottom / self.count)
+
+        near_top = self._first > 0 and top - self._first < self.margin / 2
+        near_bottom = self._stop < self.count and self._stop - bottom < self.margin / 2
+        if (near_top or near_bottom) and not self._rewindow_pending:
+            # Tk is mid-redraw here; move the window once it is idle
+            self._rewindow_pending = True
+            self.tree.after_idle(self._rewindow)
+
+    def _on_scrollbar(self, *args):
+        if args and args[0] == "moveto":
+            top = int(float(args[1]) * self.count)
+            if self._first + self.margin // 2 <= top <= self._stop - self._visible_rows() - self.margin // 2:
+                self.tree.yview_moveto((top - self._first) / (self._stop - self._first))
+            else:
+                self._materialize(top)
+        else:
+            self.tree.yview(*args)